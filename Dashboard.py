@@ -1,78 +1,37 @@
-from typing import List
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
-import os
 from mitosheet.streamlit.v1 import spreadsheet
 
-from utils import get_most_recent_outputs_paths, METADATE_FILE_PATH
+from utils import (
+    get_recon_rollup,
+    get_total_number_of_rules_applied,
+    get_total_number_of_records_checked,
+    get_total_number_of_checks_for_outcome,
+    get_total_number_of_failing_checks,
+    get_total_number_of_hours_saved,
+    get_slowest_recons,
+    get_slowest_stages,
+    read_run_metrics
+)
 from custom_spreadsheet_functions import MATCH, IMMATERIAL, FAIL
 
 st.set_page_config(layout="wide")
 st.title("Recon Dashboard")
 
-# For each folder in the outputs folder, get the csv file that has the latest date and time based on the filename
-most_recent_ouput_paths_dict = get_most_recent_outputs_paths()
-most_recent_output_dfs_dict = {key: pd.read_csv(path) if path else None for key, path in most_recent_ouput_paths_dict.items()}
-
-# Create list of non-None dataframes
-most_recent_output_dfs = [df for df in most_recent_output_dfs_dict.values() if df is not None]
-
-def get_total_number_of_rules_applied(*argv: List[pd.DataFrame]):
-    # Sum the unique values in the Check column for each dataframe
-    total_number_of_rules_applied = 0
-    for df in argv:
-        # Get the unique values in the Check column
-        total_number_of_rules_applied += df['Check'].nunique()
-
-    return total_number_of_rules_applied
-
-def get_total_number_of_records_checked(*argv: List[pd.DataFrame]):
-    # Sum the Count column for each dataframe
-    total_number_of_checks = 0
-    for df in argv:
-        total_number_of_checks += df['Count'].sum()
-
-    return total_number_of_checks
-
-def get_total_number_of_checks_for_outcome(*argv: List[pd.DataFrame], outcome):
-    total_number_of_matching_checks = 0
-
-    if outcome == MATCH or outcome == IMMATERIAL:
-        
-        for df in argv:
-            df = df[df['Outcome'] == outcome]
-            total_number_of_matching_checks += df['Count'].sum()
-
-    return total_number_of_matching_checks
-
-def get_total_number_of_failing_checks(*argv: List[pd.DataFrame]):
-    total_number_of_failing_checks = 0
-
-    for df in argv:
-        df = df[(df['Outcome'] != MATCH) & (df['Outcome'] != IMMATERIAL)]
-        total_number_of_failing_checks += df['Count'].sum()
-
-    return total_number_of_failing_checks
-
-def get_total_number_of_hours_saved():
-    # If we haven't yet created the METADATE_FILE_PATH, then return 0
-    if not os.path.exists(METADATE_FILE_PATH):
-        return 0
-
-    recon_metadata_df = pd.read_csv(METADATE_FILE_PATH)
-    return recon_metadata_df['recon_value'].sum()
+# The rollup holds the totals of the most recent run of each recon, so we don't need to read every output
+recon_rollup_df = get_recon_rollup()
 
 st.divider()
 
 metric_one, metric_two, metric_three = st.columns((1,1,1))
-metric_one.metric("Number of Rules Applied", get_total_number_of_rules_applied(*most_recent_output_dfs))
-metric_two.metric("Number of Records Checked", get_total_number_of_records_checked(*most_recent_output_dfs))
+metric_one.metric("Number of Rules Applied", get_total_number_of_rules_applied(recon_rollup_df))
+metric_two.metric("Number of Records Checked", get_total_number_of_records_checked(recon_rollup_df))
 metric_three.metric("Number of Hours Saved per Quarter", get_total_number_of_hours_saved())
 
-num_matching_checks =  get_total_number_of_checks_for_outcome(*most_recent_output_dfs, outcome=MATCH)
-num_immaterial_checks = get_total_number_of_checks_for_outcome(*most_recent_output_dfs, outcome=IMMATERIAL)
-num_failing_checks = get_total_number_of_failing_checks(*most_recent_output_dfs)
+num_matching_checks =  get_total_number_of_checks_for_outcome(recon_rollup_df, outcome=MATCH)
+num_immaterial_checks = get_total_number_of_checks_for_outcome(recon_rollup_df, outcome=IMMATERIAL)
+num_failing_checks = get_total_number_of_failing_checks(recon_rollup_df)
 
 metric_one, metric_two, metric_three = st.columns((1,1,1))
 metric_one.metric("Number of MATCHING checks", num_matching_checks)
@@ -97,4 +56,17 @@ fig.update_xaxes(title_text="Outcome")
 fig.update_yaxes(title_text="Total number of records")
 fig.update_layout(title_text="Outcome Distribution", title_font_size=20)
 
-st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+st.plotly_chart(fig, use_container_width=True)
+
+# Show where the time of the most recent run of each recon went, using the per stage metrics log
+run_metrics_df = read_run_metrics()
+if len(run_metrics_df) > 0:
+    st.divider()
+    st.markdown("## Run Performance")
+
+    st.markdown("#### Slowest recons")
+    st.dataframe(get_slowest_recons(run_metrics_df), use_container_width=True)
+
+    st.markdown("#### Slowest stages")
+    st.caption("Stage times don't include the stages nested inside them, like the imports and checks that run inside analysis.run.")
+    st.dataframe(get_slowest_stages(run_metrics_df), use_container_width=True)
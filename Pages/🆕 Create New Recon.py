@@ -16,4 +16,6 @@ if submitted:
     if not success:
         st.error(message)
     else:
-        st.success(f'Created a new recon wizard. Click on the new tab **Recon: {recon_report_name}** to configure it.')
+        # Open the new recon the next time the recon page is shown
+        st.session_state['selected_recon_name'] = recon_report_name
+        st.success(f'Created a new recon wizard. Click on the **🧾 Recon** tab to configure {recon_report_name}.')
@@ -0,0 +1,55 @@
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+
+from utils import get_recon_trends, get_recon_trends_version
+
+st.set_page_config(layout="wide")
+st.title("Recon Trends")
+
+@st.cache_data
+def load_recon_trends(trends_version: int) -> pd.DataFrame:
+    # The trends are pre-aggregated into one row per (recon, day, check, outcome) when reports are saved, 
+    # so this is a single small read. The trends' version is part of the cache key so new runs show up.
+    return get_recon_trends()
+
+recon_trends_df = load_recon_trends(get_recon_trends_version())
+
+if len(recon_trends_df) == 0:
+    st.info('There are no recon runs yet. Trends will show up here once recons have been run.')
+    st.stop()
+
+recon_names = sorted(recon_trends_df['Recon'].unique())
+outcomes = list(recon_trends_df['Outcome'].unique())
+
+filter_one, filter_two, filter_three = st.columns((2,1,1))
+selected_recon_names = filter_one.multiselect('Recons', recon_names, default=recon_names)
+selected_outcomes = filter_two.multiselect('Outcomes', outcomes, default=outcomes)
+date_range = filter_three.date_input('Date range', value=(recon_trends_df['Day'].min(), recon_trends_df['Day'].max()))
+
+filtered_trends_df = recon_trends_df[
+    recon_trends_df['Recon'].isin(selected_recon_names) & 
+    recon_trends_df['Outcome'].isin(selected_outcomes)
+]
+if isinstance(date_range, tuple) and len(date_range) == 2:
+    filtered_trends_df = filtered_trends_df[filtered_trends_df['Day'].between(pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1]))]
+
+st.divider()
+
+# Total outcomes across all of the selected recons
+total_trends_df = filtered_trends_df.groupby(['Day', 'Outcome'], as_index=False)['Count'].sum()
+fig = px.line(total_trends_df, x='Day', y='Count', color='Outcome', markers=True)
+fig.update_xaxes(title_text="Day")
+fig.update_yaxes(title_text="Total number of records")
+fig.update_layout(title_text="Outcomes Over Time", title_font_size=20)
+st.plotly_chart(fig, use_container_width=True)
+
+# Outcomes of each check of a single recon
+selected_recon_name = st.selectbox('Recon', selected_recon_names)
+if selected_recon_name is not None:
+    check_trends_df = filtered_trends_df[filtered_trends_df['Recon'] == selected_recon_name]
+
+    fig = px.line(check_trends_df, x='Day', y='Count', color='Check', facet_row='Outcome', markers=True)
+    fig.update_yaxes(matches=None)
+    fig.update_layout(title_text=f"{selected_recon_name} Checks Over Time", title_font_size=20, height=250 * max(len(selected_outcomes), 1))
+    st.plotly_chart(fig, use_container_width=True)
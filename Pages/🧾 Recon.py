@@ -0,0 +1,30 @@
+import streamlit as st
+from recon_store import get_recon_metadata
+
+# The page that shows every recon. Only the recon store is read to build the list of recons, so the page
+# loads just as fast with hundreds of recons
+SELECTED_RECON_NAME_KEY = "selected_recon_name"
+
+st.set_page_config(layout="wide")
+
+recon_metadata_df = get_recon_metadata()
+if len(recon_metadata_df) == 0:
+    st.title("Recon")
+    st.info('There are no recons yet. Create one on the **🆕 Create New Recon** page.')
+    st.stop()
+
+recon_names = list(recon_metadata_df['recon_name'])
+selected_recon_name = st.session_state.get(SELECTED_RECON_NAME_KEY)
+
+recon_name = st.sidebar.selectbox(
+    'Recon',
+    recon_names,
+    index=recon_names.index(selected_recon_name) if selected_recon_name in recon_names else 0
+)
+st.session_state[SELECTED_RECON_NAME_KEY] = recon_name
+
+recon_metadata = recon_metadata_df.set_index('recon_name').loc[recon_name]
+
+# Imported once a recon is picked, since the recon page imports mitosheet and plotly
+from recon_page import render_recon_page
+render_recon_page(recon_name, recon_metadata['recon_description'], float(recon_metadata['recon_value']))
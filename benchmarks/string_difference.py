@@ -0,0 +1,79 @@
+"""
+Benchmarks CHECK_STRING_DIFFERENCE against the original row by row implementation on the
+commercial lease files, scaled up by repeating the merged tenant names.
+
+Run it from the root of the repo with:
+    python -m benchmarks.string_difference --scales 1 10 100
+"""
+import argparse
+import time
+
+import pandas as pd
+from fuzzywuzzy import fuzz
+
+from custom_spreadsheet_functions import CHECK_STRING_DIFFERENCE, USE_BATCH_FUZZY_SCORER
+
+LEASE_FILE_PATHS = [
+    './data/commercial leases/Warehouse REIT v1.csv',
+    './data/commercial leases/Prologis v1.csv',
+]
+DB_FILE_PATH = './db_data/commercial_real_estate_snowflake.csv'
+
+
+def CHECK_STRING_DIFFERENCE_ROW_BY_ROW(series_one, series_two, similarity_threshold=100):
+    # The original implementation, which scores every row with fuzz.ratio
+    def label_fuzzy_ratio(value1, value2, similarity_threshold):
+        ratio = fuzz.ratio(str(value1), str(value2))
+
+        if ratio == 100:
+            return 'Match'
+        if ratio > similarity_threshold:
+            return 'Immaterial'
+        return ratio
+
+    return pd.Series([label_fuzzy_ratio(val1, val2, similarity_threshold) for val1, val2 in zip(series_one, series_two)], index=series_one.index)
+
+
+def get_tenant_name_pairs(scale: int) -> pd.DataFrame:
+    lease_df = pd.concat([pd.read_csv(path, encoding='utf-8-sig') for path in LEASE_FILE_PATHS], join='inner', ignore_index=True)
+    db_df = pd.read_csv(DB_FILE_PATH, encoding='utf-8-sig').drop_duplicates(subset=['Lease ID'])
+
+    merged_df = lease_df[['Lease ID', 'Tenant Name']].merge(db_df[['Lease ID', 'Tenant Name']], on='Lease ID', how='left', suffixes=['_lease', '_db'])
+    return pd.concat([merged_df] * scale, ignore_index=True)
+
+
+def time_check(check_function, pairs_df: pd.DataFrame, similarity_threshold: int):
+    start = time.perf_counter()
+    result = check_function(pairs_df['Tenant Name_lease'], pairs_df['Tenant Name_db'], similarity_threshold)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark CHECK_STRING_DIFFERENCE on the commercial lease files.')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100], help='How many times to repeat the merged lease data.')
+    parser.add_argument('--similarity-threshold', type=int, default=90)
+    parser.add_argument('--skip-row-by-row', action='store_true', help='Only time the batch implementation.')
+    args = parser.parse_args()
+
+    print(f'Batch C scorer enabled: {USE_BATCH_FUZZY_SCORER}')
+    print(f'{"Rows":>12} {"Row by row rows/sec":>22} {"Batch rows/sec":>18} {"Speedup":>10}')
+
+    for scale in args.scales:
+        pairs_df = get_tenant_name_pairs(scale)
+        batch_result, batch_seconds = time_check(CHECK_STRING_DIFFERENCE, pairs_df, args.similarity_threshold)
+        batch_rows_per_second = len(pairs_df) / batch_seconds
+
+        if args.skip_row_by_row:
+            print(f'{len(pairs_df):>12,} {"-":>22} {batch_rows_per_second:>18,.0f} {"-":>10}')
+            continue
+
+        row_by_row_result, row_by_row_seconds = time_check(CHECK_STRING_DIFFERENCE_ROW_BY_ROW, pairs_df, args.similarity_threshold)
+        if not row_by_row_result.astype(str).equals(batch_result.astype(str)):
+            raise AssertionError(f'The batch labels do not match the row by row labels at scale {scale}')
+
+        row_by_row_rows_per_second = len(pairs_df) / row_by_row_seconds
+        print(f'{len(pairs_df):>12,} {row_by_row_rows_per_second:>22,.0f} {batch_rows_per_second:>18,.0f} {row_by_row_seconds / batch_seconds:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+"""
+Times the checks, the report, saving a run, and the dashboard totals on synthetic lease data, and
+writes the results to a JSON file. Pass --compare to flag benchmarks that got slower than a stored
+baseline, which exits with a non zero code so it can gate a change.
+
+Run it from the root of the repo with:
+    python -m benchmarks.suite --rows 10000 1000000 --output benchmark_results.json
+    python -m benchmarks.suite --rows 10000 1000000 --compare benchmarks/baseline.json
+
+Timings are the fastest of --repeats runs. Reports are saved in a temporary folder, so running the
+suite never touches the app's outputs.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_data import MERGE_KEYS, generate_lease_data
+from chunked_recon import merge_recon_sources
+from custom_spreadsheet_functions import CHECK_NUMBER_DIFFERENCE, CHECK_STRING_DIFFERENCE, IMMATERIAL, MATCH, USE_BATCH_FUZZY_SCORER
+from outcomes import encoded_check_outcomes
+from utils import (
+    OUTPUTS_FOLDER,
+    get_recon_report,
+    get_recon_report_records,
+    get_recon_rollup,
+    get_total_number_of_checks_for_outcome,
+    get_total_number_of_failing_checks,
+    get_total_number_of_records_checked,
+    get_total_number_of_rules_applied,
+    rebuild_recon_rollup,
+    save_recon_report
+)
+
+DEFAULT_ROWS = [10_000, 1_000_000, 10_000_000]
+
+# A benchmark is a regression when it is this much slower than the baseline...
+DEFAULT_REGRESSION_THRESHOLD = 0.2
+# ...and at least this many seconds slower, so that noise in very fast benchmarks is not flagged
+MINIMUM_REGRESSION_SECONDS = 0.01
+
+# How many recons are saved before timing the dashboard totals
+NUMBER_OF_DASHBOARD_RECONS = 50
+
+
+@contextlib.contextmanager
+def working_directory(path: str):
+    previous_path = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous_path)
+
+
+def time_function(function: Callable, repeats: int) -> Tuple[object, float]:
+    # Returns the result of the last run and the fastest time
+    fastest_seconds = float('inf')
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        fastest_seconds = min(fastest_seconds, time.perf_counter() - start)
+    return result, fastest_seconds
+
+
+def get_dashboard_totals() -> dict:
+    recon_rollup_df = get_recon_rollup()
+    return {
+        'rules_applied': get_total_number_of_rules_applied(recon_rollup_df),
+        'records_checked': get_total_number_of_records_checked(recon_rollup_df),
+        'matching_checks': get_total_number_of_checks_for_outcome(recon_rollup_df, MATCH),
+        'immaterial_checks': get_total_number_of_checks_for_outcome(recon_rollup_df, IMMATERIAL),
+        'failing_checks': get_total_number_of_failing_checks(recon_rollup_df),
+    }
+
+
+def save_benchmark_recon_report(recon_summary_df: pd.DataFrame, recon_name: str, recon_records=None) -> str:
+    os.makedirs(os.path.join(OUTPUTS_FOLDER, recon_name), exist_ok=True)
+    return save_recon_report(recon_summary_df, recon_name, recon_records)
+
+
+def run_benchmarks(number_of_rows: int, repeats: int, number_mismatch_rate: float, near_duplicate_name_rate: float, missing_rate: float, seed: int) -> List[dict]:
+    lease_df, db_df = generate_lease_data(number_of_rows, number_mismatch_rate, near_duplicate_name_rate, missing_rate, seed)
+    recon_df = merge_recon_sources(lease_df, db_df, MERGE_KEYS)
+
+    timings = []
+    def record(benchmark: str, function: Callable):
+        result, seconds = time_function(function, repeats)
+        timings.append({'benchmark': benchmark, 'rows': number_of_rows, 'seconds': seconds, 'rows_per_second': number_of_rows / seconds if seconds > 0 else None})
+        print(f'{benchmark:<28} {number_of_rows:>12,} {seconds:>10.4f}s', flush=True)
+        return result
+
+    # The checks are run like they are for a recon report, returning OutcomeArrays
+    with encoded_check_outcomes():
+        recon_df['Net Effective Rent Check'] = record(
+            'CHECK_NUMBER_DIFFERENCE',
+            lambda: CHECK_NUMBER_DIFFERENCE(recon_df['Net Effective Rent_left'], recon_df['Net Effective Rent_right'], 1)
+        )
+        recon_df['Tenant Name Check'] = record(
+            'CHECK_STRING_DIFFERENCE',
+            lambda: CHECK_STRING_DIFFERENCE(recon_df['Tenant Name_left'], recon_df['Tenant Name_right'], 90)
+        )
+    record('get_recon_report', lambda: get_recon_report(recon_df))
+
+    recon_summary_df, recon_records = get_recon_report_records(recon_df)
+    with tempfile.TemporaryDirectory(prefix='recon-benchmark-') as folder, working_directory(folder):
+        record('save_recon_report', lambda: save_benchmark_recon_report(recon_summary_df, 'Benchmark', recon_records))
+
+        for recon_number in range(NUMBER_OF_DASHBOARD_RECONS):
+            save_benchmark_recon_report(recon_summary_df, f'Benchmark {recon_number}')
+        record('rebuild_recon_rollup', rebuild_recon_rollup)
+        record('dashboard_totals', get_dashboard_totals)
+
+    return timings
+
+
+def get_results_metadata(args) -> dict:
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'batch_fuzzy_scorer': USE_BATCH_FUZZY_SCORER,
+        'repeats': args.repeats,
+        'number_mismatch_rate': args.mismatch_rate,
+        'near_duplicate_name_rate': args.near_duplicate_rate,
+        'missing_rate': args.missing_rate,
+        'seed': args.seed,
+    }
+
+
+def compare_results(baseline: dict, results: dict, threshold: float) -> List[dict]:
+    """
+    Compares each benchmark to the same benchmark at the same size in the baseline. Benchmarks that
+    are not in the baseline are skipped.
+    """
+    baseline_seconds = {(timing['benchmark'], timing['rows']): timing['seconds'] for timing in baseline['results']}
+
+    comparisons = []
+    for timing in results['results']:
+        previous_seconds = baseline_seconds.get((timing['benchmark'], timing['rows']))
+        if previous_seconds is None:
+            continue
+
+        is_regression = timing['seconds'] > previous_seconds * (1 + threshold) and timing['seconds'] - previous_seconds > MINIMUM_REGRESSION_SECONDS
+        comparisons.append({
+            'benchmark': timing['benchmark'],
+            'rows': timing['rows'],
+            'baseline_seconds': previous_seconds,
+            'seconds': timing['seconds'],
+            'ratio': timing['seconds'] / previous_seconds if previous_seconds > 0 else None,
+            'regression': is_regression,
+        })
+    return comparisons
+
+
+def print_comparisons(comparisons: List[dict], threshold: float):
+    print(f'\n{"Benchmark":<28} {"Rows":>12} {"Baseline":>10} {"Current":>10} {"Ratio":>8}')
+    for comparison in comparisons:
+        ratio = f'{comparison["ratio"]:.2f}x' if comparison['ratio'] is not None else '-'
+        flag = '  REGRESSION' if comparison['regression'] else ''
+        print(f'{comparison["benchmark"]:<28} {comparison["rows"]:>12,} {comparison["baseline_seconds"]:>9.4f}s {comparison["seconds"]:>9.4f}s {ratio:>8}{flag}')
+
+    number_of_regressions = len([comparison for comparison in comparisons if comparison['regression']])
+    print(f'\n{number_of_regressions} of {len(comparisons)} benchmarks are more than {threshold:.0%} slower than the baseline')
+
+
+def read_results(path: str) -> dict:
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the recon checks, reports, and dashboard on synthetic lease data.')
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS, help='The sizes of the synthetic data to benchmark.')
+    parser.add_argument('--repeats', type=int, default=3, help='How many times to run each benchmark. The fastest run is kept.')
+    parser.add_argument('--mismatch-rate', type=float, default=0.02, help='Share of leases with a failing Net Effective Rent.')
+    parser.add_argument('--near-duplicate-rate', type=float, default=0.05, help='Share of leases with a near duplicate Tenant Name.')
+    parser.add_argument('--missing-rate', type=float, default=0.01, help='Share of leases that are missing from the extract.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json', help='Where to write the results.')
+    parser.add_argument('--compare', help='A results file to compare against. Exits with 1 if any benchmark regressed.')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_REGRESSION_THRESHOLD, help='How much slower than the baseline counts as a regression.')
+    parser.add_argument('--results', help='Compare this results file instead of running the benchmarks.')
+    args = parser.parse_args()
+
+    results: Optional[dict] = None
+    if args.results is not None:
+        results = read_results(args.results)
+    else:
+        print(f'{"Benchmark":<28} {"Rows":>12} {"Seconds":>11}')
+        timings = []
+        for number_of_rows in args.rows:
+            timings.extend(run_benchmarks(number_of_rows, args.repeats, args.mismatch_rate, args.near_duplicate_rate, args.missing_rate, args.seed))
+
+        results = {'metadata': get_results_metadata(args), 'results': timings}
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f'\nWrote results to {args.output}')
+
+    if args.compare is not None:
+        comparisons = compare_results(read_results(args.compare), results, args.threshold)
+        print_comparisons(comparisons, args.threshold)
+        if any(comparison['regression'] for comparison in comparisons):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
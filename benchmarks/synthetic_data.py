@@ -0,0 +1,100 @@
+"""
+Generates synthetic lease data at any size, with the schema of the commercial lease files and the
+Snowflake extract.
+
+Rows are sampled from the real lease files and given unique Lease IDs and Asset IDs. The extract side
+copies every lease with its numbers truncated to whole numbers, like the real extract, and then a
+controllable share of the rows is changed so that the recon finds failing numbers, near duplicate tenant
+names (abbreviations, dropped letters, changed case), and leases that are missing from the extract.
+"""
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+LEASE_FILE_PATHS = [
+    './data/commercial leases/Warehouse REIT v1.csv',
+    './data/commercial leases/Prologis v1.csv',
+]
+DB_FILE_PATH = './db_data/commercial_real_estate_snowflake.csv'
+
+MERGE_KEYS = ['Lease ID', 'Asset ID']
+NUMBER_COLUMNS = ['Estimated Rental Value', 'Net Effective Rent', 'SQM']
+
+# The extract calls some of the lease columns by a different name
+DB_COLUMN_NAMES = {'SQM': 'Square Meters'}
+
+TENANT_NAME_ABBREVIATIONS = {
+    'Group': 'Grp.',
+    'Management': 'Mgmt.',
+    'Company': 'Co.',
+    'Corporation': 'Corp.',
+    'Incorporated': 'Inc.',
+    'International': 'Intl.',
+    ' and ': ' & ',
+}
+
+
+def read_lease_sample() -> pd.DataFrame:
+    # Some lease files use the extract's column names, so rename them to the lease schema first
+    lease_column_names = {db_column_name: column_name for column_name, db_column_name in DB_COLUMN_NAMES.items()}
+    return pd.concat([pd.read_csv(path, encoding='utf-8-sig').rename(columns=lease_column_names) for path in LEASE_FILE_PATHS], join='inner', ignore_index=True)
+
+def get_db_columns() -> list:
+    return list(pd.read_csv(DB_FILE_PATH, encoding='utf-8-sig', nrows=0).columns)
+
+def get_near_duplicate_name(name: str, rng: np.random.Generator) -> str:
+    # Abbreviate the name if we can, otherwise drop a letter or change the case
+    for word, abbreviation in TENANT_NAME_ABBREVIATIONS.items():
+        if word in name:
+            return name.replace(word, abbreviation, 1)
+
+    if len(name) > 3 and rng.random() < 0.5:
+        position = int(rng.integers(1, len(name) - 1))
+        return name[:position] + name[position + 1:]
+    return name.upper()
+
+def get_near_duplicate_names(tenant_names: pd.Series, rng: np.random.Generator) -> pd.Series:
+    # There are only a few hundred distinct names, so only change each distinct name once
+    codes, unique_names = pd.factorize(tenant_names)
+    near_duplicate_names = np.array([get_near_duplicate_name(name, rng) for name in unique_names], dtype=object)
+    return pd.Series(near_duplicate_names[codes], index=tenant_names.index)
+
+def generate_lease_data(
+        number_of_rows: int,
+        number_mismatch_rate: float=0.02,
+        near_duplicate_name_rate: float=0.05,
+        missing_rate: float=0.01,
+        seed: int=0
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Returns (lease_df, db_df) with number_of_rows leases. number_mismatch_rate of the leases have a
+    Net Effective Rent in the extract that is 1-20% off, near_duplicate_name_rate have a near duplicate
+    Tenant Name in the extract, and missing_rate are not in the extract at all.
+    """
+    rng = np.random.default_rng(seed)
+    sample_df = read_lease_sample()
+
+    lease_df = sample_df.iloc[rng.integers(0, len(sample_df), number_of_rows)].reset_index(drop=True)
+    lease_df['Lease ID'] = pd.Series(np.arange(number_of_rows)).map('L{:08d}'.format)
+    lease_df['Asset ID'] = pd.Series(rng.integers(0, max(number_of_rows // 4, 1), number_of_rows)).map('A{:08d}'.format)
+
+    # Spread the numbers out so that the sampled rows are not exact copies of each other
+    for column_header in NUMBER_COLUMNS:
+        lease_df[column_header] = (lease_df[column_header] * rng.uniform(0.5, 1.5, number_of_rows)).round(2)
+
+    db_df = lease_df.copy()
+    for column_header in NUMBER_COLUMNS:
+        db_df[column_header] = np.trunc(db_df[column_header])
+
+    mismatch_mask = rng.random(number_of_rows) < number_mismatch_rate
+    db_df.loc[mismatch_mask, 'Net Effective Rent'] = np.trunc(db_df.loc[mismatch_mask, 'Net Effective Rent'] * rng.uniform(1.01, 1.2, int(mismatch_mask.sum())))
+
+    near_duplicate_mask = rng.random(number_of_rows) < near_duplicate_name_rate
+    db_df.loc[near_duplicate_mask, 'Tenant Name'] = get_near_duplicate_names(db_df.loc[near_duplicate_mask, 'Tenant Name'], rng)
+
+    db_df = db_df[rng.random(number_of_rows) >= missing_rate]
+    db_df = db_df.iloc[rng.permutation(len(db_df))].reset_index(drop=True)
+    db_df = db_df.rename(columns=DB_COLUMN_NAMES)[get_db_columns()]
+
+    return lease_df, db_df
@@ -0,0 +1,264 @@
+import functools
+import hashlib
+import inspect
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+from run_metrics import measure_stage
+
+# Path to the folder where reference extracts are stored as Arrow IPC files
+SNAPSHOT_FOLDER = '.cache/snapshots/'
+
+
+def get_file_fingerprint(path: str, hash_contents: bool=False) -> str:
+    """
+    Returns a fingerprint that changes whenever the file changes. By default this is the size and
+    modified time of the file, which is free to read. Set hash_contents to also hash the file, for
+    sources whose modified time is not reliable.
+    """
+    stat = os.stat(path)
+    fingerprint = f'{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}'
+
+    if hash_contents:
+        file_hash = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1024 * 1024), b''):
+                file_hash.update(block)
+        fingerprint += f':{file_hash.hexdigest()}'
+
+    return fingerprint
+
+
+def get_cache_key(name: str, args: tuple, kwargs: dict, fingerprints: List[str]) -> str:
+    key_contents = json.dumps([name, [repr(arg) for arg in args], sorted((key, repr(value)) for key, value in kwargs.items()), fingerprints])
+    return hashlib.sha256(key_contents.encode('utf-8')).hexdigest()
+
+
+def is_copy_on_write_enabled() -> bool:
+    # Copy on write is always on from pandas 3, and is an option in pandas 2
+    return int(pd.__version__.split('.')[0]) >= 3 or pd.get_option('mode.copy_on_write') is True
+
+
+def dataframe_to_arrow(df: pd.DataFrame) -> pa.Table:
+    """
+    Converts the dataframe to an Arrow table that converts back to pandas without copying. Arrow
+    stores the NaNs of float columns as nulls, which have to be copied to turn back into NaNs, so
+    float columns are stored with their NaNs as values instead.
+    """
+    table = pa.Table.from_pandas(df)
+    for position, column_header in enumerate(df.columns):
+        values = df.iloc[:, position]
+        if isinstance(values.dtype, np.dtype) and values.dtype.kind == 'f' and table.column(position).null_count > 0:
+            table = table.set_column(position, table.field(position), pa.array(values.to_numpy(), from_pandas=False))
+    return table
+
+
+class SnapshotStore:
+    """
+    Reference extracts that are written once as uncompressed Arrow IPC files and memory-mapped
+    read-only, rather than copied into every session. Every session gets a shallow copy of the same
+    dataframe, whose columns point into the mapped file, so with copy on write a session only copies
+    the columns it edits. Other processes that map the same file, like the rerun workers, share its
+    pages too, so the memory of a reference extract is paid once per host.
+
+    Snapshots are grouped by importer and arguments, and keyed by the fingerprints of their sources.
+    A snapshot is only rebuilt when the key of its group changes, which removes the older snapshot.
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+
+        self.snapshots: Dict[str, Tuple[str, pd.DataFrame, bool]] = {}
+        self.lock = threading.Lock()
+        self.group_locks: Dict[str, threading.Lock] = {}
+
+    def get_path(self, group: str, key: str) -> str:
+        return os.path.join(self.folder, f'{group}-{key}.arrow')
+
+    def get_or_build(self, group: str, key: str, build: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        """
+        Returns a dataframe of the snapshot, calling build to write it if it doesn't exist yet. Sessions
+        that ask for the same group at the same time wait for the first one, so it is only built once.
+        """
+        with self.lock:
+            group_lock = self.group_locks.setdefault(group, threading.Lock())
+
+        with group_lock:
+            snapshot_key, df, shared = self.snapshots.get(group, (None, None, False))
+            if snapshot_key != key:
+                df, shared = self.load(group, key, build)
+                with self.lock:
+                    self.snapshots[group] = (key, df, shared)
+
+        # The store keeps the snapshot dataframe alive, so an edit to a shallow copy copies the edited
+        # columns first rather than writing to the read-only file. Without copy on write, or for
+        # dataframes that Arrow can't store, sessions get their own copy
+        return df.copy(deep=not shared or not is_copy_on_write_enabled())
+
+    def load(self, group: str, key: str, build: Callable[[], pd.DataFrame]) -> Tuple[pd.DataFrame, bool]:
+        path = self.get_path(group, key)
+        if not os.path.exists(path):
+            df = build()
+            try:
+                self.write(path, df)
+            except (pa.ArrowException, TypeError, ValueError):
+                # Some dataframes can't be stored as Arrow, like ones with mixed type columns, so
+                # they are only kept in memory
+                return df, False
+            self.remove_stale_snapshots(group, key)
+
+        # split_blocks keeps each column as its own block, so pandas doesn't copy the columns into 2D blocks
+        table = ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        return table.to_pandas(split_blocks=True), True
+
+    def write(self, path: str, df: pd.DataFrame):
+        os.makedirs(self.folder, exist_ok=True)
+        table = dataframe_to_arrow(df)
+
+        # Write uncompressed, so the file can be mapped without decompressing it, and to a temporary
+        # file first, so other processes never map a half written snapshot
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with ipc.new_file(temp_path, table.schema) as writer:
+                writer.write_table(table)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def remove_stale_snapshots(self, group: str, key: str):
+        for file in os.listdir(self.folder):
+            if file.startswith(f'{group}-') and file.endswith('.arrow') and file != os.path.basename(self.get_path(group, key)):
+                try:
+                    # Processes that still map the file keep reading it until they pick up the new snapshot
+                    os.remove(os.path.join(self.folder, file))
+                except OSError:
+                    pass
+
+    def clear(self):
+        with self.lock:
+            self.snapshots.clear()
+        if os.path.exists(self.folder):
+            for file in os.listdir(self.folder):
+                os.remove(os.path.join(self.folder, file))
+
+
+SNAPSHOT_STORE = SnapshotStore(SNAPSHOT_FOLDER)
+
+
+def snapshot_importer(*source_paths: str, hash_contents: bool=False):
+    """
+    Decorator for custom importers of reference data, like the Snowflake extract, that every analyst
+    imports. The importer only runs again when its arguments or source files change, and its result
+    is stored in the SnapshotStore and shared by every session and process instead of being copied
+    into each one.
+
+    @snapshot_importer('./db_data/commercial_real_estate_snowflake.csv')
+    def get_european_real_estate_data(sector: str):
+        ...
+    """
+    def decorator(importer: Callable[..., pd.DataFrame]) -> Callable[..., pd.DataFrame]:
+        name = f'{importer.__module__}.{importer.__qualname__}'
+        signature = inspect.signature(importer)
+
+        def load(*args, **kwargs):
+            try:
+                fingerprints = [get_file_fingerprint(path, hash_contents) for path in source_paths]
+            except FileNotFoundError:
+                # Let the importer raise its usual error for the missing source
+                return importer(*args, **kwargs)
+
+            bound_arguments = signature.bind(*args, **kwargs)
+            bound_arguments.apply_defaults()
+
+            group = get_cache_key(name, (), dict(bound_arguments.arguments), [])
+            key = get_cache_key(name, (), dict(bound_arguments.arguments), fingerprints)
+            return SNAPSHOT_STORE.get_or_build(group, key, lambda: importer(*args, **kwargs))
+
+        @functools.wraps(importer)
+        def snapshotted(*args, **kwargs):
+            with measure_stage('import', importer.__name__) as record:
+                df = load(*args, **kwargs)
+                record['rows'] = len(df)
+            return df
+
+        # Record the sources so other tools can tell which files an importer depends on
+        snapshotted.source_paths = list(source_paths)
+        return snapshotted
+
+    return decorator
+
+
+def read_csv_snapshot(path: str, hash_contents: bool=False, **kwargs) -> pd.DataFrame:
+    """
+    Drop in replacement for pd.read_csv for reference files, which are parsed once per change and
+    shared by every session and process.
+    """
+    group = get_cache_key('pd.read_csv', (os.path.abspath(path), ), kwargs, [])
+    key = get_cache_key('pd.read_csv', (os.path.abspath(path), ), kwargs, [get_file_fingerprint(path, hash_contents)])
+    return SNAPSHOT_STORE.get_or_build(group, key, lambda: pd.read_csv(path, **kwargs))
+
+
+# How many analysis results are kept in memory in total, and for each session
+ANALYSIS_RUN_CACHE_ENTRIES = int(os.environ.get('RECON_ANALYSIS_RUN_CACHE_ENTRIES', 16))
+ANALYSIS_RUN_CACHE_ENTRIES_PER_SESSION = int(os.environ.get('RECON_ANALYSIS_RUN_CACHE_ENTRIES_PER_SESSION', 2))
+
+
+def get_analysis_run_key(analysis, importers: Sequence[Callable]=()) -> str:
+    """
+    Returns a key that changes whenever running the analysis could give a different result, which
+    is when the analysis' steps change or when any of the files it imports change. Files are found
+    from the analysis' import parameters and from the source_paths of any snapshot_importer.
+    """
+    source_paths = [param['original_value'] for param in analysis.get_param_metadata('import')]
+    for importer in importers:
+        source_paths.extend(getattr(importer, 'source_paths', []))
+
+    fingerprints = [get_file_fingerprint(path) for path in source_paths if isinstance(path, str) and os.path.isfile(path)]
+    return get_cache_key('analysis.run', (analysis.to_json(), ), {}, fingerprints)
+
+
+class AnalysisRunCache:
+    """
+    Keeps the results of analysis.run() in memory so that Streamlit reruns that don't change the
+    analysis or its data don't run the whole recon again. Each session keeps its own most recent
+    results, and the least recently used results are evicted once there are too many in total.
+    """
+
+    def __init__(self, entries: int, entries_per_session: int):
+        self.entries = entries
+        self.entries_per_session = entries_per_session
+
+        self.results: 'OrderedDict[Tuple[str, str], Any]' = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_or_run(self, session_id: str, key: str, run: Callable[[], Any]) -> Any:
+        with self.lock:
+            if (session_id, key) in self.results:
+                self.results.move_to_end((session_id, key))
+                return self.results[(session_id, key)]
+
+        result = run()
+
+        with self.lock:
+            self.results[(session_id, key)] = result
+
+            session_result_keys = [result_key for result_key in self.results if result_key[0] == session_id]
+            for result_key in session_result_keys[:-self.entries_per_session]:
+                del self.results[result_key]
+
+            while len(self.results) > self.entries:
+                self.results.popitem(last=False)
+
+        return result
+
+
+ANALYSIS_RUN_CACHE = AnalysisRunCache(ANALYSIS_RUN_CACHE_ENTRIES, ANALYSIS_RUN_CACHE_ENTRIES_PER_SESSION)
@@ -0,0 +1,228 @@
+"""
+Declarative check specs, evaluated together in one vectorized pass.
+
+Instead of adding a CHECK_* formula column per check and finding the checks by the word check in
+their names, a recon can describe its checks as specs:
+
+    check_specs = [
+        {'name': 'Net Effective Rent Check', 'type': 'number', 'columns': ['Net Effective Rent_left', 'Net Effective Rent_right'], 'tolerance': 1},
+        {'name': 'Rental Value Check', 'type': 'number', 'columns': ['Estimated Rental Value_left', 'Estimated Rental Value_right'], 'relative_tolerance': 0.001},
+        {'name': 'Tenant Name Check', 'type': 'string', 'columns': ['Tenant Name_left', 'Tenant Name_right'], 'similarity_threshold': 90, 'normalize': True},
+    ]
+    recon_summary_df, recon_records = evaluate_check_specs(recon_df, check_specs)
+
+Number checks have an absolute tolerance, a relative tolerance (a share of the second column), or both,
+and string checks have a similarity threshold. With only an absolute tolerance or a threshold, a spec gives
+exactly the outcomes of CHECK_NUMBER_DIFFERENCE or CHECK_STRING_DIFFERENCE. String checks with normalize
+compare the strings after trimming, collapsing whitespace, and ignoring case.
+
+Every check is evaluated into one int8 outcome code matrix, in the encoding of outcomes.py, and the summary
+is counted straight from it. Columns that several checks read are only converted once: the numbers and
+missing values of number columns, and the strings of string columns.
+"""
+import json
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from custom_spreadsheet_functions import CHECK_NUMBER_DIFFERENCE, CHECK_STRING_DIFFERENCE, IMMATERIAL, MATCH, get_string_value_ratios, get_string_values
+from outcomes import (
+    ENCODE_CHECK_OUTCOMES,
+    FAILING,
+    OUTCOME_CODE_FAILING,
+    OUTCOME_CODE_IMMATERIAL,
+    OUTCOME_CODE_MATCH,
+    OUTCOME_CODE_MISSING,
+    RECON_REPORT_OUTCOMES,
+    OutcomeArray
+)
+from utils import ReconRecords
+
+NUMBER_CHECK = 'number'
+STRING_CHECK = 'string'
+CHECK_TYPES = [NUMBER_CHECK, STRING_CHECK]
+
+
+def validate_check_spec(check_spec: dict, columns: Optional[Sequence[str]]=None) -> dict:
+    """
+    Returns the check spec with its defaults filled in, or raises a ValueError describing what is wrong
+    with it. If columns are passed, the columns the check compares must be among them.
+    """
+    if check_spec.get('type') not in CHECK_TYPES:
+        raise ValueError(f'The check {check_spec.get("name")} has type {check_spec.get("type")}. Use one of {", ".join(CHECK_TYPES)}.')
+    if len(check_spec.get('columns', [])) != 2:
+        raise ValueError(f'The check {check_spec.get("name")} must compare exactly two columns.')
+    for column_header in check_spec['columns']:
+        if columns is not None and column_header not in columns:
+            raise ValueError(f'The check {check_spec.get("name")} compares the column {column_header}, which is not in the recon dataframe.')
+
+    if check_spec['type'] == NUMBER_CHECK:
+        return {'tolerance': 0.0, 'relative_tolerance': 0.0, **check_spec}
+    return {'similarity_threshold': 100, 'normalize': False, **check_spec}
+
+
+class CheckInputs:
+    """
+    The converted values of the columns that the checks compare, which are only computed the first
+    time a check reads them, and shared by every check after that.
+    """
+
+    def __init__(self, recon_df: pd.DataFrame):
+        self.recon_df = recon_df
+        self.numbers: Dict[str, np.ndarray] = {}
+        self.strings: Dict[Tuple[str, bool], np.ndarray] = {}
+
+    def get_numbers(self, column_header: str) -> np.ndarray:
+        if column_header not in self.numbers:
+            self.numbers[column_header] = self.recon_df[column_header].to_numpy(dtype='float64', na_value=np.nan)
+        return self.numbers[column_header]
+
+    def get_strings(self, column_header: str, normalize: bool) -> np.ndarray:
+        if (column_header, normalize) not in self.strings:
+            strings = get_string_values(self.recon_df[column_header])
+            if normalize:
+                # Normalize each distinct string once, since text columns are highly repetitive
+                codes, unique_strings = pd.factorize(strings)
+                strings = np.array([' '.join(value.split()).casefold() for value in unique_strings], dtype=object)[codes]
+            self.strings[(column_header, normalize)] = strings
+        return self.strings[(column_header, normalize)]
+
+
+def evaluate_number_check(check_spec: dict, check_inputs: CheckInputs) -> Tuple[np.ndarray, np.ndarray]:
+    values_one = check_inputs.get_numbers(check_spec['columns'][0])
+    values_two = check_inputs.get_numbers(check_spec['columns'][1])
+    diff_values = values_one - values_two
+
+    # Rows where either side is missing are neither matching nor immaterial, like CHECK_NUMBER_DIFFERENCE
+    missing_mask = np.isnan(diff_values)
+    match_mask = diff_values == 0
+    with np.errstate(invalid='ignore'):
+        within_tolerance = (np.abs(diff_values) < check_spec['tolerance']) | (np.abs(diff_values) < check_spec['relative_tolerance'] * np.abs(values_two))
+
+    codes = np.select(
+        [match_mask, within_tolerance, missing_mask],
+        [OUTCOME_CODE_MATCH, OUTCOME_CODE_IMMATERIAL, OUTCOME_CODE_MISSING],
+        default=OUTCOME_CODE_FAILING
+    ).astype('int8')
+    return codes, diff_values
+
+def evaluate_string_check(check_spec: dict, check_inputs: CheckInputs) -> Tuple[np.ndarray, np.ndarray]:
+    ratios = get_string_value_ratios(
+        check_inputs.get_strings(check_spec['columns'][0], check_spec['normalize']),
+        check_inputs.get_strings(check_spec['columns'][1], check_spec['normalize'])
+    )
+
+    codes = np.select(
+        [ratios == 100, ratios > check_spec['similarity_threshold']],
+        [OUTCOME_CODE_MATCH, OUTCOME_CODE_IMMATERIAL],
+        default=OUTCOME_CODE_FAILING
+    ).astype('int8')
+    return codes, ratios.astype('float64')
+
+def encode_check_specs(recon_df: pd.DataFrame, check_specs: List[dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Evaluates every check in one pass, and returns a 2D int8 outcome code array and a 2D float64
+    magnitude array with one column per check, in the order of check_specs. Magnitudes are the
+    difference or similarity of each row, whatever its outcome.
+    """
+    return encode_validated_check_specs(recon_df, [validate_check_spec(check_spec, recon_df.columns) for check_spec in check_specs])
+
+def encode_validated_check_specs(recon_df: pd.DataFrame, check_specs: List[dict]) -> Tuple[np.ndarray, np.ndarray]:
+    # encode_check_specs for specs that validate_check_spec has already filled in
+    check_inputs = CheckInputs(recon_df)
+
+    codes = np.empty((len(recon_df), len(check_specs)), dtype='int8')
+    magnitudes = np.empty((len(recon_df), len(check_specs)), dtype='float64')
+    for check_index, check_spec in enumerate(check_specs):
+        evaluate_check = evaluate_number_check if check_spec['type'] == NUMBER_CHECK else evaluate_string_check
+        codes[:, check_index], magnitudes[:, check_index] = evaluate_check(check_spec, check_inputs)
+
+    return codes, magnitudes
+
+def get_check_labels(check_spec: dict, codes: np.ndarray, magnitudes: np.ndarray) -> np.ndarray:
+    # The labels the CHECK_* formulas return: Match, Immaterial, the difference or similarity of failing rows, and NaN for missing rows
+    failing_values = magnitudes.astype(object) if check_spec['type'] == NUMBER_CHECK else magnitudes.astype('int64').astype(object)
+    failing_values[codes == OUTCOME_CODE_MISSING] = np.nan
+    return np.where(codes == OUTCOME_CODE_MATCH, MATCH, np.where(codes == OUTCOME_CODE_IMMATERIAL, IMMATERIAL, failing_values))
+
+def get_check_outcome_array(check_spec: dict, codes: np.ndarray, magnitudes: np.ndarray) -> OutcomeArray:
+    # The encoded column of the check, which keeps the magnitudes of failing rows only, like the CHECK_* formulas
+    return OutcomeArray(codes, np.where(codes == OUTCOME_CODE_FAILING, magnitudes, np.nan), integral=check_spec['type'] == STRING_CHECK)
+
+
+def evaluate_check_specs(recon_df: pd.DataFrame, check_specs: List[dict], add_check_columns: bool=True) -> Tuple[pd.DataFrame, List[ReconRecords]]:
+    """
+    Evaluates the checks and returns the summary and the (check, outcome) records, like
+    get_recon_report_records, so the result can be saved with save_recon_report. If add_check_columns
+    is set, the records are of a shallow copy of the recon dataframe with an encoded column of each check's
+    outcomes, so the saved exception records show the difference or similarity of each row. The recon
+    dataframe that is passed in is never changed.
+    """
+    now = datetime.now()
+    check_specs = [validate_check_spec(check_spec, recon_df.columns) for check_spec in check_specs]
+    check_names = [check_spec['name'] for check_spec in check_specs]
+    codes, magnitudes = encode_validated_check_specs(recon_df, check_specs)
+
+    if add_check_columns:
+        # Adding columns to a shallow copy doesn't copy the data of the other columns
+        recon_df = recon_df.copy(deep=False)
+        for check_index, check_spec in enumerate(check_specs):
+            recon_df[check_spec['name']] = get_check_outcome_array(check_spec, codes[:, check_index], magnitudes[:, check_index])
+
+    # Count each check's outcomes straight from the codes. Missing values (-1) are not counted
+    counts = np.zeros((len(check_specs), len(RECON_REPORT_OUTCOMES)), dtype='int64')
+    for check_index in range(len(check_specs)):
+        check_codes = codes[:, check_index]
+        counts[check_index] = np.bincount(check_codes[check_codes >= 0], minlength=len(RECON_REPORT_OUTCOMES))
+
+    recon_summary_df = pd.DataFrame({
+        'Date': now,
+        'Check': np.repeat(np.array(check_names, dtype=object), len(RECON_REPORT_OUTCOMES)),
+        'Outcome': np.tile(np.array(RECON_REPORT_OUTCOMES, dtype=object), len(check_specs)),
+        'Count': counts.ravel()
+    })
+
+    recon_records = []
+    for check_index, check_name in enumerate(check_names):
+        check_codes = codes[:, check_index]
+        recon_records.extend([
+            ReconRecords(recon_df, check_name, MATCH, np.flatnonzero(check_codes == OUTCOME_CODE_MATCH)),
+            ReconRecords(recon_df, check_name, IMMATERIAL, np.flatnonzero(check_codes == OUTCOME_CODE_IMMATERIAL)),
+            # Missing values are not counted in the summary, but they are not passing either
+            ReconRecords(recon_df, check_name, FAILING, np.flatnonzero((check_codes != OUTCOME_CODE_MATCH) & (check_codes != OUTCOME_CODE_IMMATERIAL))),
+        ])
+
+    return recon_summary_df, recon_records
+
+
+def CHECK_SPEC(series_one: pd.Series, series_two: pd.Series, check_spec_json: str) -> pd.Series:
+    # Evaluates a check spec on two series, for the recons that take checks as function dicts
+    check_spec = validate_check_spec({**json.loads(check_spec_json), 'columns': ['one', 'two']})
+    recon_df = pd.DataFrame({'one': series_one.to_numpy(), 'two': series_two.to_numpy()})
+    codes, magnitudes = encode_validated_check_specs(recon_df, [check_spec])
+    if ENCODE_CHECK_OUTCOMES.get():
+        return pd.Series(get_check_outcome_array(check_spec, codes[:, 0], magnitudes[:, 0]), index=series_one.index)
+    return pd.Series(get_check_labels(check_spec, codes[:, 0], magnitudes[:, 0]), index=series_one.index, dtype=object)
+
+def get_check_dicts(check_specs: List[dict]) -> List[dict]:
+    """
+    Converts check specs to the check dicts that run_recon_chunked and run_recon_incrementally take.
+    Specs that a CHECK_* formula can evaluate use that formula, and the others use CHECK_SPEC.
+    """
+    check_dicts = []
+    for check_spec in check_specs:
+        check_spec = validate_check_spec(check_spec)
+        check_dict = {'name': check_spec['name'], 'columns': list(check_spec['columns'])}
+
+        if check_spec['type'] == NUMBER_CHECK and check_spec['relative_tolerance'] == 0:
+            check_dict.update({'function': CHECK_NUMBER_DIFFERENCE, 'args': [check_spec['tolerance']]})
+        elif check_spec['type'] == STRING_CHECK and not check_spec['normalize']:
+            check_dict.update({'function': CHECK_STRING_DIFFERENCE, 'args': [check_spec['similarity_threshold']]})
+        else:
+            spec_json = json.dumps({key: value for key, value in check_spec.items() if key not in ('name', 'columns')}, sort_keys=True)
+            check_dict.update({'function': CHECK_SPEC, 'args': [spec_json]})
+
+        check_dicts.append(check_dict)
+    return check_dicts
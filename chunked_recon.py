@@ -0,0 +1,174 @@
+"""
+Out-of-core execution for recons whose sources are too large to fit in memory.
+
+Instead of merging both sources and building the whole report in memory, each source is streamed in chunks
+and split into partitions by a hash of the merge keys, so that every key lands in the same partition in both
+sources. The partitions are then merged and checked one at a time, and only the summary counts and the
+exception records are kept, so memory is bounded by the size of a chunk and of a partition.
+
+Checks are described as dicts, for example:
+
+    checks = [{
+        'name': 'Net Effective Rent Check',
+        'function': CHECK_NUMBER_DIFFERENCE,
+        'columns': ['Net Effective Rent_left', 'Net Effective Rent_right'],
+        'args': [1]
+    }]
+
+The merge keys are read as text in both the chunked and in memory paths, so that they hash the same way in every chunk.
+"""
+import math
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from custom_spreadsheet_functions import IMMATERIAL
+from outcomes import decode_check_columns, encoded_check_outcomes
+from utils import FAILING, get_recon_report_records
+
+# Each partition holds roughly this much of the source files, which bounds how much is in memory at once
+DEFAULT_PARTITION_SIZE_BYTES = 256 * 1024 * 1024
+
+# How many rows are read from a source file at a time
+DEFAULT_CHUNK_SIZE = 100_000
+
+DEFAULT_SUFFIXES = ('_left', '_right')
+
+
+def read_recon_source(path: str, merge_keys: List[str], **kwargs) -> pd.DataFrame:
+    return pd.read_csv(path, dtype={key: str for key in merge_keys}, **kwargs)
+
+def merge_recon_sources(left_df: pd.DataFrame, right_df: pd.DataFrame, merge_keys: List[str], suffixes: Sequence[str]=DEFAULT_SUFFIXES) -> pd.DataFrame:
+    # Remove duplicates so lookup merge only returns first match
+    right_df = right_df.drop_duplicates(subset=merge_keys)
+    return left_df.merge(right_df, on=merge_keys, how='left', suffixes=list(suffixes))
+
+def apply_recon_checks(recon_df: pd.DataFrame, checks: List[dict]) -> pd.DataFrame:
+    # The recon is run for its report, so the check columns are OutcomeArrays
+    with encoded_check_outcomes():
+        for check in checks:
+            column_one, column_two = check['columns']
+            recon_df[check['name']] = check['function'](recon_df[column_one], recon_df[column_two], *check.get('args', []))
+    return recon_df
+
+def run_recon_in_memory(
+        left_path: str,
+        right_path: str,
+        merge_keys: List[str],
+        checks: List[dict],
+        suffixes: Sequence[str]=DEFAULT_SUFFIXES
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Runs the recon with both sources in memory. Returns the summary and the checked recon dataframe.
+    """
+    recon_df = merge_recon_sources(read_recon_source(left_path, merge_keys), read_recon_source(right_path, merge_keys), merge_keys, suffixes)
+    recon_df = apply_recon_checks(recon_df, checks)
+    recon_summary_df, _ = get_recon_report_records(recon_df)
+    return recon_summary_df, recon_df
+
+def get_number_of_partitions(paths: List[str], partition_size_bytes: int) -> int:
+    total_size_bytes = sum(os.path.getsize(path) for path in paths)
+    return max(1, math.ceil(total_size_bytes / partition_size_bytes))
+
+def get_partition_path(folder: str, source_name: str, partition: int) -> str:
+    return os.path.join(folder, f'{source_name}-{partition}.csv')
+
+def partition_recon_source(
+        path: str,
+        source_name: str,
+        merge_keys: List[str],
+        number_of_partitions: int,
+        folder: str,
+        chunk_size: int
+    ):
+    """
+    Streams the source file in chunks, and appends each row to the partition of its merge key. Rows
+    keep their order within a partition, so the first match of a lookup merge is the same as in memory.
+    """
+    written_partitions = set()
+
+    for chunk_df in pd.read_csv(path, dtype={key: str for key in merge_keys}, chunksize=chunk_size):
+        partitions = pd.util.hash_pandas_object(chunk_df[merge_keys], index=False).to_numpy() % number_of_partitions
+
+        for partition in np.unique(partitions):
+            partition_path = get_partition_path(folder, source_name, partition)
+            chunk_df[partitions == partition].to_csv(partition_path, mode='a', index=False, header=partition not in written_partitions)
+            written_partitions.add(partition)
+
+def append_exception_records(recon_records, folder: str, exception_paths: Dict[str, str], exception_outcomes: Sequence[str]):
+    for records in recon_records:
+        if records.outcome not in exception_outcomes or len(records) == 0:
+            continue
+
+        # Overwrite any file left over from a previous run the first time a label is written
+        is_first_write = records.label not in exception_paths
+        path = exception_paths.setdefault(records.label, os.path.join(folder, f'{records.label}.csv'))
+        decode_check_columns(records.to_frame()).to_csv(path, mode='w' if is_first_write else 'a', index=False, header=is_first_write)
+
+def run_recon_chunked(
+        left_path: str,
+        right_path: str,
+        merge_keys: List[str],
+        checks: List[dict],
+        exceptions_folder: str,
+        suffixes: Sequence[str]=DEFAULT_SUFFIXES,
+        exception_outcomes: Optional[Sequence[str]]=None,
+        partition_size_bytes: int=DEFAULT_PARTITION_SIZE_BYTES,
+        chunk_size: int=DEFAULT_CHUNK_SIZE
+    ) -> Tuple[pd.DataFrame, Dict[str, str]]:
+    """
+    Runs the same recon as run_recon_in_memory with bounded memory. Returns the summary, which is
+    identical to the in memory summary, and a dict from each '{check} - {outcome}' label to a CSV
+    file in the exceptions_folder with its records. By default every outcome other than Match is
+    written to the exceptions_folder.
+    """
+    if exception_outcomes is None:
+        exception_outcomes = [IMMATERIAL, FAILING]
+
+    os.makedirs(exceptions_folder, exist_ok=True)
+    partitions_folder = tempfile.mkdtemp(prefix='recon-partitions-')
+
+    try:
+        number_of_partitions = get_number_of_partitions([left_path, right_path], partition_size_bytes)
+        partition_recon_source(left_path, 'left', merge_keys, number_of_partitions, partitions_folder, chunk_size)
+        partition_recon_source(right_path, 'right', merge_keys, number_of_partitions, partitions_folder, chunk_size)
+
+        right_columns = pd.read_csv(right_path, nrows=0).columns
+        counts: Dict[Tuple[str, str], int] = {}
+        exception_paths: Dict[str, str] = {}
+
+        for partition in range(number_of_partitions):
+            left_partition_path = get_partition_path(partitions_folder, 'left', partition)
+            right_partition_path = get_partition_path(partitions_folder, 'right', partition)
+            if not os.path.exists(left_partition_path):
+                continue
+
+            left_df = read_recon_source(left_partition_path, merge_keys)
+            if os.path.exists(right_partition_path):
+                right_df = read_recon_source(right_partition_path, merge_keys)
+            else:
+                right_df = pd.DataFrame(columns=right_columns).astype({key: str for key in merge_keys})
+
+            recon_df = apply_recon_checks(merge_recon_sources(left_df, right_df, merge_keys, suffixes), checks)
+            partition_summary_df, recon_records = get_recon_report_records(recon_df)
+
+            for check, outcome, count in zip(partition_summary_df['Check'], partition_summary_df['Outcome'], partition_summary_df['Count']):
+                counts[(check, outcome)] = counts.get((check, outcome), 0) + int(count)
+
+            append_exception_records(recon_records, exceptions_folder, exception_paths, exception_outcomes)
+    finally:
+        shutil.rmtree(partitions_folder, ignore_errors=True)
+
+    recon_summary_df = pd.DataFrame({
+        'Date': datetime.now(),
+        'Check': pd.Series([check for check, _ in counts.keys()], dtype=object),
+        'Outcome': pd.Series([outcome for _, outcome in counts.keys()], dtype=object),
+        'Count': np.array(list(counts.values()), dtype='int64'),
+    }, columns=['Date', 'Check', 'Outcome', 'Count'])
+
+    return recon_summary_df, exception_paths
@@ -1,11 +1,14 @@
 import pandas as pd
+from caching import snapshot_importer
 
+@snapshot_importer('./db_data/car_sales_db.csv')
 def get_sales_data(cutoff_year: str):
     import pandas as pd
     df = pd.read_csv("./db_data/car_sales_db.csv")
     return df
 
+@snapshot_importer('./db_data/commercial_real_estate_snowflake.csv')
 def get_european_real_estate_data(sector: str):
     import pandas as pd
     df = pd.read_csv("./db_data/commercial_real_estate_snowflake.csv")
-    return df
\ No newline at end of file
+    return df
@@ -1,11 +1,51 @@
 from fuzzywuzzy import fuzz
+import numpy as np
 import pandas as pd
 
-MATCH = 'Match'
-IMMATERIAL = 'Immaterial'
+from outcomes import (
+    ENCODE_CHECK_OUTCOMES,
+    IMMATERIAL,
+    MATCH,
+    OUTCOME_CODE_FAILING,
+    OUTCOME_CODE_IMMATERIAL,
+    OUTCOME_CODE_MATCH,
+    OUTCOME_CODE_MISSING,
+    get_check_outcome_series
+)
+from run_metrics import measured_check
+
+try:
+    from rapidfuzz import process
+    from rapidfuzz.distance import Indel
+except ImportError:
+    process = None
+
+# fuzz.ratio is only backed by the Levenshtein ratio when python-Levenshtein is installed. Otherwise it 
+# falls back to difflib, which scores differently, so we only use the C batch scorer when the two agree.
+USE_BATCH_FUZZY_SCORER = process is not None and fuzz.SequenceMatcher.__module__ == 'fuzzywuzzy.StringMatcher'
+
 FAIL = 'Fail'
 
 
+def get_number_difference_masks(series_one: pd.Series, series_two: pd.Series, tolerance=0.0):
+    """
+    Computes the difference between the two series in a single vectorized pass, and 
+    returns (diff_series, diff_values, match_mask, immaterial_mask, missing_mask).
+
+    Rows where either side is NaN (including rows that did not find a match in a left merge)
+    are neither matching nor immaterial, and are flagged in the missing mask.
+    """
+    diff_series = series_one - series_two
+    diff_values = diff_series.to_numpy(dtype='float64', na_value=np.nan)
+
+    missing_mask = np.isnan(diff_values)
+    match_mask = diff_values == 0
+    immaterial_mask = ~match_mask & (np.abs(diff_values) < tolerance)
+
+    return diff_series, diff_values, match_mask, immaterial_mask, missing_mask
+
+
+@measured_check
 def CHECK_NUMBER_DIFFERENCE(series_one, series_two, tolerance=0.0):
     """
     {
@@ -33,20 +73,25 @@ def CHECK_NUMBER_DIFFERENCE(series_one, series_two, tolerance=0.0):
     }
     """
 
-    # Calculate the difference between the two series
-    diff_series = series_one - series_two
+    diff_series, diff_values, match_mask, immaterial_mask, missing_mask = get_number_difference_masks(series_one, series_two, tolerance)
 
-    def label_difference(diff, tolerance):
-        if diff == 0:
-            return 'Match'
-        if abs(diff) < tolerance:
-            return 'Immaterial'
-        return diff
+    if ENCODE_CHECK_OUTCOMES.get():
+        codes = np.select(
+            [match_mask, immaterial_mask, missing_mask],
+            [OUTCOME_CODE_MATCH, OUTCOME_CODE_IMMATERIAL, OUTCOME_CODE_MISSING],
+            default=OUTCOME_CODE_FAILING
+        ).astype('int8')
+        magnitudes = np.where(codes == OUTCOME_CODE_FAILING, diff_values, np.nan)
+        return get_check_outcome_series(codes, magnitudes, diff_series.index, integral=pd.api.types.is_integer_dtype(diff_series.dtype), name=diff_series.name)
 
-    # Create a new column based on the tolerance
-    return diff_series.apply(lambda diff: label_difference(diff, tolerance))
+    # Label the whole column in one masked pass. Failing rows keep their original difference, 
+    # and rows with a missing value keep NaN so existing recons report them exactly as before.
+    labels = np.where(match_mask, MATCH, np.where(immaterial_mask, IMMATERIAL, diff_series.to_numpy(dtype=object)))
 
+    return pd.Series(labels, index=diff_series.index, name=diff_series.name, dtype=object)
 
+
+@measured_check
 def CHECK_STRING_DIFFERENCE(series_one, series_two, similarity_threshold=100):
     """
     {
@@ -74,14 +119,75 @@ def CHECK_STRING_DIFFERENCE(series_one, series_two, similarity_threshold=100):
     }
     """
 
-    def label_fuzzy_ratio(value1, value2, similarity_threshold):
-        ratio = fuzz.ratio(str(value1), str(value2))
+    ratios = get_fuzzy_ratios(series_one, series_two)
+
+    if ENCODE_CHECK_OUTCOMES.get():
+        codes = np.select([ratios == 100, ratios > similarity_threshold], [OUTCOME_CODE_MATCH, OUTCOME_CODE_IMMATERIAL], default=OUTCOME_CODE_FAILING).astype('int8')
+        magnitudes = np.where(codes == OUTCOME_CODE_FAILING, ratios, np.nan)
+        return get_check_outcome_series(codes, magnitudes, series_one.index, integral=True)
+
+    labels = np.where(ratios == 100, MATCH, np.where(ratios > similarity_threshold, IMMATERIAL, ratios.astype(object)))
+
+    return pd.Series(labels, index=series_one.index, dtype=object)
+
+
+def get_fuzzy_ratios(series_one, series_two) -> np.ndarray:
+    """
+    Returns fuzz.ratio(str(value_one), str(value_two)) for each pair of values, scored as a batch:
+    1. Pairs whose strings are exactly equal are short-circuited to 100 without scoring
+    2. The remaining pairs are deduplicated, so repeated (left, right) pairs are only scored once
+    3. The unique pairs are scored by rapidfuzz's C scorer when it gives the same results as fuzz.ratio
+    """
+    return get_string_value_ratios(get_string_values(series_one), get_string_values(series_two))
+
+
+def get_string_value_ratios(left_values: np.ndarray, right_values: np.ndarray) -> np.ndarray:
+    # get_fuzzy_ratios for values that are already converted to strings
+    ratios = np.full(len(left_values), 100, dtype='int64')
+
+    not_equal_positions = np.flatnonzero(left_values != right_values)
+    if len(not_equal_positions) == 0:
+        return ratios
+
+    pair_codes, unique_pairs = pd.MultiIndex.from_arrays([
+        left_values[not_equal_positions], 
+        right_values[not_equal_positions]
+    ]).factorize()
+
+    unique_ratios = score_unique_pairs(
+        unique_pairs.get_level_values(0).to_numpy(dtype=object),
+        unique_pairs.get_level_values(1).to_numpy(dtype=object)
+    )
+    ratios[not_equal_positions] = unique_ratios[pair_codes]
+
+    return ratios
+
+
+def get_string_values(series) -> np.ndarray:
+    """
+    Returns str(value) for each value in the series. Columns that only hold strings are converted 
+    once per unique value, since tenant names and other text columns are highly repetitive.
+    """
+    series = pd.Series(series)
+
+    if isinstance(series.dtype, pd.StringDtype) or pd.api.types.infer_dtype(series, skipna=False) == 'string':
+        codes, uniques = pd.factorize(series, use_na_sentinel=False)
+        unique_strings = np.array([str(value) for value in uniques], dtype=object)
+        return unique_strings[codes]
+
+    return np.array([str(value) for value in series], dtype=object)
+
+
+def score_unique_pairs(left_values: np.ndarray, right_values: np.ndarray) -> np.ndarray:
+    if not USE_BATCH_FUZZY_SCORER:
+        return np.array([fuzz.ratio(value_one, value_two) for value_one, value_two in zip(left_values, right_values)], dtype='int64')
+
+    similarities = process.cpdist(list(left_values), list(right_values), scorer=Indel.normalized_similarity, dtype=np.float64, workers=-1)
 
-        if ratio == 100:
-            return 'Match'
-        if ratio > similarity_threshold:
-            return 'Immaterial'
-        return ratio
+    # fuzz.ratio scores an empty string as 0, and rounds the ratio to the nearest integer with round()
+    empty_mask = np.array([len(value_one) == 0 or len(value_two) == 0 for value_one, value_two in zip(left_values, right_values)], dtype=bool)
+    ratios = np.round(100 * similarities).astype('int64')
+    ratios[empty_mask] = 0
 
-    return pd.Series([label_fuzzy_ratio(val1, val2, similarity_threshold) for val1, val2 in zip(series_one, series_two)], index=series_one.index)
+    return ratios
 
@@ -0,0 +1,7 @@
+#!/bin/bash -eu
+
+echo "Compacting the run history"
+
+python -c "from run_history import compact_run_history; compact_run_history()"
+
+echo "Finished compacting the run history"
@@ -0,0 +1,10 @@
+#!/bin/bash -eu
+
+echo "Migrating the CSV outputs into the run history"
+
+python -c "from run_history import migrate_csv_outputs_to_run_history, compact_run_history; from utils import OUTPUTS_FOLDER; print(f'Migrated {migrate_csv_outputs_to_run_history(OUTPUTS_FOLDER)} runs'); compact_run_history()"
+
+# The trends page is built from the run history, so rebuild it to include the migrated runs
+python -c "from utils import rebuild_recon_trends; rebuild_recon_trends()"
+
+echo "Finished migrating the run history"
@@ -0,0 +1,7 @@
+#!/bin/bash -eu
+
+echo "Reconciling the run registry with the outputs folder"
+
+python -c "from utils import rebuild_recon_rollup; rebuild_recon_rollup()"
+
+echo "Finished reconciling the run registry"
@@ -6,23 +6,22 @@ echo "Resetting app"
 rm -rf outputs/
 mkdir outputs
 
+# Clear the run history, exception records, exports, and incremental state
+rm -rf run_history/
+rm -rf exception_records/
+rm -rf exports/
+rm -rf incremental_state/
+
 # Clear the recon-scripts directory
 rm -rf recon-scripts/
 mkdir recon-scripts
 
-# Remove the metadata file
+# Remove the metadata and run registry
 rm -rf recon_metadata.csv
+rm -rf recon_store.db recon_store.db-wal recon_store.db-shm
 
-# Remove all of the pages that are not called 🆕Recon.py
-mkdir tmp
-mv Pages/🆕\ Create\ New\ Recon.py /tmp
-
-# Remove all files in the directory
-rm -rf Pages/*
-
-# Move the preserved file back to the original directory
-mv /tmp/🆕\ Create\ New\ Recon.py Pages/
-rm -rf tmp
+# Remove the pages that older versions of the app generated for each recon
+rm -f Pages/Recon:\ *.py
 
 echo "Finished resetting app"
 
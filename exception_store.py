@@ -0,0 +1,166 @@
+import json
+import os
+from typing import List, Optional
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from custom_spreadsheet_functions import MATCH
+from outcomes import OutcomeArray, encode_check_series, get_check_columns
+
+# Path to the "exception_records" folder, which stores the Immaterial and Failing records of each
+# run as exception_records/RECON_NAME/RUN_ID.parquet, with an index of where each record set starts
+EXCEPTION_RECORDS_FOLDER = 'exception_records/'
+
+# Rows per Parquet row group. A page of records only reads the row groups it overlaps
+EXCEPTION_RECORDS_ROW_GROUP_SIZE = 10_000
+
+# Check columns are stored as their int8 outcome codes, with the float64 magnitudes in a column with this suffix
+MAGNITUDE_COLUMN_SUFFIX = ' (magnitude)'
+
+
+def get_exception_records_folder(recon_name: str) -> str:
+    return os.path.join(EXCEPTION_RECORDS_FOLDER, quote(recon_name, safe=' '))
+
+def get_exception_records_path(recon_name: str, run_id: str) -> str:
+    return os.path.join(get_exception_records_folder(recon_name), f'{run_id}.parquet')
+
+def get_exception_records_index_path(recon_name: str, run_id: str) -> str:
+    return os.path.join(get_exception_records_folder(recon_name), f'{run_id}.index.json')
+
+def get_storable_records(records_df: pd.DataFrame, check_columns: List[str]) -> pd.DataFrame:
+    records_df = records_df.copy()
+
+    # Check columns are stored as their codes and magnitudes
+    for column_header in check_columns:
+        codes, magnitudes = encode_check_series(records_df[column_header])
+        records_df[column_header] = codes
+        records_df.insert(records_df.columns.get_loc(column_header) + 1, f'{column_header}{MAGNITUDE_COLUMN_SUFFIX}', magnitudes)
+
+    # Other object columns are stored as text
+    for column_header in records_df.columns:
+        if records_df[column_header].dtype == object:
+            records_df[column_header] = records_df[column_header].astype('string')
+    records_df.columns = [str(column_header) for column_header in records_df.columns]
+    return records_df
+
+def save_exception_records(recon_name: str, run_id: str, recon_records: list):
+    """
+    Saves the records of every (check, outcome) other than Match for a run. The record sets are written
+    one after another in row groups, in slices so that only one slice is copied out of the recon dataframe
+    at a time, along with an index of the first row and the number of rows of each record set.
+    """
+    exception_records = [records for records in recon_records if records.outcome != MATCH]
+    if len(exception_records) == 0:
+        return
+
+    folder = get_exception_records_folder(recon_name)
+    os.makedirs(folder, exist_ok=True)
+
+    path = get_exception_records_path(recon_name, run_id)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    check_columns = get_check_columns(exception_records[0].recon_df)
+    # Checks whose failing magnitudes are whole numbers, like string similarities, are read back as integers
+    integral_check_columns = [column_header for column_header in check_columns if getattr(exception_records[0].recon_df[column_header].array, 'integral', False)]
+    schema = pa.Schema.from_pandas(get_storable_records(exception_records[0].to_frame(0, 0), check_columns), preserve_index=False)
+
+    record_sets = []
+    start = 0
+    with pq.ParquetWriter(temp_path, schema, compression='zstd') as writer:
+        for records in exception_records:
+            for slice_start in range(0, len(records), EXCEPTION_RECORDS_ROW_GROUP_SIZE):
+                records_df = get_storable_records(records.to_frame(slice_start, slice_start + EXCEPTION_RECORDS_ROW_GROUP_SIZE), check_columns)
+                writer.write_table(pa.Table.from_pandas(records_df, schema=schema, preserve_index=False), row_group_size=EXCEPTION_RECORDS_ROW_GROUP_SIZE)
+
+            record_sets.append({'check': str(records.check), 'outcome': records.outcome, 'start': start, 'count': len(records)})
+            start += len(records)
+
+    os.replace(temp_path, path)
+
+    index_path = get_exception_records_index_path(recon_name, run_id)
+    with open(f'{index_path}.tmp', 'w') as file:
+        json.dump({
+            'record_sets': record_sets,
+            'encoded_check_columns': [str(column_header) for column_header in check_columns],
+            'integral_check_columns': [str(column_header) for column_header in integral_check_columns]
+        }, file)
+    os.replace(f'{index_path}.tmp', index_path)
+
+def remove_exception_records(recon_name: str, run_id: str):
+    # Removes the records of a run, including a partly written file
+    path = get_exception_records_path(recon_name, run_id)
+    for file_path in [path, f'{path}.{os.getpid()}.tmp', get_exception_records_index_path(recon_name, run_id)]:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+def read_exception_records_index(recon_name: str, run_id: str) -> dict:
+    try:
+        with open(get_exception_records_index_path(recon_name, run_id), 'r') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {'record_sets': []}
+
+def get_exception_record_sets(recon_name: str, run_id: str) -> List[dict]:
+    """
+    Returns the check, outcome, and number of records of each record set saved for the run.
+    """
+    return read_exception_records_index(recon_name, run_id)['record_sets']
+
+def decode_exception_records(records_df: pd.DataFrame, encoded_check_columns: List[str], integral_check_columns: List[str]) -> pd.DataFrame:
+    # Read the encoded check columns back into OutcomeArrays, like the check formulas return during a report run
+    for column_header in encoded_check_columns:
+        magnitude_column_header = f'{column_header}{MAGNITUDE_COLUMN_SUFFIX}'
+        records_df[column_header] = OutcomeArray(
+            records_df[column_header].to_numpy(dtype='int8'),
+            records_df[magnitude_column_header].to_numpy(dtype='float64'),
+            integral=column_header in integral_check_columns
+        )
+        records_df = records_df.drop(columns=[magnitude_column_header])
+    return records_df
+
+def get_exception_run_ids(recon_name: str) -> List[str]:
+    # Returns the runs of the recon that have saved exception records, most recent first
+    folder = get_exception_records_folder(recon_name)
+    if not os.path.exists(folder):
+        return []
+    return sorted((file[:-len('.index.json')] for file in os.listdir(folder) if file.endswith('.index.json')), reverse=True)
+
+def read_exception_records_page(
+        recon_name: str,
+        run_id: str,
+        check: str,
+        outcome: str,
+        page: int=0,
+        page_size: int=100
+    ) -> Optional[pd.DataFrame]:
+    """
+    Returns one page of the records of the (check, outcome) for the run, reading only the row
+    groups that the page overlaps, with the check columns as OutcomeArrays. Returns None if no
+    records were saved for the (check, outcome).
+    """
+    exception_records_index = read_exception_records_index(recon_name, run_id)
+    encoded_check_columns = exception_records_index.get('encoded_check_columns', [])
+    integral_check_columns = exception_records_index.get('integral_check_columns', [])
+
+    record_set = next((record_set for record_set in exception_records_index['record_sets'] if record_set['check'] == check and record_set['outcome'] == outcome), None)
+    if record_set is None:
+        return None
+
+    page_start = record_set['start'] + min(page * page_size, record_set['count'])
+    page_stop = record_set['start'] + min((page + 1) * page_size, record_set['count'])
+    if page_start >= page_stop:
+        magnitude_column_headers = {f'{column_header}{MAGNITUDE_COLUMN_SUFFIX}' for column_header in encoded_check_columns}
+        return pd.DataFrame(columns=[column_header for column_header in pq.read_schema(get_exception_records_path(recon_name, run_id)).names if column_header not in magnitude_column_headers])
+
+    parquet_file = pq.ParquetFile(get_exception_records_path(recon_name, run_id))
+    row_group_starts = np.cumsum([0] + [parquet_file.metadata.row_group(i).num_rows for i in range(parquet_file.num_row_groups)])
+
+    first_row_group = int(np.searchsorted(row_group_starts, page_start, side='right')) - 1
+    last_row_group = int(np.searchsorted(row_group_starts, page_stop - 1, side='right')) - 1
+
+    table = parquet_file.read_row_groups(list(range(first_row_group, last_row_group + 1)))
+    offset = page_start - row_group_starts[first_row_group]
+    return decode_exception_records(table.slice(offset, page_stop - page_start).to_pandas(), encoded_check_columns, integral_check_columns)
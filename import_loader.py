@@ -0,0 +1,204 @@
+"""
+Loads the import steps of a recon analysis concurrently.
+
+The function Mito generates for an analysis imports each source one after another, so a recon that
+reads the Snowflake extract and two lease files waits for the sum of the three. The import steps don't
+depend on each other, so the loader finds them in the generated function, loads them in a bounded
+thread pool, and then runs the function with the loaded dataframes in place of the import steps. The
+time spent importing is then roughly that of the slowest source.
+
+An import step is a statement like
+
+    Warehouse_REIT_v1 = pd.read_csv(file_name_import_csv_0)
+    df0 = get_european_real_estate_data(sector='Commercial')
+
+that calls a pandas reader or a custom importer with only constants and the function's parameters.
+Analyses without import steps, and parameters that are not plain values like paths, are run with
+analysis.run() as usual.
+"""
+import ast
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from outcomes import encoded_check_outcomes
+from run_metrics import CURRENT_RUN_METRICS, PEAK_RSS_SAMPLER
+
+# How many sources are loaded at once
+IMPORT_LOADER_MAX_WORKERS = int(os.environ.get('RECON_IMPORT_LOADER_MAX_WORKERS', 4))
+
+# The pandas readers that Mito uses to import files
+PANDAS_READER_NAMES = {'read_csv', 'read_excel', 'read_parquet', 'read_json', 'read_feather'}
+
+# The modules the custom importers are imported from in the generated code
+IMPORTER_MODULE_NAMES = {'custom_imports'}
+
+# The name the loaded dataframes are available under when the generated function runs
+IMPORTED_DFS_NAME = '__recon_imported_dfs__'
+
+
+class ImportSourceError(Exception):
+    """
+    Raised when one or more sources of an analysis fail to load. The import report, with the
+    timing and error of every source, is available as .import_report.
+    """
+
+    def __init__(self, import_report: List[dict]):
+        self.import_report = import_report
+        failed_sources = '\n'.join(f'{source["name"]} ({source["source"]}): {source["error"]}' for source in import_report if source['error'] is not None)
+        super().__init__(f'Failed to load the sources:\n{failed_sources}')
+
+
+def get_importer_names(module: ast.Module) -> set:
+    importer_names = set()
+    for node in module.body:
+        if isinstance(node, ast.ImportFrom) and node.module in IMPORTER_MODULE_NAMES:
+            importer_names.update(alias.asname or alias.name for alias in node.names)
+    return importer_names
+
+def is_import_call(node: ast.AST, importer_names: set, param_names: set) -> bool:
+    if not isinstance(node, ast.Call):
+        return False
+
+    function = node.func
+    is_pandas_reader = isinstance(function, ast.Attribute) and isinstance(function.value, ast.Name) and function.value.id == 'pd' and function.attr in PANDAS_READER_NAMES
+    is_importer = isinstance(function, ast.Name) and function.id in importer_names
+    if not is_pandas_reader and not is_importer:
+        return False
+
+    # The step can only be loaded ahead of time if its arguments don't depend on earlier steps
+    arguments = node.args + [keyword.value for keyword in node.keywords]
+    for argument in arguments:
+        for argument_node in ast.walk(argument):
+            if isinstance(argument_node, ast.Name) and argument_node.id not in param_names:
+                return False
+            if isinstance(argument_node, (ast.Call, ast.Attribute, ast.Starred, ast.Lambda, ast.NamedExpr)):
+                return False
+    return True
+
+def get_import_steps(module: ast.Module) -> Tuple[Optional[ast.FunctionDef], List[ast.Assign]]:
+    """
+    Returns the generated function of the analysis and its import steps, which are the statements at
+    the top level of the function that assign the result of an import call to a single name.
+    """
+    function_defs = [node for node in module.body if isinstance(node, ast.FunctionDef)]
+    if len(function_defs) != 1:
+        return None, []
+
+    function_def = function_defs[0]
+    importer_names = get_importer_names(module)
+    param_names = {arg.arg for arg in function_def.args.args + function_def.args.kwonlyargs}
+
+    import_steps = [
+        node for node in function_def.body
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name)
+        and is_import_call(node.value, importer_names, param_names)
+    ]
+    return function_def, import_steps
+
+def get_source_description(import_call: ast.Call, namespace: dict, params: Dict[str, Any]) -> str:
+    # Files are described by their path, and custom importers by the call with its arguments
+    if isinstance(import_call.func, ast.Attribute) and len(import_call.args) > 0:
+        return str(eval(compile(ast.Expression(import_call.args[0]), '<import>', 'eval'), namespace, dict(params)))
+    return ast.unparse(import_call)
+
+def get_number_of_rows(imported: Any) -> Optional[int]:
+    if isinstance(imported, pd.DataFrame):
+        return len(imported)
+    if isinstance(imported, dict):
+        # read_excel returns a dataframe per sheet when it imports several sheets
+        return sum(len(df) for df in imported.values() if isinstance(df, pd.DataFrame))
+    return None
+
+def is_plain_param_value(value: Any) -> bool:
+    # Paths and other constants, which analysis.run() passes to the function as they are
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
+def load_import_sources(import_calls: List[Tuple[str, ast.Call]], namespace: dict, params: Dict[str, Any], max_workers: int) -> Tuple[List[Any], List[dict]]:
+    """
+    Runs the (name, import call) pairs in a thread pool and returns what each one imported, along with
+    a report of the name, source, rows, seconds, and error of each source. Raises ImportSourceError once
+    every source has finished if any of them failed, so every failing source is reported at once.
+    """
+    def load(name_and_import_call: Tuple[str, ast.Call]) -> Tuple[Any, dict]:
+        name, import_call = name_and_import_call
+        source_report = {'name': name, 'source': ast.unparse(import_call), 'rows': None, 'seconds': 0.0, 'error': None}
+        start = time.perf_counter()
+        try:
+            source_report['source'] = get_source_description(import_call, namespace, params)
+            imported = eval(compile(ast.Expression(import_call), '<import>', 'eval'), namespace, dict(params))
+            source_report['rows'] = get_number_of_rows(imported)
+        except Exception as e:
+            imported = None
+            source_report['error'] = f'{type(e).__name__}: {e}'
+        source_report['seconds'] = time.perf_counter() - start
+        return imported, source_report
+
+    run_metrics = CURRENT_RUN_METRICS.get()
+    peak_rss_token = PEAK_RSS_SAMPLER.start() if run_metrics is not None and run_metrics.enabled else None
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(import_calls)))) as executor:
+        loaded_sources = list(executor.map(load, import_calls))
+    wall_seconds = time.perf_counter() - start
+    peak_rss_mb = PEAK_RSS_SAMPLER.stop(peak_rss_token)
+
+    imported_dfs = [imported for imported, _ in loaded_sources]
+    import_report = [source_report for _, source_report in loaded_sources]
+
+    # The imports ran in other threads, so record them on the current run from here
+    if run_metrics is not None:
+        run_metrics.add_concurrent_stages('import', [{'detail': f'{source["name"]}: {source["source"]}', 'rows': source['rows'], 'seconds': source['seconds']} for source in import_report], wall_seconds, peak_rss_mb)
+
+    if any(source['error'] is not None for source in import_report):
+        raise ImportSourceError(import_report)
+
+    return imported_dfs, import_report
+
+
+def run_analysis_with_concurrent_imports(analysis, params: Optional[Dict[str, Any]]=None, max_workers: int=IMPORT_LOADER_MAX_WORKERS) -> Tuple[Any, List[dict]]:
+    """
+    Runs the analysis like analysis.run(**params), but loads its sources concurrently. Returns what
+    the analysis returns, and the import report of its sources. The analysis is run for its report, so
+    its check columns are OutcomeArrays.
+    """
+    params = params or {}
+    module = ast.parse(analysis.fully_parameterized_function)
+    function_def, import_steps = get_import_steps(module)
+    if function_def is None or len(import_steps) == 0:
+        with encoded_check_outcomes():
+            return analysis.run(**params), []
+
+    # analysis.run() checks the parameters and converts some of them, like a dataframe passed for a
+    # file path, so let it handle anything other than known parameters bound to plain values
+    param_metadata = analysis.get_param_metadata()
+    param_names = {param['name'] for param in param_metadata}
+    if any(name not in param_names or not is_plain_param_value(value) for name, value in params.items()):
+        with encoded_check_outcomes():
+            return analysis.run(**params), []
+
+    # Parameters that are not passed keep the value the analysis was saved with
+    function_params = {param['name']: param['original_value'] for param in param_metadata}
+    function_params.update(params)
+
+    # Replace each import step with a lookup of what the loader imported for it
+    import_calls = [(import_step.targets[0].id, import_step.value) for import_step in import_steps]
+    for index, import_step in enumerate(import_steps):
+        import_step.value = ast.Subscript(value=ast.Name(id=IMPORTED_DFS_NAME, ctx=ast.Load()), slice=ast.Constant(value=index), ctx=ast.Load())
+    ast.fix_missing_locations(module)
+
+    # Define the function, and its imports, which the import calls need too
+    namespace: Dict[str, Any] = {}
+    exec(compile(module, f'<{function_def.name}>', 'exec'), namespace)
+
+    function_param_names = [arg.arg for arg in function_def.args.args]
+    function_params = {name: value for name, value in function_params.items() if name in function_param_names}
+
+    imported_dfs, import_report = load_import_sources(import_calls, namespace, function_params, max_workers)
+    namespace[IMPORTED_DFS_NAME] = imported_dfs
+
+    with encoded_check_outcomes():
+        return namespace[function_def.name](**function_params), import_report
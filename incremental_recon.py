@@ -0,0 +1,135 @@
+"""
+Incremental reruns for recons whose sources mostly don't change between runs.
+
+Each run saves the state of every row of the recon: a hash of its merge keys, a hash of the left row and the
+right row it merged with, and the outcome code of each check. The next run hashes the new sources the same
+way, and only merges and checks the rows that are new or whose hash changed. The outcomes of every other row
+are copied from the previous state, so the cost of a rerun is roughly the size of the changes.
+
+Checks are described the same way as in chunked_recon.py.
+"""
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from chunked_recon import DEFAULT_SUFFIXES, apply_recon_checks, merge_recon_sources
+from utils import RECON_REPORT_OUTCOMES
+
+# Path to the "incremental_state" folder, which stores the row state of the last run of each recon
+INCREMENTAL_STATE_FOLDER = 'incremental_state/'
+
+
+def get_incremental_state_path(recon_name: str) -> str:
+    return os.path.join(INCREMENTAL_STATE_FOLDER, f'{quote(recon_name, safe=" ")}.parquet')
+
+def get_checks_fingerprint(checks: List[dict], merge_keys: List[str], suffixes: Sequence[str]) -> str:
+    # If the checks or the merge change, none of the previous outcomes can be reused
+    checks_description = [[check['name'], check['function'].__name__, list(check['columns']), [repr(arg) for arg in check.get('args', [])]] for check in checks]
+    return hashlib.sha256(json.dumps([checks_description, list(merge_keys), list(suffixes)]).encode('utf-8')).hexdigest()
+
+def hash_rows(df: pd.DataFrame) -> np.ndarray:
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+def get_row_state(left_df: pd.DataFrame, right_df: pd.DataFrame, merge_keys: List[str]) -> pd.DataFrame:
+    """
+    Returns the identity of each left row, which is the hash of its merge keys and how many rows
+    with the same keys came before it, and a hash of the left row and the right row it merges with.
+    """
+    right_df = right_df.drop_duplicates(subset=merge_keys)
+    right_row_hashes = pd.Series(hash_rows(right_df), index=hash_rows(right_df[merge_keys]))
+
+    left_key_hashes = hash_rows(left_df[merge_keys])
+    matched_right_row_hashes = pd.Series(left_key_hashes).map(right_row_hashes).fillna(0).astype('uint64').to_numpy()
+
+    row_state_df = pd.DataFrame({
+        'key_hash': left_key_hashes,
+        'occurrence': pd.Series(left_key_hashes).groupby(left_key_hashes).cumcount().to_numpy(),
+    })
+    row_state_df['row_hash'] = hash_rows(pd.DataFrame({'left': hash_rows(left_df), 'right': matched_right_row_hashes}))
+    return row_state_df
+
+def read_incremental_state(recon_name: str, checks_fingerprint: str) -> Optional[pd.DataFrame]:
+    path = get_incremental_state_path(recon_name)
+    if not os.path.exists(path):
+        return None
+
+    previous_state_df = pd.read_parquet(path)
+    if previous_state_df.attrs.get('checks_fingerprint') != checks_fingerprint:
+        return None
+    return previous_state_df
+
+def write_incremental_state(recon_name: str, state_df: pd.DataFrame, checks_fingerprint: str):
+    os.makedirs(INCREMENTAL_STATE_FOLDER, exist_ok=True)
+    state_df.attrs['checks_fingerprint'] = checks_fingerprint
+
+    path = get_incremental_state_path(recon_name)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    state_df.to_parquet(temp_path, index=False)
+    os.replace(temp_path, path)
+
+def run_recon_incrementally(
+        recon_name: str,
+        left_df: pd.DataFrame,
+        right_df: pd.DataFrame,
+        merge_keys: List[str],
+        checks: List[dict],
+        suffixes: Sequence[str]=DEFAULT_SUFFIXES
+    ) -> Tuple[pd.DataFrame, Dict[str, int]]:
+    """
+    Runs the recon, only merging and checking the left rows that are new or changed since the last
+    incremental run of this recon. Returns the summary, which is identical to the summary of running
+    the recon on all of the rows, and the number of rows that were checked and reused.
+    """
+    checks_fingerprint = get_checks_fingerprint(checks, merge_keys, suffixes)
+    check_names = [check['name'] for check in checks]
+
+    state_df = get_row_state(left_df, right_df, merge_keys)
+    previous_state_df = read_incremental_state(recon_name, checks_fingerprint)
+
+    number_of_removed_rows = 0
+    if previous_state_df is None:
+        changed_mask = np.ones(len(state_df), dtype=bool)
+        outcome_codes = np.empty((len(state_df), len(checks)), dtype='int8')
+    else:
+        state_df = state_df.merge(
+            previous_state_df.rename(columns={'row_hash': 'previous_row_hash'}),
+            on=['key_hash', 'occurrence'],
+            how='left',
+            indicator=True
+        )
+        number_of_removed_rows = len(previous_state_df) - int((state_df['_merge'] == 'both').sum())
+        changed_mask = (state_df['previous_row_hash'] != state_df['row_hash']).to_numpy()
+        outcome_codes = state_df[check_names].fillna(0).to_numpy(dtype='int8', copy=True)
+
+    # Merge and check only the changed rows, and patch their outcomes into the previous outcomes
+    changed_positions = np.flatnonzero(changed_mask)
+    if len(changed_positions) > 0:
+        changed_recon_df = apply_recon_checks(merge_recon_sources(left_df.iloc[changed_positions], right_df, merge_keys, suffixes), checks)
+        outcome_codes[changed_positions] = changed_recon_df.outcomes.codes(check_names)
+
+    new_state_df = state_df[['key_hash', 'occurrence', 'row_hash']].copy()
+    for check_index, check_name in enumerate(check_names):
+        new_state_df[check_name] = outcome_codes[:, check_index]
+    write_incremental_state(recon_name, new_state_df, checks_fingerprint)
+
+    # Count the outcomes of each check, leaving missing values (-1) out like get_recon_report does
+    now = datetime.now()
+    summary_rows = []
+    for check_index, check_name in enumerate(check_names):
+        counts = np.bincount(outcome_codes[:, check_index][outcome_codes[:, check_index] >= 0], minlength=len(RECON_REPORT_OUTCOMES))
+        summary_rows.extend([now, check_name, outcome, int(count)] for outcome, count in zip(RECON_REPORT_OUTCOMES, counts))
+
+    recon_summary_df = pd.DataFrame(summary_rows, columns=['Date', 'Check', 'Outcome', 'Count']).astype({'Check': object, 'Outcome': object})
+
+    return recon_summary_df, {
+        'rows': len(state_df),
+        'checked_rows': len(changed_positions),
+        'reused_rows': len(state_df) - len(changed_positions),
+        'removed_rows': number_of_removed_rows,
+    }
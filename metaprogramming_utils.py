@@ -1,7 +1,6 @@
 import os
-from utils import get_recon_names
-import streamlit as st
-import pandas as pd
+from utils import OUTPUTS_FOLDER, add_recon_to_metadata, get_recon_names
+from recon_store import get_recon_metadata
 
 def create_new_recon(recon_name, recon_description, recon_value):
     # When this streamlit page is loaded, the form gets submitted with empty values, 
@@ -12,30 +11,14 @@ def create_new_recon(recon_name, recon_description, recon_value):
         return False, 'Please enter a recon description.'
 
     # Get the existing recon names to make sure we don't duplicate
-    existing_recon_names = get_recon_names()
+    existing_recon_names = set(get_recon_names()) | set(get_recon_metadata()['recon_name'])
     if recon_name in existing_recon_names:
         return False, f'The recon name {recon_name} already exists. Please choose a different name.'
 
     # Add subdirectory to outputs file
-    os.mkdir(f"outputs/{recon_name}")
+    os.makedirs(os.path.join(OUTPUTS_FOLDER, recon_name), exist_ok=True)
 
-    new_recon_file_path = f"pages/Recon: {recon_name}.py"
-
-    # Duplicate the recon_wizard_template.py file and rename it to the new recon name
-    with open('./recon_wizard_template.py', 'r') as f:
-        template_file_contents = f.read()
-
-        # Replace the placeholder text with the new recon name
-        template_file_contents = template_file_contents.replace("MITO_PLACEHOLDER__REPLACE_WITH_RECON_NAME", recon_name)
-        template_file_contents = template_file_contents.replace("MITO_PLACEHOLDER__REPLACE_WITH_RECON_DESCRIPTION", recon_description)
-        template_file_contents = template_file_contents.replace("MITO_PLACEHOLDER__REPLACE_WITH_RECON_VALUE", str(recon_value))
-
-        # Write the new file to the pages folder
-        with open(new_recon_file_path, 'w') as new_recon_file:
-            new_recon_file.write(template_file_contents)
+    # Register the recon in the recon store, which the recon page reads the list of recons from
+    add_recon_to_metadata(recon_name, recon_description, recon_value)
 
     return True, None
-
-
-
-    
\ No newline at end of file
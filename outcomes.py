@@ -0,0 +1,313 @@
+"""
+A compact encoding of check outcomes.
+
+Check columns used to be columns of Python objects: 'Match', 'Immaterial', or the difference or
+similarity of a failing row, which are large in memory and slow to compare. The encoding keeps each
+check as an int8 outcome code and a float64 magnitude, which is the difference or similarity of failing
+rows and NaN otherwise. Magnitudes are kept at full precision, since they are saved with the exception
+records and exported.
+
+When a recon is run for its report, the check formulas return their column as an OutcomeArray, a pandas
+extension array that holds the codes and magnitudes, so the report, the exception records and the exports
+read them without converting the column. The familiar labels are only built when the column is displayed,
+or converted with astype(object). In the Mito spreadsheet, the check formulas return the labels as before.
+
+    with encoded_check_outcomes():
+        recon_df = analysis_function()
+    recon_df['Rent Check'].outcome.codes        # int8 codes, see OUTCOME_CODES
+    recon_df['Rent Check'].outcome.magnitudes   # float64 magnitudes
+    recon_df.outcomes.codes()                   # int8 codes of every check column, one column per check
+
+Label columns, like the ones Mito returns, are encoded when the accessors read them.
+"""
+import contextlib
+import numbers
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pandas.api.extensions import ExtensionArray, ExtensionDtype, register_extension_dtype, take
+
+MATCH = 'Match'
+IMMATERIAL = 'Immaterial'
+
+# The outcome used in the recon summary for records that neither matched nor were immaterial
+FAILING = 'Failing'
+RECON_REPORT_OUTCOMES = [MATCH, IMMATERIAL, FAILING]
+
+# Each outcome is coded as its index in RECON_REPORT_OUTCOMES. Missing values are coded
+# as -1, so they are not counted in the summary
+OUTCOME_CODE_MISSING = -1
+OUTCOME_CODE_MATCH = 0
+OUTCOME_CODE_IMMATERIAL = 1
+OUTCOME_CODE_FAILING = 2
+OUTCOME_CODES = {MATCH: OUTCOME_CODE_MATCH, IMMATERIAL: OUTCOME_CODE_IMMATERIAL, FAILING: OUTCOME_CODE_FAILING}
+
+# Whether the check formulas return OutcomeArrays instead of labels, which is set while a recon is run for its report
+ENCODE_CHECK_OUTCOMES: ContextVar[bool] = ContextVar('encode_check_outcomes', default=False)
+
+
+@contextlib.contextmanager
+def encoded_check_outcomes():
+    # The check formulas run inside the with block return OutcomeArrays
+    token = ENCODE_CHECK_OUTCOMES.set(True)
+    try:
+        yield
+    finally:
+        ENCODE_CHECK_OUTCOMES.reset(token)
+
+def get_check_columns(recon_df: pd.DataFrame) -> List[str]:
+    # The recon app registers every column that contains the word check
+    return [column_header for column_header in recon_df.columns if 'check' in str(column_header).lower()]
+
+def get_outcome_codes(check_values: np.ndarray) -> np.ndarray:
+    """
+    Given an array of check values, returns an array of the same shape with the index of the outcome
+    in RECON_REPORT_OUTCOMES. Missing values are coded as -1, so they are not counted in the summary.
+    """
+    return np.select(
+        [check_values == MATCH, check_values == IMMATERIAL, pd.isna(check_values)],
+        [OUTCOME_CODE_MATCH, OUTCOME_CODE_IMMATERIAL, OUTCOME_CODE_MISSING],
+        default=OUTCOME_CODE_FAILING
+    ).astype('int8')
+
+def encode_check_values(check_values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Given an array of check values, returns the int8 outcome codes and the float64 magnitudes, which
+    are the numbers in the failing values and NaN everywhere else.
+    """
+    check_values = np.asarray(check_values, dtype=object)
+    codes = get_outcome_codes(check_values)
+
+    magnitudes = np.full(check_values.shape, np.nan, dtype='float64')
+    failing_mask = codes == OUTCOME_CODE_FAILING
+    magnitudes[failing_mask] = pd.to_numeric(pd.Series(check_values[failing_mask], dtype=object), errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+
+    return codes, magnitudes
+
+def decode_outcomes(codes: np.ndarray, magnitudes: np.ndarray, integral: bool=False) -> np.ndarray:
+    """
+    Renders codes and magnitudes as the labels the check formulas return. Failing values that were
+    not numbers are rendered as Failing. Set integral for checks whose failing values are integers,
+    like the similarity of string checks.
+    """
+    labels = np.full(codes.shape, np.nan, dtype=object)
+    labels[codes == OUTCOME_CODE_MATCH] = MATCH
+    labels[codes == OUTCOME_CODE_IMMATERIAL] = IMMATERIAL
+
+    # Exception records saved before magnitudes were float64 have float32 magnitudes. Print them with
+    # the shortest repr, so 3762.89 isn't shown as 3762.889892578125
+    if integral:
+        to_number = int
+    elif magnitudes.dtype == np.float32:
+        to_number = lambda magnitude: float(str(magnitude))
+    else:
+        to_number = float
+    failing_mask = codes == OUTCOME_CODE_FAILING
+    labels[failing_mask] = [FAILING if np.isnan(magnitude) else to_number(magnitude) for magnitude in magnitudes[failing_mask]]
+    return labels
+
+
+@register_extension_dtype
+class OutcomeDtype(ExtensionDtype):
+    """
+    The dtype of check columns that are stored as outcome codes and magnitudes.
+    """
+    name = 'outcome'
+    type = object
+    kind = 'O'
+    na_value = np.nan
+
+    @classmethod
+    def construct_array_type(cls):
+        return OutcomeArray
+
+
+class OutcomeArray(ExtensionArray):
+    """
+    A check column stored as int8 outcome codes and float64 magnitudes. Its values are the labels the
+    check formulas return, which are only built when they are read.
+    """
+
+    def __init__(self, codes: np.ndarray, magnitudes: np.ndarray, integral: bool=False):
+        self.codes = np.asarray(codes, dtype='int8')
+        self.magnitudes = np.asarray(magnitudes, dtype='float64')
+        self.integral = integral
+
+    @classmethod
+    def from_labels(cls, check_values) -> 'OutcomeArray':
+        return cls(*encode_check_values(np.asarray(check_values, dtype=object)))
+
+    @classmethod
+    def _from_sequence(cls, scalars, *, dtype=None, copy=False):
+        if isinstance(scalars, OutcomeArray):
+            return scalars.copy() if copy else scalars
+        return cls.from_labels(scalars)
+
+    @classmethod
+    def _from_factorized(cls, values, original):
+        return cls(*encode_check_values(values), integral=original.integral)
+
+    @classmethod
+    def _concat_same_type(cls, to_concat):
+        return cls(
+            np.concatenate([array.codes for array in to_concat]),
+            np.concatenate([array.magnitudes for array in to_concat]),
+            integral=all(array.integral for array in to_concat)
+        )
+
+    @property
+    def dtype(self) -> OutcomeDtype:
+        return OutcomeDtype()
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.magnitudes.nbytes
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, item):
+        if isinstance(item, numbers.Integral):
+            return decode_outcomes(self.codes[[item]], self.magnitudes[[item]], self.integral)[0]
+        item = pd.api.indexers.check_array_indexer(self, item)
+        return type(self)(self.codes[item], self.magnitudes[item], self.integral)
+
+    def labels(self) -> np.ndarray:
+        return decode_outcomes(self.codes, self.magnitudes, self.integral)
+
+    def __array__(self, dtype=None, copy=None):
+        labels = self.labels()
+        return labels if dtype is None else labels.astype(dtype)
+
+    def __arrow_array__(self, type=None):
+        # Labels mix text with numbers, so they are written to Arrow, and displayed, as text
+        return pa.array([None if pd.isna(label) else str(label) for label in self.labels()], type=pa.string())
+
+    def __eq__(self, other):
+        if isinstance(other, (pd.Series, pd.Index, pd.DataFrame)):
+            return NotImplemented
+        if isinstance(other, str) and other in OUTCOME_CODES and other != FAILING:
+            return self.codes == OUTCOME_CODES[other]
+        other = other.labels() if isinstance(other, OutcomeArray) else other
+        return np.asarray(self.labels() == other, dtype=bool)
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else ~equal
+
+    def isna(self) -> np.ndarray:
+        return self.codes == OUTCOME_CODE_MISSING
+
+    def copy(self) -> 'OutcomeArray':
+        return type(self)(self.codes.copy(), self.magnitudes.copy(), self.integral)
+
+    def take(self, indices, allow_fill: bool=False, fill_value=None) -> 'OutcomeArray':
+        # Filled positions, like rows without a match in a merge, are missing
+        return type(self)(
+            take(self.codes, indices, allow_fill=allow_fill, fill_value=OUTCOME_CODE_MISSING),
+            take(self.magnitudes, indices, allow_fill=allow_fill, fill_value=np.nan),
+            self.integral
+        )
+
+    def astype(self, dtype, copy: bool=True):
+        if isinstance(dtype, OutcomeDtype) or dtype == 'outcome':
+            return self.copy() if copy else self
+        return super().astype(dtype, copy=copy)
+
+    def _values_for_factorize(self):
+        return self.labels(), np.nan
+
+    def _values_for_argsort(self) -> np.ndarray:
+        # Failing rows sort by their difference or similarity, after the matching and immaterial rows
+        return np.where(self.codes == OUTCOME_CODE_FAILING, self.magnitudes, np.where(self.codes == OUTCOME_CODE_MISSING, np.nan, -np.inf))
+
+    def _formatter(self, boxed: bool=False):
+        return str
+
+
+def get_check_outcome_series(codes: np.ndarray, magnitudes: np.ndarray, index: pd.Index, integral: bool=False, name=None) -> pd.Series:
+    # The column a check formula returns while outcomes are encoded
+    return pd.Series(OutcomeArray(codes, magnitudes, integral), index=index, name=name)
+
+def encode_check_series(check_series: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    # The codes and magnitudes of a check column, read straight from an OutcomeArray, and encoded from labels otherwise
+    if isinstance(check_series.array, OutcomeArray):
+        return check_series.array.codes, check_series.array.magnitudes
+    return encode_check_values(check_series.to_numpy(dtype=object))
+
+def decode_check_series(check_series: pd.Series) -> pd.Series:
+    # The labels of an OutcomeArray column. Other columns are returned as they are
+    if not isinstance(check_series.array, OutcomeArray):
+        return check_series
+    return pd.Series(check_series.array.labels(), index=check_series.index, name=check_series.name, dtype=object)
+
+def decode_check_columns(df: pd.DataFrame) -> pd.DataFrame:
+    # Replaces the OutcomeArray columns of the dataframe with their labels, for displaying and exporting it
+    outcome_columns = [column_index for column_index, dtype in enumerate(df.dtypes) if isinstance(dtype, OutcomeDtype)]
+    if len(outcome_columns) == 0:
+        return df
+    df = df.copy(deep=False)
+    for column_index in outcome_columns:
+        df.isetitem(column_index, decode_check_series(df.iloc[:, column_index]))
+    return df
+
+
+@pd.api.extensions.register_series_accessor('outcome')
+class OutcomeAccessor:
+    """
+    The encoded outcomes of a check column. Label columns are encoded every time they are read, since
+    they can be edited in place.
+    """
+
+    def __init__(self, check_series: pd.Series):
+        self._check_series = check_series
+
+    @property
+    def codes(self) -> np.ndarray:
+        return encode_check_series(self._check_series)[0]
+
+    @property
+    def magnitudes(self) -> np.ndarray:
+        return encode_check_series(self._check_series)[1]
+
+    def labels(self) -> pd.Series:
+        return pd.Series(decode_outcomes(*encode_check_series(self._check_series)), index=self._check_series.index, name=self._check_series.name, dtype=object)
+
+    def to_frame(self) -> pd.DataFrame:
+        codes, magnitudes = encode_check_series(self._check_series)
+        return pd.DataFrame({'code': codes, 'magnitude': magnitudes}, index=self._check_series.index)
+
+
+@pd.api.extensions.register_dataframe_accessor('outcomes')
+class OutcomesAccessor:
+    """
+    The encoded outcomes of every check column of a recon dataframe.
+    """
+
+    def __init__(self, recon_df: pd.DataFrame):
+        self._recon_df = recon_df
+
+    @property
+    def check_columns(self) -> List[str]:
+        return get_check_columns(self._recon_df)
+
+    def codes(self, check_columns: Optional[List[str]]=None) -> np.ndarray:
+        # A 2D int8 array with one column per check, in the order of check_columns
+        check_columns = self.check_columns if check_columns is None else check_columns
+        codes = np.empty((len(self._recon_df), len(check_columns)), dtype='int8')
+        for check_index, column_header in enumerate(check_columns):
+            check_series = self._recon_df[column_header]
+            codes[:, check_index] = check_series.array.codes if isinstance(check_series.array, OutcomeArray) else get_outcome_codes(check_series.to_numpy(dtype=object))
+        return codes
+
+    def encode(self, check_columns: Optional[List[str]]=None) -> Tuple[np.ndarray, np.ndarray]:
+        # 2D int8 codes and float64 magnitudes with one column per check, in the order of check_columns
+        check_columns = self.check_columns if check_columns is None else check_columns
+        codes = np.empty((len(self._recon_df), len(check_columns)), dtype='int8')
+        magnitudes = np.empty((len(self._recon_df), len(check_columns)), dtype='float64')
+        for check_index, column_header in enumerate(check_columns):
+            codes[:, check_index], magnitudes[:, check_index] = encode_check_series(self._recon_df[column_header])
+        return codes, magnitudes
@@ -0,0 +1,332 @@
+"""
+The page of a single recon, which walks the user through setting the recon up the first time and
+through rerunning it with new data after that.
+
+There is one recon page for every recon, Pages/🧾 Recon.py, which looks the recon up in the recon
+store and renders it with render_recon_page. This module imports mitosheet and plotly, so the page
+only imports it once a recon is shown.
+"""
+from mitosheet.types import ParamMetadata
+import streamlit as st
+import pandas as pd
+from mitosheet.streamlit.v1 import spreadsheet, RunnableAnalysis
+import os
+import uuid
+from typing import List
+from caching import ANALYSIS_RUN_CACHE, get_analysis_run_key
+from custom_imports import get_sales_data, get_european_real_estate_data
+from custom_spreadsheet_functions import CHECK_NUMBER_DIFFERENCE, CHECK_STRING_DIFFERENCE
+from outcomes import decode_check_columns
+from result_viewer import FILTER_OPERATORS, ResultTable, get_result_tables
+from utils import * 
+
+def render_result_viewer(key: str, result_tables: List[ResultTable]):
+    """
+    Shows one page of one result table at a time. Only the rows on the page are sent to the browser,
+    and a (check, outcome) table is only filtered or sorted once it is selected.
+    """
+    table_column, sort_column, order_column = st.columns((2,2,1))
+    result_table = table_column.selectbox('Table', result_tables, format_func=lambda table: f'{table.label} ({len(table):,} rows)', key=f'{key}_table')
+    sort_column_header = sort_column.selectbox('Sort by', [None] + result_table.columns, format_func=lambda column: 'Row order' if column is None else column, key=f'{key}_sort')
+    ascending = order_column.radio('Order', ['Ascending', 'Descending'], key=f'{key}_order') == 'Ascending'
+
+    filter_column, operator_column, value_column = st.columns((2,1,2))
+    filter_column_header = filter_column.selectbox('Filter column', [None] + result_table.columns, format_func=lambda column: 'No filter' if column is None else column, key=f'{key}_filter_column')
+    filter_operator = operator_column.selectbox('Operator', FILTER_OPERATORS, key=f'{key}_filter_operator')
+    filter_value = value_column.text_input('Value', key=f'{key}_filter_value')
+    filters = [(filter_column_header, filter_operator, filter_value)] if filter_column_header is not None and filter_value != '' else []
+
+    try:
+        row_positions = result_table.get_row_positions(filters, sort_column_header, ascending)
+    except ValueError as e:
+        st.error(str(e))
+        return
+
+    page_size_column, page_column = st.columns((1,1))
+    page_size = page_size_column.selectbox('Rows per page', [50, 100, 500, 1000], index=1, key=f'{key}_page_size')
+    number_of_pages = max(1, -(-len(row_positions) // page_size))
+    # Go back to the first page whenever the table, filter, or page size changes
+    page = page_column.number_input(f'Page (of {number_of_pages})', min_value=1, max_value=number_of_pages, value=1, key=f'{key}_page_{result_table.label}_{len(row_positions)}_{page_size}')
+
+    page_df, number_of_rows = result_table.get_page(page - 1, page_size, filters, sort_column_header, ascending)
+    st.caption(f'{number_of_rows:,} of {len(result_table):,} rows')
+    st.dataframe(page_df, use_container_width=True)
+
+def render_recon_page(recon_name: str, recon_description: str, recon_value: float):
+    """
+    Renders the setup wizard of the recon if it has never been run, and its most recent result otherwise.
+    """
+    RECON_SETUP_MODE_KEY = f"recon_setup_mode_{recon_name}"
+    UPDATE_RECON_KEY = f"update_{recon_name}"
+    RECON_CONFIGURATION_STEP_KEY = f"recon_configuration_step_{recon_name}"
+    RECON_REPORT_KEY = f"recon_report_{recon_name}"
+    SESSION_ID_KEY = "recon_session_id"
+
+    st.title(recon_name)
+
+    if UPDATE_RECON_KEY not in st.session_state:
+        st.session_state[UPDATE_RECON_KEY] = False
+
+    if RECON_CONFIGURATION_STEP_KEY not in st.session_state:
+        st.session_state[RECON_CONFIGURATION_STEP_KEY] = 1
+
+    if SESSION_ID_KEY not in st.session_state:
+        st.session_state[SESSION_ID_KEY] = uuid.uuid4().hex
+
+    def update_recon_configuration_step_state():
+        st.session_state[RECON_CONFIGURATION_STEP_KEY] += 1
+
+    # Get the previous run of the report if it exists
+    previous_recon_report_path = get_most_recent_output_path_by_name(recon_name)
+
+    if RECON_SETUP_MODE_KEY not in st.session_state:
+        # If there is not a previous report, then we need to be in setup mode.
+        # We save this in state so that once we finish building the report, the app
+        # doesn't automatically switch into update mode on the next refresh.  
+        st.session_state[RECON_SETUP_MODE_KEY] = previous_recon_report_path is None
+
+    if previous_recon_report_path and not st.session_state[RECON_SETUP_MODE_KEY]:
+        # If we've already ran this report, display the summary of the most recent run.
+        recon_summary_df = pd.read_csv(previous_recon_report_path)
+
+        # Get the csv name from the report path
+        previous_recon_name = previous_recon_report_path.split('/')[-1]
+
+        # Format the name as a date
+        previous_recon_report_date = get_run_date_from_file_name(previous_recon_name)
+
+        st.info(f'''
+            Recon Description: {recon_description} 
+
+            Hours saved per quarter with automation: {recon_value}
+
+            Last updated: {previous_recon_report_date}
+            '''
+        )
+
+        if st.button("Rerun recon with new datsets"):
+            st.session_state[UPDATE_RECON_KEY] = True
+
+        if st.session_state[UPDATE_RECON_KEY]:
+            original_analysis = RunnableAnalysis.from_json(get_recon_analysis(recon_name))
+
+            def map_param_to_value(param: ParamMetadata):
+                return param['original_value'] if param['original_value'] != '' else param['name']
+
+            recon_function_string = original_analysis.fully_parameterized_function
+            original_imported_df_names = list(map(
+                map_param_to_value,
+                original_analysis.get_param_metadata('import')
+            ))
+
+            new_import_prompt = st.empty()
+
+            new_analysis: RunnableAnalysis = spreadsheet(
+                import_folder='./data', 
+                key=f'update_recon_{recon_name}', 
+                importers=[get_sales_data, get_european_real_estate_data], 
+                return_type='analysis'
+            )
+            new_df_names = new_analysis.get_param_metadata('import')
+
+            def get_new_import_prompt(new_df_names: list, original_imported_df_names: list) -> str:
+                if len(new_df_names) == len(original_imported_df_names):
+                    return "Click the **Rerun Recon** button below."
+                else:
+                    return f"Import a file to replace **{original_imported_df_names[len(new_df_names)]}** dataframe."
+
+            new_import_prompt.success(get_new_import_prompt(new_df_names, original_imported_df_names))
+
+            if st.button("Rerun Recon", key=f'rerun_recon_{recon_name}', disabled=len(new_df_names) != len(original_imported_df_names)):     
+                run_metrics = RunMetrics(recon_name, 'rerun')
+
+                with run_metrics.stage('analysis.run') as run_record:
+                    # Load the sources of the analysis at the same time, rather than one after another
+                    recon_function_dfs, import_report = run_analysis_with_concurrent_imports(original_analysis)
+
+                    # Get the last dataframe from the recon_function_dfs
+                    recon_result_df = recon_function_dfs[-1]
+                    run_record['rows'] = len(recon_result_df)
+
+                # Only the summary is displayed, so the (check, outcome) records are only read to save the exceptions
+                with run_metrics.stage('get_recon_report') as report_record:
+                    recon_summary_df, recon_records = get_recon_report_records(recon_result_df)
+                    report_record['rows'] = len(recon_result_df)
+
+                with run_metrics.stage('save_recon_report') as save_record:
+                    run_id = save_recon_report(recon_summary_df, recon_name, recon_records)
+                    save_record['rows'] = len(recon_result_df)
+
+                run_metrics.save(run_id)
+
+                st.markdown('# Recon Result')
+                if len(import_report) > 0:
+                    with st.expander('Import timing'):
+                        st.dataframe(pd.DataFrame(import_report), use_container_width=True)
+
+                # Display the new recon report
+                spreadsheet(recon_summary_df)
+
+                # Create graph and display it
+                fig = get_recon_summary_graph(recon_summary_df)
+                st.plotly_chart(fig, use_container_width=True)
+
+            st.stop()
+
+        st.markdown('# Previous Recon Result')
+        dfs, _ = spreadsheet(recon_summary_df)
+        dfs_list = list(dfs.values())
+        recon_summary_df = dfs_list[0]
+
+        # Create graph and display it
+        fig = get_recon_summary_graph(recon_summary_df)
+        st.plotly_chart(fig, use_container_width=True)
+
+        # Let the user page through the exceptions of a check, which are read straight from the saved run
+        previous_recon_run_id = os.path.splitext(previous_recon_name)[0]
+        exception_record_sets = get_exception_record_sets(recon_name, previous_recon_run_id)
+        if len(exception_record_sets) > 0:
+            st.markdown('# Exceptions')
+
+            check_column, outcome_column, page_column = st.columns((2,1,1))
+            exception_check = check_column.selectbox('Check', list(dict.fromkeys(record_set['check'] for record_set in exception_record_sets)))
+            exception_outcome = outcome_column.selectbox('Outcome', [record_set['outcome'] for record_set in exception_record_sets if record_set['check'] == exception_check])
+            exception_record_set = next(record_set for record_set in exception_record_sets if record_set['check'] == exception_check and record_set['outcome'] == exception_outcome)
+
+            exception_page_size = 100
+            number_of_exception_pages = max(1, -(-exception_record_set['count'] // exception_page_size))
+            exception_page = page_column.number_input(f'Page (of {number_of_exception_pages})', min_value=1, max_value=number_of_exception_pages, value=1)
+
+            st.caption(f"{exception_record_set['count']} {exception_outcome.lower()} records for {exception_check}")
+            st.dataframe(decode_check_columns(read_exception_records_page(recon_name, previous_recon_run_id, exception_check, exception_outcome, exception_page - 1, exception_page_size)), use_container_width=True)
+
+            # Export every exception of the run, a chunk at a time, so the export never holds the whole run in memory
+            format_column, export_column = st.columns((1,3))
+            export_format = format_column.selectbox('Export format', EXPORT_FORMATS, format_func=str.upper)
+            if export_column.button('Export exceptions'):
+                remove_old_exports()
+                export_progress = st.progress(0.0, text='Exporting exceptions')
+                export_path = export_saved_run_records(
+                    recon_name,
+                    previous_recon_run_id,
+                    get_export_path(recon_name, previous_recon_run_id, export_format),
+                    export_format,
+                    progress=lambda written, total: export_progress.progress(written / total if total > 0 else 1.0, text=f'Exported {written:,} of {total:,} records')
+                )
+                # The download button holds the whole file in memory, so large exports are only saved on the server
+                export_size = os.path.getsize(export_path)
+                if export_size <= MAX_DOWNLOAD_BYTES:
+                    with open(export_path, 'rb') as export_file:
+                        st.download_button(f'Download {os.path.basename(export_path)}', export_file, file_name=f'{recon_name} {os.path.basename(export_path)}')
+                else:
+                    st.info(f'The export is {export_size / (1024 * 1024):,.0f}MB, which is too large to download from the app. It was saved on the server as {os.path.abspath(export_path)}.')
+
+    else:
+        # If this report has never been generated, guide the user through the steps to create it.
+
+        st.markdown("""This is the recon setup wizard. It will guide you through a series of steps to set up your recon report.""")
+
+        def get_instruction_prompt(recon_configuration_step: int) -> str:
+            if recon_configuration_step == 1 or recon_configuration_step == 2:
+                return f'''
+                    ### Step {recon_configuration_step}: Construct {'first' if recon_configuration_step == 1 else 'second'} dataset
+                    Construct the **{'first' if recon_configuration_step == 1 else 'second'}** data source to reconcile. 
+
+                    1. Import data by clicking **Import** in the Mito toolbar.
+                    2. Preprocess the data into the correct format using Mito's transformations. 
+                '''
+
+            if recon_configuration_step == 3:
+                return """
+                ### Step 3: Merge datasets together
+                Merge the datasets together by clicking **Dataframes** > **Merge**. Then select the columns from each dataframe that you want to merge on."""
+
+            if recon_configuration_step == 4:
+                return """
+                ### Step 4: Construct Recon
+                Now that you've constructed the dataset, setup data checks by adding a new column and using the formulas =CHECK_NUMBER_DIFFERENCE() and =CHECK_STRING_DIFFERENCE().
+
+                **Make sure to include the word "check" in the column name so that recon app registers it**.
+                """
+
+            if recon_configuration_step > 4:
+                return "Scroll down to view the recon report."
+
+        # Create a placeholder streamlit widget so we can later fill in the 
+        # wizard instructions and display it to the user above the spreadsheet.
+        instruction_prompt = st.success(get_instruction_prompt(st.session_state[RECON_CONFIGURATION_STEP_KEY]))
+        st.button("Next Step" if st.session_state[RECON_CONFIGURATION_STEP_KEY] < 4 else "Generate Report", on_click=update_recon_configuration_step_state)
+
+        safe_recon_name = recon_name.replace(' ', '_')
+
+        # Display the data inside of the spreadsheet so the user can easily fix data quality issues.
+        analysis: RunnableAnalysis = spreadsheet(
+            importers=[get_sales_data, get_european_real_estate_data], 
+            import_folder='./data', 
+            sheet_functions=[CHECK_NUMBER_DIFFERENCE, CHECK_STRING_DIFFERENCE],
+            code_options={'as_function': True, 'call_function': False, 'function_name': f'MITO_GENERATED_RECON_FUNCTION_{safe_recon_name}', 'function_params': {}},
+            key=f'setup_recon_{recon_name}',
+            return_type='analysis'
+        )
+
+        # Only run the analysis again when its steps or the data it imports change, not on every rerun of the page.
+        # The report is usually generated on a later rerun than the one that ran the analysis, so the metrics
+        # of the run are kept with its result in the cache and saved with the report
+        analysis_run_key = get_analysis_run_key(analysis, importers=[get_sales_data, get_european_real_estate_data])
+        def run_analysis():
+            analysis_run_metrics = RunMetrics(recon_name, 'setup')
+            with analysis_run_metrics.stage('analysis.run') as run_record:
+                output_dfs, _ = run_analysis_with_concurrent_imports(analysis)
+                recon_raw_data_df = None
+                if isinstance(output_dfs, pd.DataFrame):
+                    recon_raw_data_df = output_dfs
+                elif isinstance(output_dfs, tuple) and len(output_dfs) > 0:
+                    recon_raw_data_df = output_dfs[-1]
+                run_record['rows'] = len(recon_raw_data_df) if recon_raw_data_df is not None else 0
+            return recon_raw_data_df, analysis_run_metrics.records
+
+        recon_raw_data_df, analysis_run_records = ANALYSIS_RUN_CACHE.get_or_run(st.session_state[SESSION_ID_KEY], analysis_run_key, run_analysis)
+
+        run_metrics = RunMetrics(recon_name, 'setup')
+        run_metrics.add_records(analysis_run_records)
+
+        if st.session_state[RECON_CONFIGURATION_STEP_KEY] > 4:
+            # Build and save the report once per version of the analysis, rather than on every rerun of the page
+            if RECON_REPORT_KEY not in st.session_state or st.session_state[RECON_REPORT_KEY][0] != analysis_run_key:
+                # Save the recon metadata to the metadata file so we can display info about it in the app dashboard
+                add_recon_to_metadata(recon_name, recon_description, recon_value)
+                save_recon_analysis(recon_name, analysis.to_json())
+
+                with run_metrics.stage('get_recon_report') as report_record:
+                    recon_summary_df, recon_records = get_recon_report_records(recon_raw_data_df)
+                    report_record['rows'] = len(recon_raw_data_df)
+
+                with run_metrics.stage('save_recon_report') as save_record:
+                    run_id = save_recon_report(recon_summary_df, recon_name, recon_records)
+                    save_record['rows'] = len(recon_raw_data_df)
+
+                run_metrics.save(run_id)
+
+                # Keep the results on the server, as row positions into the recon dataframe
+                result_tables = get_result_tables(recon_raw_data_df, recon_records)
+
+                # Create graph
+                fig = get_recon_summary_graph(recon_summary_df)
+
+                st.session_state[RECON_REPORT_KEY] = (analysis_run_key, recon_summary_df, result_tables, fig)
+
+            _, recon_summary_df, result_tables, fig = st.session_state[RECON_REPORT_KEY]
+
+            st.markdown("# Recon Result")
+
+            st.dataframe(recon_summary_df, use_container_width=True)
+            render_result_viewer(f"result_viewer_{recon_name}", result_tables)
+
+            # Display the graph
+            st.plotly_chart(fig, use_container_width=True)
+
+            if st.button('Save Recon'):
+                st.success('Recon saved successfully.')
+                # Update the session state and then rerun the app
+                st.session_state[RECON_SETUP_MODE_KEY] = False
+                st.experimental_rerun()
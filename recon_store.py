@@ -0,0 +1,299 @@
+"""
+An embedded SQLite database with the metadata of every recon, a registry of every run, and the
+daily trends of each recon's check outcomes.
+
+The database is opened in WAL mode, so the dashboard and pages can read while a run is being saved,
+and every write is a single transaction, so concurrent sessions never lose each other's rows. Runs
+are registered before their files are written, which gives each run a unique id even when two runs
+of a recon are saved in the same second, and are only visible once they are marked as saved.
+"""
+import os
+import sqlite3
+import threading
+from contextlib import closing, contextmanager
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+import pandas as pd
+
+RECON_STORE_FILE_PATH = 'recon_store.db'
+
+# The metadata used to be kept in this CSV file, which is imported the first time the store is opened
+LEGACY_METADATA_FILE_PATH = 'recon_metadata.csv'
+
+# How long a write waits for another session's write to finish before giving up
+RECON_STORE_TIMEOUT_SECONDS = 30
+
+RUN_STATUS_SAVING = 'saving'
+RUN_STATUS_SAVED = 'saved'
+RUN_STATUS_FAILED = 'failed'
+
+RUN_COUNT_COLUMNS = [
+    'number_of_rules_applied',
+    'number_of_records_checked',
+    'number_of_matching_checks',
+    'number_of_immaterial_checks',
+    'number_of_failing_checks'
+]
+
+RECON_STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS recons (
+    recon_name TEXT PRIMARY KEY,
+    recon_description TEXT NOT NULL DEFAULT '',
+    recon_value REAL NOT NULL DEFAULT 0,
+    date_created TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    recon_name TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    run_date TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    number_of_rules_applied INTEGER,
+    number_of_records_checked INTEGER,
+    number_of_matching_checks INTEGER,
+    number_of_immaterial_checks INTEGER,
+    number_of_failing_checks INTEGER,
+    PRIMARY KEY (recon_name, run_id)
+);
+CREATE INDEX IF NOT EXISTS runs_by_recon_and_date ON runs (recon_name, status, run_date);
+CREATE INDEX IF NOT EXISTS runs_by_date ON runs (run_date);
+CREATE TABLE IF NOT EXISTS recon_trends (
+    recon_name TEXT NOT NULL,
+    day TEXT NOT NULL,
+    run_date TEXT NOT NULL,
+    check_name TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (recon_name, day, check_name, outcome)
+);
+CREATE TABLE IF NOT EXISTS versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+
+# The name of the version that is bumped every time the daily trends are written
+RECON_TRENDS_VERSION_NAME = 'recon_trends'
+
+# The columns of the daily trends, in the order they are stored
+RECON_TRENDS_STORE_COLUMNS = ['recon_name', 'day', 'run_date', 'check_name', 'outcome', 'count']
+
+initialized_store_paths = set()
+initialized_store_paths_lock = threading.Lock()
+
+
+def initialize_recon_store(connection: sqlite3.Connection):
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.executescript(RECON_STORE_SCHEMA)
+
+    # Import the recons from the old metadata file, if this is the first time the store is opened
+    number_of_recons = connection.execute('SELECT COUNT(*) FROM recons').fetchone()[0]
+    if number_of_recons == 0 and os.path.exists(LEGACY_METADATA_FILE_PATH):
+        import_legacy_recon_metadata(connection, LEGACY_METADATA_FILE_PATH)
+
+@contextmanager
+def connect() -> Iterator[sqlite3.Connection]:
+    """
+    Opens a connection to the store. Statements in a `with connection:` block are committed together,
+    or rolled back if the block raises.
+    """
+    path = os.path.abspath(RECON_STORE_FILE_PATH)
+    with closing(sqlite3.connect(path, timeout=RECON_STORE_TIMEOUT_SECONDS)) as connection:
+        connection.execute('PRAGMA synchronous=NORMAL')
+
+        with initialized_store_paths_lock:
+            if path not in initialized_store_paths:
+                with connection:
+                    initialize_recon_store(connection)
+                initialized_store_paths.add(path)
+
+        yield connection
+
+def import_legacy_recon_metadata(connection: sqlite3.Connection, path: str):
+    recon_metadata_df = pd.read_csv(path, dtype={'recon_name': str, 'recon_description': str})
+    connection.executemany(
+        'INSERT OR IGNORE INTO recons (recon_name, recon_description, recon_value, date_created) VALUES (?, ?, ?, ?)',
+        [
+            (row.recon_name, '' if pd.isna(row.recon_description) else row.recon_description, float(row.recon_value), str(row.date_created))
+            for row in recon_metadata_df.itertuples(index=False)
+        ]
+    )
+
+
+def add_recon(recon_name: str, recon_description: str, recon_value: float):
+    # Recons that are already registered keep their original metadata
+    with connect() as connection, connection:
+        connection.execute(
+            'INSERT OR IGNORE INTO recons (recon_name, recon_description, recon_value, date_created) VALUES (?, ?, ?, ?)',
+            (recon_name, recon_description, float(recon_value), str(datetime.now()))
+        )
+
+def get_recon_metadata(recon_name: Optional[str]=None) -> pd.DataFrame:
+    with connect() as connection:
+        if recon_name is None:
+            return pd.read_sql_query('SELECT * FROM recons ORDER BY date_created', connection)
+        return pd.read_sql_query('SELECT * FROM recons WHERE recon_name = ?', connection, params=(recon_name, ))
+
+def get_total_recon_value() -> float:
+    # Only recons that have a saved run count, since a recon saves no time until it has been set up
+    with connect() as connection:
+        return connection.execute(
+            'SELECT COALESCE(SUM(recon_value), 0) FROM recons WHERE EXISTS (SELECT 1 FROM runs WHERE runs.recon_name = recons.recon_name AND runs.status = ?)',
+            (RUN_STATUS_SAVED, )
+        ).fetchone()[0]
+
+
+def register_run(recon_name: str, run_date: datetime, base_run_id: str) -> str:
+    """
+    Registers a run that is about to be saved, and returns its run id. The run id is base_run_id,
+    or base_run_id with a -2, -3, ... suffix if another run of the recon already has that id.
+    """
+    with connect() as connection:
+        suffix = 1
+        while True:
+            run_id = base_run_id if suffix == 1 else f'{base_run_id}-{suffix}'
+            try:
+                with connection:
+                    connection.execute(
+                        'INSERT INTO runs (recon_name, run_id, run_date, file_name, status) VALUES (?, ?, ?, ?, ?)',
+                        (recon_name, run_id, run_date.isoformat(), f'{run_id}.csv', RUN_STATUS_SAVING)
+                    )
+                return run_id
+            except sqlite3.IntegrityError:
+                suffix += 1
+
+def mark_run_saved(recon_name: str, run_id: str, run_counts: List[int]):
+    with connect() as connection, connection:
+        connection.execute(
+            f'UPDATE runs SET status = ?, {", ".join(f"{column} = ?" for column in RUN_COUNT_COLUMNS)} WHERE recon_name = ? AND run_id = ?',
+            (RUN_STATUS_SAVED, *[int(count) for count in run_counts], recon_name, run_id)
+        )
+
+def mark_run_failed(recon_name: str, run_id: str):
+    # Failed runs keep their run id reserved, but are never visible
+    with connect() as connection, connection:
+        connection.execute('UPDATE runs SET status = ? WHERE recon_name = ? AND run_id = ?', (RUN_STATUS_FAILED, recon_name, run_id))
+
+def delete_runs(recon_name: str, run_ids: List[str]):
+    with connect() as connection, connection:
+        connection.executemany('DELETE FROM runs WHERE recon_name = ? AND run_id = ?', [(recon_name, run_id) for run_id in run_ids])
+
+def add_saved_run(recon_name: str, run_id: str, run_date: datetime, file_name: str, run_counts: List[int]):
+    # Registers a run whose files already exist, like the outputs that were saved before the store
+    with connect() as connection, connection:
+        connection.execute(
+            f'INSERT OR IGNORE INTO runs (recon_name, run_id, run_date, file_name, status, {", ".join(RUN_COUNT_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (recon_name, run_id, run_date.isoformat(), file_name, RUN_STATUS_SAVED, *[int(count) for count in run_counts])
+        )
+
+def get_registered_file_names(recon_name: str) -> List[str]:
+    with connect() as connection:
+        return [row[0] for row in connection.execute('SELECT file_name FROM runs WHERE recon_name = ?', (recon_name, ))]
+
+def get_registered_runs(recon_name: str) -> pd.DataFrame:
+    # Returns every run of the recon in the registry, whatever its status
+    with connect() as connection:
+        return pd.read_sql_query('SELECT * FROM runs WHERE recon_name = ? ORDER BY run_date, rowid', connection, params=(recon_name, ))
+
+def get_registered_recon_names() -> List[str]:
+    with connect() as connection:
+        return [row[0] for row in connection.execute('SELECT DISTINCT recon_name FROM runs')]
+
+def get_latest_run(recon_name: str) -> Optional[dict]:
+    with connect() as connection:
+        connection.row_factory = sqlite3.Row
+        row = connection.execute(
+            'SELECT * FROM runs WHERE recon_name = ? AND status = ? ORDER BY run_date DESC, rowid DESC LIMIT 1',
+            (recon_name, RUN_STATUS_SAVED)
+        ).fetchone()
+        return dict(row) if row is not None else None
+
+def get_latest_runs() -> pd.DataFrame:
+    """
+    Returns the most recent saved run of every recon, with its counts.
+    """
+    with connect() as connection:
+        return pd.read_sql_query(
+            f"""
+            SELECT runs.recon_name, runs.run_id, runs.run_date, runs.file_name, {", ".join(f"runs.{column}" for column in RUN_COUNT_COLUMNS)}
+            FROM runs
+            WHERE runs.rowid = (
+                SELECT latest.rowid FROM runs AS latest
+                WHERE latest.recon_name = runs.recon_name AND latest.status = ?
+                ORDER BY latest.run_date DESC, latest.rowid DESC LIMIT 1
+            )
+            ORDER BY runs.recon_name
+            """,
+            connection,
+            params=(RUN_STATUS_SAVED, )
+        )
+
+def get_runs(recon_name: Optional[str]=None, start_date: Optional[datetime]=None, end_date: Optional[datetime]=None) -> pd.DataFrame:
+    """
+    Returns the saved runs, optionally only of one recon and between two dates, most recent first.
+    """
+    conditions, params = ['status = ?'], [RUN_STATUS_SAVED]
+    if recon_name is not None:
+        conditions.append('recon_name = ?')
+        params.append(recon_name)
+    if start_date is not None:
+        conditions.append('run_date >= ?')
+        params.append(start_date.isoformat())
+    if end_date is not None:
+        conditions.append('run_date <= ?')
+        params.append(end_date.isoformat())
+
+    with connect() as connection:
+        return pd.read_sql_query(
+            f'SELECT * FROM runs WHERE {" AND ".join(conditions)} ORDER BY run_date DESC, rowid DESC',
+            connection,
+            params=params
+        )
+
+
+def bump_version(connection: sqlite3.Connection, name: str):
+    connection.execute('INSERT INTO versions (name, version) VALUES (?, 1) ON CONFLICT (name) DO UPDATE SET version = version + 1', (name, ))
+
+def replace_recon_trends_day(recon_name: str, day: str, run_date: str, trends_rows: List[tuple]):
+    """
+    Replaces the recon's trends for the day with the rows of a run, unless a later run of that day
+    is already stored. Rows are (check_name, outcome, count). The check and the replacement are one
+    transaction, so sessions and processes that save runs at the same time never lose each other's days.
+    """
+    with connect() as connection:
+        # Take the write lock before reading, so no other writer can change the day in between
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            latest_run_date = connection.execute('SELECT MAX(run_date) FROM recon_trends WHERE recon_name = ? AND day = ?', (recon_name, day)).fetchone()[0]
+            if latest_run_date is None or latest_run_date <= run_date:
+                connection.execute('DELETE FROM recon_trends WHERE recon_name = ? AND day = ?', (recon_name, day))
+                connection.executemany(
+                    'INSERT OR REPLACE INTO recon_trends (recon_name, day, run_date, check_name, outcome, count) VALUES (?, ?, ?, ?, ?, ?)',
+                    [(recon_name, day, run_date, check_name, outcome, int(count)) for check_name, outcome, count in trends_rows]
+                )
+                bump_version(connection, RECON_TRENDS_VERSION_NAME)
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+
+def replace_all_recon_trends(trends_rows: List[tuple]):
+    # Replaces every stored trend with the rows, which are in the order of RECON_TRENDS_STORE_COLUMNS
+    with connect() as connection, connection:
+        connection.execute('DELETE FROM recon_trends')
+        connection.executemany(
+            'INSERT OR REPLACE INTO recon_trends (recon_name, day, run_date, check_name, outcome, count) VALUES (?, ?, ?, ?, ?, ?)',
+            [(recon_name, day, run_date, check_name, outcome, int(count)) for recon_name, day, run_date, check_name, outcome, count in trends_rows]
+        )
+        bump_version(connection, RECON_TRENDS_VERSION_NAME)
+
+def read_recon_trends_rows() -> pd.DataFrame:
+    with connect() as connection:
+        return pd.read_sql_query(f'SELECT {", ".join(RECON_TRENDS_STORE_COLUMNS)} FROM recon_trends ORDER BY recon_name, day, check_name', connection)
+
+def get_recon_trends_version() -> int:
+    # Changes every time the trends are written, so readers can cache them until then
+    with connect() as connection:
+        row = connection.execute('SELECT version FROM versions WHERE name = ?', (RECON_TRENDS_VERSION_NAME, )).fetchone()
+        return row[0] if row is not None else 0
@@ -0,0 +1,238 @@
+"""
+Fuzzy record linkage for sources that don't share a reliable merge key.
+
+Scoring every left record against every right record is O(n*m), so instead the right source is indexed
+by the character n-grams of the match columns, optionally within exact blocks like Country. Each left
+record is only scored against the right records that share the most n-grams with it in the same block,
+using the same scorer as CHECK_STRING_DIFFERENCE, and is linked to the best scoring one.
+
+    linked_df, linkage_report = link_records(
+        vendor_df, snowflake_df,
+        match_columns=['Tenant Name'],
+        blocking_columns=['Country'],
+        similarity_threshold=85
+    )
+
+The linked dataframe has every left record, the columns of the right record it was linked to, and a
+Linkage Score column, so the check formulas can run on it like on a merged dataframe. Left records
+whose match columns are all missing or empty are not linked.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from custom_spreadsheet_functions import get_fuzzy_ratios, get_string_values
+
+DEFAULT_SUFFIXES = ('_left', '_right')
+
+LINKAGE_SCORE_COLUMN = 'Linkage Score'
+
+# N-grams shared by more right records than this, like ' co' or 'ing', say little about a match and
+# would make almost every pair a candidate, so they are left out of the index
+DEFAULT_MAX_POSTING_LIST_LENGTH = 200
+
+# How many of the right records that share the most n-grams with a left record are scored
+DEFAULT_CANDIDATES_PER_RECORD = 10
+
+# Left records are joined to the inverted lists in batches of about this many joined n-grams
+MAX_JOINED_NGRAMS_PER_BATCH = 5_000_000
+
+
+def get_match_strings(df: pd.DataFrame, match_columns: List[str]) -> np.ndarray:
+    # Missing values are left out rather than written as 'nan', so records without any match values have
+    # a blank match string, which is never linked
+    def get_column_strings(column_header) -> np.ndarray:
+        column_strings = get_string_values(df[column_header])
+        column_strings[df[column_header].isna().to_numpy()] = ''
+        return column_strings
+
+    match_strings = get_column_strings(match_columns[0])
+    for column_header in match_columns[1:]:
+        match_strings = match_strings + ' ' + get_column_strings(column_header)
+    return match_strings
+
+def is_blank(match_strings: pd.Series) -> np.ndarray:
+    return (match_strings.str.strip() == '').to_numpy()
+
+def get_ngrams(value: str, ngram_size: int) -> List[str]:
+    # Pad the value so that short values and the start and end of words still have n-grams
+    padded_value = f' {value.lower()} '
+    return list({padded_value[i:i + ngram_size] for i in range(max(len(padded_value) - ngram_size + 1, 1))})
+
+def get_block_ids(left_df: pd.DataFrame, right_df: pd.DataFrame, blocking_columns: Optional[List[str]]) -> Tuple[np.ndarray, np.ndarray]:
+    if not blocking_columns:
+        return np.zeros(len(left_df), dtype='int64'), np.zeros(len(right_df), dtype='int64')
+
+    blocking_values = pd.concat([left_df[blocking_columns], right_df[blocking_columns]], ignore_index=True).astype(str)
+    block_ids, _ = pd.MultiIndex.from_frame(blocking_values).factorize()
+    return block_ids[:len(left_df)], block_ids[len(left_df):]
+
+def get_record_units(block_ids: np.ndarray, match_strings: np.ndarray) -> Tuple[np.ndarray, pd.DataFrame]:
+    """
+    Groups the records that have the same block and match string, since they get the same candidates
+    and scores. Returns the unit of each record, and the block, match string, number of records, and
+    first record of each unit.
+    """
+    unit_ids, units = pd.MultiIndex.from_arrays([block_ids, match_strings]).factorize()
+    units_df = pd.DataFrame({
+        'block': units.get_level_values(0).to_numpy(),
+        'match_string': units.get_level_values(1).to_numpy(dtype=object),
+        'count': np.bincount(unit_ids, minlength=len(units)),
+        # The first record of a unit is the one that is linked, like the first match of a lookup merge
+        'first_position': pd.Series(np.arange(len(unit_ids))).groupby(unit_ids).min().to_numpy(),
+    })
+    return unit_ids, units_df
+
+def get_unit_ngrams(units_df: pd.DataFrame, ngram_size: int) -> pd.DataFrame:
+    # Blank match strings get no n-grams, so they are never candidates
+    unit_ngrams = [get_ngrams(match_string, ngram_size) if match_string.strip() != '' else [] for match_string in units_df['match_string']]
+    unit_ngram_counts = np.array([len(ngrams) for ngrams in unit_ngrams], dtype='int64')
+    return pd.DataFrame({
+        'unit': np.repeat(np.arange(len(units_df)), unit_ngram_counts),
+        'block': np.repeat(units_df['block'].to_numpy(), unit_ngram_counts),
+        'ngram': [ngram for ngrams in unit_ngrams for ngram in ngrams],
+    })
+
+def get_candidate_pairs(
+        left_units_df: pd.DataFrame,
+        right_units_df: pd.DataFrame,
+        ngram_size: int,
+        max_posting_list_length: int,
+        candidates_per_record: int
+    ) -> pd.DataFrame:
+    """
+    Returns the (left unit, right unit) pairs to score. These are the pairs in the same block that share
+    the most n-grams, found by joining the left n-grams to the inverted lists of the right n-grams, plus
+    the pairs with exactly the same match string. Units with a blank match string are left out.
+    """
+    left_ngrams_df = get_unit_ngrams(left_units_df, ngram_size)
+    right_ngrams_df = get_unit_ngrams(right_units_df, ngram_size)
+
+    # Key the inverted lists by a single integer for each (block, n-gram), which is much faster to join on
+    ngram_codes, ngrams = pd.factorize(pd.concat([left_ngrams_df['ngram'], right_ngrams_df['ngram']], ignore_index=True))
+    left_ngrams_df = pd.DataFrame({'unit': left_ngrams_df['unit'], 'key': left_ngrams_df['block'].to_numpy() * len(ngrams) + ngram_codes[:len(left_ngrams_df)]})
+    right_ngrams_df = pd.DataFrame({'unit': right_ngrams_df['unit'], 'key': right_ngrams_df['block'].to_numpy() * len(ngrams) + ngram_codes[len(left_ngrams_df):]})
+
+    # Build the inverted lists, leaving out the n-grams that are in too many right records
+    posting_list_lengths = right_ngrams_df['key'].value_counts()
+    right_ngrams_df = right_ngrams_df[right_ngrams_df['key'].map(posting_list_lengths).to_numpy() <= max_posting_list_length]
+
+    # Join the left units in batches, so the joined n-grams of a batch fit in memory
+    left_join_rows = left_ngrams_df['key'].map(posting_list_lengths).fillna(0).clip(upper=max_posting_list_length).to_numpy()
+    unit_join_rows = np.bincount(left_ngrams_df['unit'].to_numpy(), weights=left_join_rows, minlength=len(left_units_df))
+    unit_batches = (np.cumsum(unit_join_rows) // MAX_JOINED_NGRAMS_PER_BATCH).astype('int64')
+
+    candidate_pairs_dfs = []
+    for _, left_ngrams_batch_df in left_ngrams_df.groupby(unit_batches[left_ngrams_df['unit'].to_numpy()]):
+        joined_ngrams_df = left_ngrams_batch_df.merge(right_ngrams_df, on='key', suffixes=('_left', '_right'))
+
+        # Count the shared n-grams of each pair, and keep the pairs that share the most for each left unit
+        pair_ids, shared_ngrams = np.unique(joined_ngrams_df['unit_left'].to_numpy() * len(right_units_df) + joined_ngrams_df['unit_right'].to_numpy(), return_counts=True)
+        units_left, units_right = np.divmod(pair_ids, len(right_units_df))
+        order = np.lexsort((-shared_ngrams, units_left))
+        units_left, units_right = units_left[order], units_right[order]
+        rank_in_unit = np.arange(len(units_left)) - np.searchsorted(units_left, units_left)
+        top_pairs_mask = rank_in_unit < candidates_per_record
+        candidate_pairs_dfs.append(pd.DataFrame({'unit_left': units_left[top_pairs_mask], 'unit_right': units_right[top_pairs_mask]}))
+
+    candidate_pairs_dfs.append(
+        left_units_df[~is_blank(left_units_df['match_string'])].reset_index(names='unit_left')
+        .merge(right_units_df[~is_blank(right_units_df['match_string'])].reset_index(names='unit_right'), on=['block', 'match_string'])
+        [['unit_left', 'unit_right']]
+    )
+
+    return pd.concat(candidate_pairs_dfs, ignore_index=True).drop_duplicates()
+
+def link_records(
+        left_df: pd.DataFrame,
+        right_df: pd.DataFrame,
+        match_columns: List[str],
+        blocking_columns: Optional[List[str]]=None,
+        similarity_threshold: int=80,
+        ngram_size: int=3,
+        max_posting_list_length: int=DEFAULT_MAX_POSTING_LIST_LENGTH,
+        candidates_per_record: int=DEFAULT_CANDIDATES_PER_RECORD,
+        suffixes: Sequence[str]=DEFAULT_SUFFIXES
+    ) -> Tuple[pd.DataFrame, Dict[str, float]]:
+    """
+    Links each left record to the right record in the same block whose match columns are the most
+    similar, if the similarity is at least similarity_threshold. Returns the linked dataframe and a
+    report of how many pairs were compared at each step.
+    """
+    left_df = left_df.reset_index(drop=True)
+    right_df = right_df.reset_index(drop=True)
+
+    left_block_ids, right_block_ids = get_block_ids(left_df, right_df, blocking_columns)
+    left_unit_ids, left_units_df = get_record_units(left_block_ids, get_match_strings(left_df, match_columns))
+    right_unit_ids, right_units_df = get_record_units(right_block_ids, get_match_strings(right_df, match_columns))
+
+    candidate_pairs_df = get_candidate_pairs(left_units_df, right_units_df, ngram_size, max_posting_list_length, candidates_per_record)
+    candidate_pairs_df['score'] = get_fuzzy_ratios(
+        left_units_df['match_string'].to_numpy()[candidate_pairs_df['unit_left'].to_numpy()],
+        right_units_df['match_string'].to_numpy()[candidate_pairs_df['unit_right'].to_numpy()]
+    )
+    candidate_pairs_df['right_position'] = right_units_df['first_position'].to_numpy()[candidate_pairs_df['unit_right'].to_numpy()]
+
+    # Link each left unit to its best scoring right unit, breaking ties by the first right record
+    best_pairs_df = (
+        candidate_pairs_df[candidate_pairs_df['score'] >= similarity_threshold]
+        .sort_values(['unit_left', 'score', 'right_position'], ascending=[True, False, True])
+        .drop_duplicates('unit_left')
+    )
+    unit_right_positions = np.full(len(left_units_df), -1, dtype='int64')
+    unit_right_positions[best_pairs_df['unit_left'].to_numpy()] = best_pairs_df['right_position'].to_numpy()
+    unit_scores = np.full(len(left_units_df), np.nan)
+    unit_scores[best_pairs_df['unit_left'].to_numpy()] = best_pairs_df['score'].to_numpy()
+
+    linked_df = left_df.assign(_right_position=unit_right_positions[left_unit_ids]).merge(
+        right_df, left_on='_right_position', right_index=True, how='left', suffixes=list(suffixes)
+    ).drop(columns=['_right_position'])
+    linked_df[LINKAGE_SCORE_COLUMN] = unit_scores[left_unit_ids]
+    linked_df.index = left_df.index
+
+    return linked_df, get_linkage_report(left_df, right_df, left_block_ids, right_block_ids, left_units_df, right_units_df, candidate_pairs_df, linked_df)
+
+def get_linkage_report(
+        left_df: pd.DataFrame,
+        right_df: pd.DataFrame,
+        left_block_ids: np.ndarray,
+        right_block_ids: np.ndarray,
+        left_units_df: pd.DataFrame,
+        right_units_df: pd.DataFrame,
+        candidate_pairs_df: pd.DataFrame,
+        linked_df: pd.DataFrame
+    ) -> Dict[str, float]:
+    """
+    Counts the record pairs that comparing every record would score, that are in the same block, and
+    that were scored, along with the share of pairs each step avoided scoring.
+    """
+    all_pairs = len(left_df) * len(right_df)
+
+    number_of_blocks = int(max(left_block_ids.max(initial=-1), right_block_ids.max(initial=-1))) + 1
+    blocked_pairs = int(np.dot(
+        np.bincount(left_block_ids, minlength=number_of_blocks).astype('int64'),
+        np.bincount(right_block_ids, minlength=number_of_blocks).astype('int64')
+    ))
+
+    # Each unit pair stands for every pair of the records in the two units
+    candidate_pairs = int(np.dot(
+        left_units_df['count'].to_numpy()[candidate_pairs_df['unit_left'].to_numpy()].astype('int64'),
+        right_units_df['count'].to_numpy()[candidate_pairs_df['unit_right'].to_numpy()].astype('int64')
+    ))
+
+    def get_reduction_ratio(pairs: int, previous_pairs: int) -> float:
+        return 1 - pairs / previous_pairs if previous_pairs > 0 else 0.0
+
+    return {
+        'left_records': len(left_df),
+        'right_records': len(right_df),
+        'all_pairs': all_pairs,
+        'blocked_pairs': blocked_pairs,
+        'candidate_pairs': candidate_pairs,
+        'scored_pairs': len(candidate_pairs_df),
+        'linked_records': int(linked_df[LINKAGE_SCORE_COLUMN].notna().sum()),
+        'blocking_reduction_ratio': get_reduction_ratio(blocked_pairs, all_pairs),
+        'ngram_reduction_ratio': get_reduction_ratio(candidate_pairs, blocked_pairs),
+        'reduction_ratio': get_reduction_ratio(candidate_pairs, all_pairs),
+    }
@@ -0,0 +1,354 @@
+"""
+Streams the records of a recon's (check, outcome)s to CSV, XLSX or Parquet for auditors.
+
+The records are read and written a chunk at a time, so memory is bounded by the chunk size no matter
+how many records a check has. Every (check, outcome) gets its own sheet of the workbook, or its own
+file in a zip archive for CSV and Parquet:
+
+    export_recon_records(recon_records, 'exports/Warehouse REIT.xlsx', XLSX, progress=print)
+    export_saved_run_records('Warehouse REIT', run_id, 'exports/Warehouse REIT.zip', CSV)
+"""
+import io
+import os
+import re
+import tempfile
+import time
+import zipfile
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# XLSX exports use xlsxwriter's constant memory mode if it is installed, which is a few times faster
+# than openpyxl's write only mode, and openpyxl otherwise
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+try:
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+except ImportError:
+    Workbook = None
+
+from custom_spreadsheet_functions import IMMATERIAL
+from exception_store import get_exception_record_sets, read_exception_records_page
+from outcomes import FAILING, decode_check_columns
+
+CSV = 'csv'
+XLSX = 'xlsx'
+PARQUET = 'parquet'
+EXPORT_FORMATS = [CSV, XLSX, PARQUET]
+
+# Path to the folder where the recon page writes exports before they are downloaded
+EXPORTS_FOLDER = 'exports/'
+
+# An export is only needed until it is downloaded, so exports older than this are removed the next time one is written
+EXPORTS_MAX_AGE_SECONDS = 24 * 60 * 60
+
+# st.download_button reads the whole file into memory and sends it in one message, which Streamlit limits
+# to 200MB by default, so larger exports are left in EXPORTS_FOLDER to be collected from the server
+MAX_DOWNLOAD_BYTES = 200 * 1024 * 1024
+
+# How many records are read and written at a time
+DEFAULT_EXPORT_CHUNK_SIZE = 50_000
+
+# By default only the exceptions are exported, like the records that are saved with each run
+EXCEPTION_OUTCOMES = [IMMATERIAL, FAILING]
+
+# Excel allows 1,048,576 rows per sheet, including the header, and 31 characters per sheet name
+XLSX_MAX_ROWS_PER_SHEET = 1_048_575
+XLSX_MAX_SHEET_NAME_LENGTH = 31
+XLSX_INVALID_SHEET_NAME_CHARACTERS = re.compile(r'[\[\]:*?/\\]')
+
+INVALID_FILE_NAME_CHARACTERS = re.compile(r'[^\w\s.()-]')
+
+# Called with the number of records written so far and the total number of records
+ExportProgress = Callable[[int, int], None]
+
+
+class ExportRecordSet:
+    """
+    The records of one (check, outcome), read a chunk at a time with read(start, stop).
+    """
+
+    def __init__(self, check: str, outcome: str, count: int, read: Callable[[int, int], pd.DataFrame]):
+        self.check = check
+        self.outcome = outcome
+        self.count = count
+        self.read = read
+
+    @property
+    def label(self) -> str:
+        return f'{self.check} - {self.outcome}'
+
+
+def get_recon_record_sets(recon_records: list, outcomes: Sequence[str]=EXCEPTION_OUTCOMES) -> List[ExportRecordSet]:
+    # The record sets of the ReconRecords from get_recon_report_records, which are copied out of the recon dataframe a chunk at a time
+    return [
+        ExportRecordSet(str(records.check), records.outcome, len(records), records.to_frame)
+        for records in recon_records if records.outcome in outcomes
+    ]
+
+def get_saved_run_record_sets(recon_name: str, run_id: str, outcomes: Sequence[str]=EXCEPTION_OUTCOMES, chunk_size: int=DEFAULT_EXPORT_CHUNK_SIZE) -> List[ExportRecordSet]:
+    # The record sets of a saved run, which are read from its exception records a chunk at a time
+    def get_read(check: str, outcome: str) -> Callable[[int, int], pd.DataFrame]:
+        # Chunks always start on a multiple of the chunk size, so each chunk is one page of records
+        return lambda start, stop: read_exception_records_page(recon_name, run_id, check, outcome, start // chunk_size, chunk_size)
+
+    return [
+        ExportRecordSet(record_set['check'], record_set['outcome'], record_set['count'], get_read(record_set['check'], record_set['outcome']))
+        for record_set in get_exception_record_sets(recon_name, run_id) if record_set['outcome'] in outcomes
+    ]
+
+
+def get_file_name(label: str, extension: str, used_file_names: set) -> str:
+    file_name = INVALID_FILE_NAME_CHARACTERS.sub('_', label).strip()
+    unique_file_name = f'{file_name}.{extension}'
+    suffix = 2
+    while unique_file_name.lower() in used_file_names:
+        unique_file_name = f'{file_name} ({suffix}).{extension}'
+        suffix += 1
+    used_file_names.add(unique_file_name.lower())
+    return unique_file_name
+
+def get_sheet_name(label: str, used_sheet_names: set) -> str:
+    sheet_name = XLSX_INVALID_SHEET_NAME_CHARACTERS.sub('_', label).strip("'")[:XLSX_MAX_SHEET_NAME_LENGTH]
+    unique_sheet_name = sheet_name
+    suffix = 2
+    while unique_sheet_name.lower() in used_sheet_names:
+        suffix_text = f' ({suffix})'
+        unique_sheet_name = f'{sheet_name[:XLSX_MAX_SHEET_NAME_LENGTH - len(suffix_text)]}{suffix_text}'
+        suffix += 1
+    used_sheet_names.add(unique_sheet_name.lower())
+    return unique_sheet_name
+
+def get_chunks(record_set: ExportRecordSet, chunk_size: int):
+    # Reads the records a chunk at a time. A record set without records gives one empty chunk, so its header is still written.
+    # The check columns are read as codes and magnitudes, and only rendered as labels for the chunk being written
+    for start in range(0, max(record_set.count, 1), chunk_size):
+        yield decode_check_columns(record_set.read(start, min(start + chunk_size, record_set.count)))
+
+def get_excel_rows(records_df: pd.DataFrame):
+    # openpyxl can't write missing values or the numpy scalars of object columns, so convert them to cells
+    columns = []
+    for column_header in records_df.columns:
+        values = records_df[column_header].to_numpy(dtype=object, copy=True)
+        values[pd.isna(values)] = None
+        columns.append([value.item() if isinstance(value, np.generic) else value for value in values])
+    return zip(*columns)
+
+def get_parquet_records(records_df: pd.DataFrame) -> pd.DataFrame:
+    # Check columns mix labels with numbers, so they are written as text, like every other object column
+    records_df = records_df.copy()
+    for column_header in records_df.columns:
+        if records_df[column_header].dtype == object:
+            records_df[column_header] = records_df[column_header].astype('string')
+    records_df.columns = [str(column_header) for column_header in records_df.columns]
+    return records_df
+
+
+class ExportProgressCounter:
+    def __init__(self, total: int, progress: Optional[ExportProgress]):
+        self.total = total
+        self.written = 0
+        self.progress = progress
+
+    def add(self, rows: int):
+        self.written += rows
+        if self.progress is not None:
+            self.progress(self.written, self.total)
+
+
+class XlsxWriterSheet:
+    # Gives an xlsxwriter worksheet the append of an openpyxl write only worksheet
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+        self.row = 0
+
+    def append(self, values):
+        self.worksheet.write_row(self.row, 0, values)
+        self.row += 1
+
+class OpenpyxlSheet:
+    # Writes text that starts with = as text, since openpyxl would write it as a formula
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+
+    def get_cell(self, value):
+        if isinstance(value, str) and value.startswith('='):
+            cell = WriteOnlyCell(self.worksheet, value=value)
+            cell.data_type = 's'
+            return cell
+        return value
+
+    def append(self, values):
+        self.worksheet.append([self.get_cell(value) for value in values])
+
+
+def write_xlsx(record_sets: List[ExportRecordSet], path: str, chunk_size: int, counter: ExportProgressCounter):
+    # Both workbooks stream each row to disk as it is appended, rather than keeping the cells in memory
+    if xlsxwriter is not None:
+        workbook = xlsxwriter.Workbook(path, {
+            'constant_memory': True,
+            'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+            # Write every value as it is, so a tenant name that starts with = is not a formula
+            'strings_to_formulas': False,
+            'strings_to_urls': False
+        })
+        create_sheet = lambda sheet_name: XlsxWriterSheet(workbook.add_worksheet(sheet_name))
+    elif Workbook is not None:
+        workbook = Workbook(write_only=True)
+        create_sheet = lambda sheet_name: OpenpyxlSheet(workbook.create_sheet(sheet_name))
+    else:
+        raise ImportError('Exporting to XLSX requires xlsxwriter or openpyxl. Install one with pip install xlsxwriter.')
+
+    used_sheet_names = set()
+    for record_set in record_sets:
+        sheet = None
+        sheet_number = 1
+        rows_in_sheet = 0
+        for records_df in get_chunks(record_set, chunk_size):
+            header = [str(column_header) for column_header in records_df.columns]
+            for row in get_excel_rows(records_df):
+                # Records that don't fit in one sheet continue on the next one
+                if sheet is None or rows_in_sheet == XLSX_MAX_ROWS_PER_SHEET:
+                    sheet = create_sheet(get_sheet_name(record_set.label if sheet_number == 1 else f'{record_set.label} {sheet_number}', used_sheet_names))
+                    sheet.append(header)
+                    sheet_number += 1
+                    rows_in_sheet = 0
+                sheet.append(row)
+                rows_in_sheet += 1
+
+            if sheet is None:
+                sheet = create_sheet(get_sheet_name(record_set.label, used_sheet_names))
+                sheet.append(header)
+            counter.add(len(records_df))
+
+    if len(record_sets) == 0:
+        create_sheet('No records')
+
+    if xlsxwriter is not None:
+        workbook.close()
+    else:
+        workbook.save(path)
+
+def write_csv_archive(record_sets: List[ExportRecordSet], path: str, chunk_size: int, counter: ExportProgressCounter):
+    used_file_names = set()
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for record_set in record_sets:
+            # Each chunk is written straight into the archive, so the file is never whole in memory
+            with archive.open(get_file_name(record_set.label, CSV, used_file_names), 'w', force_zip64=True) as file:
+                with io.TextIOWrapper(file, encoding='utf-8', newline='') as text_file:
+                    for chunk_number, records_df in enumerate(get_chunks(record_set, chunk_size)):
+                        records_df.to_csv(text_file, index=False, header=chunk_number == 0)
+                        counter.add(len(records_df))
+
+def get_temp_path(path: str, suffix: str) -> str:
+    # A new file next to path that no other export is writing, even another session in the same process
+    file_descriptor, temp_path = tempfile.mkstemp(suffix=suffix, prefix=f'{os.path.basename(path)}.', dir=os.path.dirname(path) or '.')
+    os.close(file_descriptor)
+    return temp_path
+
+def write_parquet_archive(record_sets: List[ExportRecordSet], path: str, chunk_size: int, counter: ExportProgressCounter):
+    used_file_names = set()
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for record_set in record_sets:
+            # Parquet files are written to disk first, since the writer needs a file it can seek in
+            temp_path = get_temp_path(path, '.parquet.tmp')
+            try:
+                writer = None
+                for records_df in get_chunks(record_set, chunk_size):
+                    records_df = get_parquet_records(records_df)
+                    if writer is None:
+                        # Columns that are empty in the first chunk have no type yet, so they are written as text
+                        schema = pa.Schema.from_pandas(records_df, preserve_index=False)
+                        schema = pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in schema], metadata=schema.metadata)
+                        writer = pq.ParquetWriter(temp_path, schema, compression='zstd')
+                    writer.write_table(pa.Table.from_pandas(records_df, schema=schema, preserve_index=False))
+                    counter.add(len(records_df))
+                writer.close()
+                archive.write(temp_path, get_file_name(record_set.label, PARQUET, used_file_names))
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+
+def export_record_sets(
+        record_sets: List[ExportRecordSet],
+        path: str,
+        file_format: str,
+        chunk_size: int=DEFAULT_EXPORT_CHUNK_SIZE,
+        progress: Optional[ExportProgress]=None
+    ) -> str:
+    """
+    Writes the record sets to path, one sheet of an XLSX workbook or one file of a zip archive for
+    CSV and Parquet per (check, outcome), chunk_size records at a time. progress is called after
+    every chunk with the number of records written so far and the total. Returns the path.
+    """
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f'Unknown export format {file_format}. Use one of {", ".join(EXPORT_FORMATS)}.')
+
+    folder = os.path.dirname(path)
+    if folder != '':
+        os.makedirs(folder, exist_ok=True)
+
+    counter = ExportProgressCounter(sum(record_set.count for record_set in record_sets), progress)
+    write = {XLSX: write_xlsx, CSV: write_csv_archive, PARQUET: write_parquet_archive}[file_format]
+
+    # Write to a temporary file and then swap it in, so a failed export never leaves a half written file
+    temp_path = get_temp_path(path, '.tmp')
+    try:
+        write(record_sets, temp_path, chunk_size, counter)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    return path
+
+def export_recon_records(
+        recon_records: list,
+        path: str,
+        file_format: str,
+        outcomes: Sequence[str]=EXCEPTION_OUTCOMES,
+        chunk_size: int=DEFAULT_EXPORT_CHUNK_SIZE,
+        progress: Optional[ExportProgress]=None
+    ) -> str:
+    """
+    Exports the records of each (check, outcome) from get_recon_report_records with one of the outcomes.
+    """
+    return export_record_sets(get_recon_record_sets(recon_records, outcomes), path, file_format, chunk_size, progress)
+
+def export_saved_run_records(
+        recon_name: str,
+        run_id: str,
+        path: str,
+        file_format: str,
+        outcomes: Sequence[str]=EXCEPTION_OUTCOMES,
+        chunk_size: int=DEFAULT_EXPORT_CHUNK_SIZE,
+        progress: Optional[ExportProgress]=None
+    ) -> str:
+    """
+    Exports the exception records of a saved run straight from disk, without rerunning the recon.
+    """
+    return export_record_sets(get_saved_run_record_sets(recon_name, run_id, outcomes, chunk_size), path, file_format, chunk_size, progress)
+
+def get_export_path(recon_name: str, run_id: str, file_format: str) -> str:
+    extension = XLSX if file_format == XLSX else 'zip'
+    return os.path.join(EXPORTS_FOLDER, INVALID_FILE_NAME_CHARACTERS.sub('_', recon_name), f'{run_id}-{file_format}.{extension}')
+
+def remove_old_exports(max_age_seconds: float=EXPORTS_MAX_AGE_SECONDS):
+    cutoff = time.time() - max_age_seconds
+    for folder, _, files in os.walk(EXPORTS_FOLDER):
+        for file in files:
+            path = os.path.join(folder, file)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                # Another session removed it first
+                pass
@@ -0,0 +1,280 @@
+"""
+Reruns saved recons from the command line, without opening the app.
+
+Every analysis in the recon-scripts folder is rerun in its own process, a few at a time, with the
+import parameters from a JSON config file. The config maps each recon name to the parameters to bind,
+and optionally the description and value to register the recon with if it is not in the metadata yet:
+
+    {
+        "Residential": {
+            "params": {
+                "file_name_import_csv_0": "./data/commercial leases/Warehouse REIT v2.csv",
+                "file_name_import_csv_1": "./data/commercial leases/Prologis v2.csv"
+            },
+            "recon_description": "Compare residential real estate data from Snowflake to manually tracked Excel files",
+            "recon_value": 12.0
+        }
+    }
+
+Parameters that are not in the config keep the value the analysis was saved with.
+
+A recon whose sources mostly don't change between runs can be rerun incrementally instead, so only the
+rows that changed since its last incremental run are merged and checked (see incremental_recon.py). Its
+config describes the merge and the checks, since they can't be read back out of the saved analysis. The
+left and right sources are import parameters of the analysis, or paths, and the checks are check specs
+(see check_specs.py):
+
+    {
+        "Residential": {
+            "params": {"file_name_import_csv_0": "./data/commercial leases/Warehouse REIT v2.csv"},
+            "incremental": {
+                "left": "file_name_import_csv_0",
+                "right": "./db_data/commercial_real_estate_snowflake.csv",
+                "merge_keys": ["Lease ID"],
+                "checks": [
+                    {"name": "Rent Check", "type": "number", "columns": ["Net Effective Rent_left", "Net Effective Rent_right"], "tolerance": 10}
+                ]
+            }
+        }
+    }
+
+Incremental reruns save the summary of the run, but not its exception records, since only the changed
+rows are checked. Run it from the root of the repo with:
+    python rerun_recons.py --config rerun_config.json --workers 4 --timeout 600
+"""
+import argparse
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import sys
+import time
+import traceback
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from utils import (
+    RunMetrics,
+    add_recon_to_metadata,
+    get_recon_analysis,
+    get_recon_report_records,
+    get_saved_recon_names,
+    run_analysis_with_concurrent_imports,
+    save_recon_report
+)
+
+SUCCESS = 'Success'
+FAILED = 'Failed'
+TIMED_OUT = 'Timed out'
+
+
+def rerun_recon(recon_name: str, params: Dict[str, str]) -> dict:
+    # Imported here so that the parent process doesn't need to load mitosheet
+    from mitosheet.streamlit.v1 import RunnableAnalysis
+
+    run_metrics = RunMetrics(recon_name, 'batch')
+    analysis = RunnableAnalysis.from_json(get_recon_analysis(recon_name))
+
+    with run_metrics.stage('analysis.run') as run_record:
+        recon_function_dfs, import_report = run_analysis_with_concurrent_imports(analysis, params)
+
+        # The recon dataframe is the last dataframe that the analysis returns
+        recon_result_df = recon_function_dfs if isinstance(recon_function_dfs, pd.DataFrame) else recon_function_dfs[-1]
+        run_record['rows'] = len(recon_result_df)
+
+    with run_metrics.stage('get_recon_report') as report_record:
+        recon_summary_df, recon_records = get_recon_report_records(recon_result_df)
+        report_record['rows'] = len(recon_result_df)
+
+    with run_metrics.stage('save_recon_report') as save_record:
+        run_id = save_recon_report(recon_summary_df, recon_name, recon_records)
+        save_record['rows'] = len(recon_result_df)
+
+    run_metrics.save(run_id)
+
+    return {'rows': len(recon_result_df), 'checks': recon_summary_df['Check'].nunique(), 'imports': import_report}
+
+
+def get_incremental_source_path(recon_name: str, source: str, params: Dict[str, str]) -> str:
+    # A source is an import parameter of the analysis, bound to the path in params or to the path it was saved with, or a path
+    if source in params:
+        return params[source]
+    saved_params = {param['name']: param['original_value'] for param in json.loads(get_recon_analysis(recon_name))['param_metadata']}
+    return saved_params.get(source, source)
+
+def rerun_recon_incrementally(recon_name: str, params: Dict[str, str], incremental_config: dict) -> dict:
+    # Imported here, since most reruns run the saved analysis instead
+    from chunked_recon import DEFAULT_SUFFIXES, read_recon_source
+    from check_specs import get_check_dicts
+    from incremental_recon import run_recon_incrementally
+
+    run_metrics = RunMetrics(recon_name, 'batch')
+    merge_keys = incremental_config['merge_keys']
+    checks = get_check_dicts(incremental_config['checks'])
+
+    source_dfs = []
+    for source_name in ['left', 'right']:
+        with run_metrics.stage('import', source_name) as import_record:
+            source_df = read_recon_source(get_incremental_source_path(recon_name, incremental_config[source_name], params), merge_keys)
+            import_record['rows'] = len(source_df)
+        source_dfs.append(source_df)
+
+    with run_metrics.stage('run_recon_incrementally') as run_record:
+        recon_summary_df, incremental_stats = run_recon_incrementally(recon_name, *source_dfs, merge_keys, checks, incremental_config.get('suffixes', DEFAULT_SUFFIXES))
+        run_record['rows'] = incremental_stats['checked_rows']
+        run_record['detail'] = f'{incremental_stats["reused_rows"]:,} rows reused'
+
+    with run_metrics.stage('save_recon_report') as save_record:
+        run_id = save_recon_report(recon_summary_df, recon_name)
+        save_record['rows'] = incremental_stats['rows']
+
+    run_metrics.save(run_id)
+
+    return {'rows': incremental_stats['rows'], 'checks': recon_summary_df['Check'].nunique(), 'imports': [], 'incremental': incremental_stats}
+
+
+def rerun_recon_in_worker(recon_name: str, params: Dict[str, str], incremental_config: Optional[dict], result_connection):
+    start = time.perf_counter()
+    try:
+        if incremental_config is not None:
+            result = rerun_recon_incrementally(recon_name, params, incremental_config)
+        else:
+            result = rerun_recon(recon_name, params)
+        result.update({'recon_name': recon_name, 'status': SUCCESS, 'error': None})
+    except Exception:
+        result = {'recon_name': recon_name, 'status': FAILED, 'error': traceback.format_exc(), 'rows': 0, 'checks': 0}
+
+    result['seconds'] = time.perf_counter() - start
+    result_connection.send(result)
+    result_connection.close()
+
+
+def run_recons(recon_configs: Dict[str, dict], max_workers: int, timeout_seconds: float) -> List[dict]:
+    """
+    Reruns each recon in its own process, with at most max_workers running at once. A recon that raises,
+    crashes, or runs longer than timeout_seconds is recorded as failed without affecting the other recons.
+    Each worker sends its result over its own pipe, so stopping a worker that timed out can't corrupt
+    the results of the others.
+    """
+    context = multiprocessing.get_context('spawn')
+
+    pending_recon_names = list(recon_configs.keys())
+    running = {}
+    results = {}
+
+    while pending_recon_names or running:
+        while pending_recon_names and len(running) < max_workers:
+            recon_name = pending_recon_names.pop(0)
+            result_connection, worker_connection = context.Pipe(duplex=False)
+            process = context.Process(
+                target=rerun_recon_in_worker,
+                args=(recon_name, recon_configs[recon_name].get('params', {}), recon_configs[recon_name].get('incremental'), worker_connection),
+                daemon=True
+            )
+            process.start()
+            # Only the worker writes to the pipe, so its end is closed here and the pipe reads EOF once the worker exits
+            worker_connection.close()
+            running[recon_name] = (process, result_connection, time.perf_counter())
+
+        multiprocessing.connection.wait([result_connection for _, result_connection, _ in running.values()], timeout=0.1)
+
+        for recon_name, (process, result_connection, start) in list(running.items()):
+            if result_connection.poll():
+                try:
+                    results[recon_name] = result_connection.recv()
+                except EOFError:
+                    # The worker exited without sending a result
+                    process.join()
+                    results[recon_name] = {'recon_name': recon_name, 'status': FAILED, 'error': f'Worker exited with code {process.exitcode}', 'rows': 0, 'checks': 0, 'seconds': time.perf_counter() - start}
+            elif time.perf_counter() - start > timeout_seconds:
+                process.terminate()
+                results[recon_name] = {'recon_name': recon_name, 'status': TIMED_OUT, 'error': f'Did not finish within {timeout_seconds} seconds', 'rows': 0, 'checks': 0, 'seconds': time.perf_counter() - start}
+            else:
+                continue
+
+            process.join()
+            result_connection.close()
+            del running[recon_name]
+
+    return [results[recon_name] for recon_name in recon_configs]
+
+
+def print_summary(results: List[dict], wall_seconds: float):
+    print(f'\n{"Recon":<40} {"Status":<10} {"Seconds":>9} {"Rows":>12} {"Rows/sec":>12}')
+    for result in results:
+        rows_per_second = result['rows'] / result['seconds'] if result['seconds'] > 0 else 0
+        print(f'{result["recon_name"]:<40} {result["status"]:<10} {result["seconds"]:>9.2f} {result["rows"]:>12,} {rows_per_second:>12,.0f}')
+
+    # The sources of each recon load at the same time, so its import time is about that of its slowest source
+    import_rows = [(result['recon_name'], source) for result in results for source in result.get('imports', [])]
+    if len(import_rows) > 0:
+        print(f'\n{"Recon":<40} {"Source":<40} {"Seconds":>9} {"Rows":>12}')
+        for recon_name, source in import_rows:
+            print(f'{recon_name:<40} {source["name"]:<40} {source["seconds"]:>9.2f} {source["rows"] or 0:>12,}')
+
+    for result in results:
+        if 'incremental' in result:
+            print(f'\n{result["recon_name"]} reran incrementally: checked {result["incremental"]["checked_rows"]:,} rows and reused {result["incremental"]["reused_rows"]:,}')
+
+    for result in results:
+        if result['status'] != SUCCESS:
+            print(f'\n{result["recon_name"]} {result["status"].lower()}:\n{result["error"]}')
+
+    number_succeeded = len([result for result in results if result['status'] == SUCCESS])
+    total_rows = sum(result['rows'] for result in results)
+    total_recon_seconds = sum(result['seconds'] for result in results)
+
+    print(f'\n{number_succeeded}/{len(results)} recons succeeded in {wall_seconds:.2f} seconds')
+    print(f'Throughput: {len(results) / wall_seconds * 60:.1f} recons/min, {total_rows / wall_seconds:,.0f} rows/sec')
+    print(f'Total recon time: {total_recon_seconds:.2f} seconds ({total_recon_seconds / wall_seconds:.1f}x parallel speedup)')
+
+
+def get_recon_configs(config_path: Optional[str], recon_names: Optional[List[str]]) -> Dict[str, dict]:
+    config = {}
+    if config_path is not None:
+        with open(config_path, 'r') as file:
+            config = json.load(file)
+
+    saved_recon_names = get_saved_recon_names()
+    for recon_name in config:
+        if recon_name not in saved_recon_names:
+            raise ValueError(f'The recon {recon_name} in the config does not have a saved analysis in the recon-scripts folder.')
+    for recon_name in recon_names or []:
+        if recon_name not in saved_recon_names:
+            raise ValueError(f'The recon {recon_name} does not have a saved analysis in the recon-scripts folder.')
+
+    return {recon_name: config.get(recon_name, {}) for recon_name in (recon_names or saved_recon_names)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rerun saved recons in parallel.')
+    parser.add_argument('--config', help='JSON file with the import parameters to bind for each recon.')
+    parser.add_argument('--recons', nargs='+', help='Only rerun these recons. Defaults to every recon in the recon-scripts folder.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='How many recons to run at once.')
+    parser.add_argument('--timeout', type=float, default=600, help='Seconds before a recon is stopped and marked as timed out.')
+    args = parser.parse_args()
+
+    try:
+        recon_configs = get_recon_configs(args.config, args.recons)
+    except ValueError as e:
+        parser.error(str(e))
+
+    start = time.perf_counter()
+    results = run_recons(recon_configs, max(args.workers, 1), args.timeout)
+    wall_seconds = time.perf_counter() - start
+
+    # Register the recons that are not in the metadata yet. Recons that are already registered keep their metadata
+    for result in results:
+        if result['status'] == SUCCESS:
+            recon_config = recon_configs[result['recon_name']]
+            add_recon_to_metadata(result['recon_name'], recon_config.get('recon_description', ''), recon_config.get('recon_value', 0))
+
+    print_summary(results, wall_seconds)
+
+    if any(result['status'] != SUCCESS for result in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
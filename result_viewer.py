@@ -0,0 +1,137 @@
+"""
+Server side paging of recon result tables.
+
+Displaying a recon result used to send the whole recon dataframe, and a copy of it for every
+(check, outcome), to the browser. A ResultTable instead keeps the rows on the server as positions
+into the recon dataframe. Filters and sorts are applied to those positions, reading only the
+columns they use, and only the page of rows being shown is copied out and sent to the browser.
+
+    table = ResultTable.from_records(recon_records[0])
+    page_df, number_of_rows = table.get_page(0, 100, filters=[('Net Effective Rent Check', '>', '1000')], sort_column='Lease ID')
+"""
+import operator
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+from outcomes import decode_check_columns, decode_check_series
+
+FILTER_OPERATORS = ['contains', '==', '!=', '>', '>=', '<', '<=']
+COMPARISON_OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+}
+
+DEFAULT_PAGE_SIZE = 100
+
+# How many filtered and sorted orders of rows each table keeps, so paging through the same view
+# doesn't filter and sort again
+ROW_ORDER_CACHE_ENTRIES = 4
+
+# A filter is a (column, operator, value) tuple, where value is the text the user entered
+Filter = Tuple[str, str, str]
+
+
+def get_filter_mask(values: pd.Series, filter_operator: str, value: str) -> np.ndarray:
+    """
+    Returns which of the values pass the filter. Missing values never pass. Comparisons are numeric if
+    the value is a number, so '>' 1000 on a check column finds the failing rows with a difference
+    above 1000, and are on the text of the values otherwise.
+    """
+    if filter_operator not in FILTER_OPERATORS:
+        raise ValueError(f'Unknown filter operator {filter_operator}. Use one of {", ".join(FILTER_OPERATORS)}.')
+
+    if filter_operator == 'contains':
+        return values.astype(str).str.contains(value, case=False, regex=False).to_numpy(dtype=bool) & values.notna().to_numpy()
+
+    try:
+        compare_value = float(value)
+        compare_values = values if is_numeric_dtype(values) else pd.to_numeric(values, errors='coerce')
+    except ValueError:
+        compare_value = value
+        compare_values = values.astype(str).where(values.notna())
+
+    mask = COMPARISON_OPERATORS[filter_operator](compare_values, compare_value)
+    return mask.to_numpy(dtype=bool) & compare_values.notna().to_numpy()
+
+def get_sort_order(values: pd.Series, ascending: bool) -> np.ndarray:
+    # Returns the positions that sort the values, with missing values last and ties kept in row order
+    values = values.reset_index(drop=True)
+    try:
+        return values.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+    except TypeError:
+        # Check columns mix labels and numbers, so sort the numbers by value, followed by the labels
+        sort_keys_df = pd.DataFrame({'number': pd.to_numeric(values, errors='coerce'), 'text': values.astype(str).where(values.notna())})
+        return sort_keys_df.sort_values(['number', 'text'], ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+
+
+class ResultTable:
+    """
+    A table of recon results that is paged on the server. The rows are positions into the recon
+    dataframe, which is never copied. If check_outcome is set, pages start with a Check Outcome
+    column with that label, like ReconRecords.to_frame.
+    """
+
+    def __init__(self, label: str, recon_df: pd.DataFrame, row_positions: Optional[np.ndarray]=None, check_outcome: Optional[str]=None):
+        self.label = label
+        self.recon_df = recon_df
+        self.row_positions = np.arange(len(recon_df)) if row_positions is None else row_positions
+        self.check_outcome = check_outcome
+
+        self.row_order_cache: 'OrderedDict[tuple, np.ndarray]' = OrderedDict()
+
+    @classmethod
+    def from_records(cls, recon_records) -> 'ResultTable':
+        # Wraps the ReconRecords of a (check, outcome) without materializing them
+        return cls(recon_records.label, recon_records.recon_df, recon_records.row_positions, check_outcome=recon_records.label)
+
+    def __len__(self) -> int:
+        return len(self.row_positions)
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.recon_df.columns)
+
+    def get_row_positions(self, filters: Sequence[Filter]=(), sort_column: Optional[str]=None, ascending: bool=True) -> np.ndarray:
+        """
+        Returns the positions in the recon dataframe of the rows that pass every filter, in sorted order.
+        """
+        cache_key = (tuple(filters), sort_column, ascending)
+        if cache_key in self.row_order_cache:
+            self.row_order_cache.move_to_end(cache_key)
+            return self.row_order_cache[cache_key]
+
+        row_positions = self.row_positions
+        for column_header, filter_operator, value in filters:
+            values = decode_check_series(self.recon_df[column_header].iloc[row_positions])
+            row_positions = row_positions[get_filter_mask(values, filter_operator, value)]
+
+        if sort_column is not None:
+            row_positions = row_positions[get_sort_order(decode_check_series(self.recon_df[sort_column].iloc[row_positions]), ascending)]
+
+        self.row_order_cache[cache_key] = row_positions
+        while len(self.row_order_cache) > ROW_ORDER_CACHE_ENTRIES:
+            self.row_order_cache.popitem(last=False)
+
+        return row_positions
+
+    def get_page(self, page: int, page_size: int=DEFAULT_PAGE_SIZE, filters: Sequence[Filter]=(), sort_column: Optional[str]=None, ascending: bool=True) -> Tuple[pd.DataFrame, int]:
+        """
+        Returns the rows on the page, counting from 0, and how many rows pass the filters.
+        """
+        row_positions = self.get_row_positions(filters, sort_column, ascending)
+        page_df = decode_check_columns(self.recon_df.iloc[row_positions[page * page_size:(page + 1) * page_size]]).copy()
+        if self.check_outcome is not None:
+            page_df.insert(0, 'Check Outcome', self.check_outcome)
+        return page_df, len(row_positions)
+
+def get_result_tables(recon_df: pd.DataFrame, recon_records: list) -> List[ResultTable]:
+    # The recon dataframe, followed by the records of each (check, outcome)
+    return [ResultTable('Recon Data', recon_df)] + [ResultTable.from_records(records) for records in recon_records]
@@ -0,0 +1,200 @@
+import json
+import os
+import uuid
+from datetime import datetime
+from typing import List, Optional, Tuple
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Path to the "run_history" folder, which stores the summary of every run as Parquet
+# partitioned by recon and month, ie: run_history/recon=Residential/month=2023-11/
+RUN_HISTORY_FOLDER = 'run_history/'
+
+RUN_HISTORY_SCHEMA = pa.schema([
+    ('Date', pa.timestamp('us')),
+    ('Check', pa.string()),
+    ('Outcome', pa.dictionary(pa.int8(), pa.string())),
+    ('Count', pa.int64()),
+])
+
+RUN_HISTORY_PARTITIONING = ds.partitioning(
+    pa.schema([('recon', pa.string()), ('month', pa.string())]),
+    flavor='hive'
+)
+
+# Compacted files list the files they replace in their metadata under this key, so readers skip those
+# files until compaction removes them
+REPLACED_FILES_METADATA_KEY = b'replaced_files'
+
+def get_run_history_partition_path(recon_name: str, month: str) -> str:
+    # Recon names can contain any character, so they are url encoded like pyarrow expects
+    return os.path.join(RUN_HISTORY_FOLDER, f'recon={quote(recon_name, safe="")}', f'month={month}')
+
+def get_run_history_table(recon_summary_df: pd.DataFrame) -> pa.Table:
+    run_history_df = pd.DataFrame({
+        'Date': pd.to_datetime(recon_summary_df['Date']),
+        'Check': recon_summary_df['Check'].astype(str),
+        'Outcome': recon_summary_df['Outcome'].astype(str),
+        'Count': recon_summary_df['Count'].astype('int64'),
+    })
+    return pa.Table.from_pandas(run_history_df, schema=RUN_HISTORY_SCHEMA, preserve_index=False)
+
+def write_parquet_atomically(table: pa.Table, partition_path: str, file_name: str):
+    # Files starting with a . are ignored by the reader, so the file only shows up once it is complete
+    os.makedirs(partition_path, exist_ok=True)
+    temp_path = os.path.join(partition_path, f'.{file_name}.tmp')
+    pq.write_table(table, temp_path, compression='zstd')
+    os.replace(temp_path, os.path.join(partition_path, file_name))
+
+def get_partition_files(partition_path: str) -> Tuple[List[str], List[str]]:
+    """
+    Returns the files of the partition that hold runs, and the files that a compacted file already
+    replaced, which are left over if compaction stopped before removing them.
+    """
+    file_names = [file for file in os.listdir(partition_path) if file.endswith('.parquet') and not file.startswith('.')]
+
+    replaced_file_names = set()
+    for file in file_names:
+        if file.startswith('compacted-'):
+            metadata = pq.read_schema(os.path.join(partition_path, file)).metadata or {}
+            replaced_file_names.update(json.loads(metadata.get(REPLACED_FILES_METADATA_KEY, b'[]')))
+
+    return [file for file in file_names if file not in replaced_file_names], [file for file in file_names if file in replaced_file_names]
+
+def get_run_history_paths(recon_names: Optional[List[str]]=None) -> List[str]:
+    # Returns the path of every file that holds runs of the recons
+    recon_folders = os.listdir(RUN_HISTORY_FOLDER) if recon_names is None else [f'recon={quote(recon_name, safe="")}' for recon_name in recon_names]
+
+    paths = []
+    for recon_folder in recon_folders:
+        recon_folder_path = os.path.join(RUN_HISTORY_FOLDER, recon_folder)
+        if not os.path.isdir(recon_folder_path):
+            continue
+        for month_folder in os.listdir(recon_folder_path):
+            partition_path = os.path.join(recon_folder_path, month_folder)
+            paths.extend(os.path.join(partition_path, file) for file in get_partition_files(partition_path)[0])
+    return paths
+
+def append_run_summary(recon_name: str, recon_summary_df: pd.DataFrame):
+    """
+    Appends the summary of a run to the run history. Each run is written as its own small file,
+    which compact_run_history later merges into one file per recon and month.
+    """
+    if len(recon_summary_df) == 0:
+        return
+
+    table = get_run_history_table(recon_summary_df)
+    run_date = pd.to_datetime(recon_summary_df['Date']).iloc[0]
+
+    partition_path = get_run_history_partition_path(recon_name, run_date.strftime('%Y-%m'))
+    write_parquet_atomically(table, partition_path, f'run-{run_date.strftime("%Y-%m-%d-%H-%M-%S-%f")}-{uuid.uuid4().hex[:8]}.parquet')
+
+def read_run_history(
+        recon_names: Optional[List[str]]=None,
+        start_date: Optional[datetime]=None,
+        end_date: Optional[datetime]=None
+    ) -> pd.DataFrame:
+    """
+    Returns the summaries of all runs with the columns Recon, Date, Check, Outcome and Count, optionally
+    filtered to some recons and a date range. Only the partitions that match the filters are read.
+    """
+    columns = ['Recon', 'Date', 'Check', 'Outcome', 'Count']
+    if not os.path.exists(RUN_HISTORY_FOLDER):
+        return pd.DataFrame(columns=columns)
+
+    filters = []
+    if recon_names is not None:
+        filters.append(ds.field('recon').isin(recon_names))
+    if start_date is not None:
+        filters.append(ds.field('month') >= pd.Timestamp(start_date).strftime('%Y-%m'))
+        filters.append(ds.field('Date') >= pa.scalar(pd.Timestamp(start_date).to_pydatetime(), type=pa.timestamp('us')))
+    if end_date is not None:
+        filters.append(ds.field('month') <= pd.Timestamp(end_date).strftime('%Y-%m'))
+        filters.append(ds.field('Date') <= pa.scalar(pd.Timestamp(end_date).to_pydatetime(), type=pa.timestamp('us')))
+
+    combined_filter = None
+    for run_history_filter in filters:
+        combined_filter = run_history_filter if combined_filter is None else combined_filter & run_history_filter
+
+    # Compaction can remove files after they are listed, in which case the files are listed again, which finds the compacted file instead
+    for attempt in range(2):
+        try:
+            dataset = ds.dataset(
+                get_run_history_paths(recon_names),
+                schema=RUN_HISTORY_SCHEMA.append(pa.field('recon', pa.string())).append(pa.field('month', pa.string())),
+                format='parquet',
+                partitioning=RUN_HISTORY_PARTITIONING,
+                partition_base_dir=RUN_HISTORY_FOLDER
+            )
+            run_history_df = dataset.to_table(columns=['recon', 'Date', 'Check', 'Outcome', 'Count'], filter=combined_filter).to_pandas()
+            break
+        except FileNotFoundError:
+            if attempt == 1:
+                raise
+    run_history_df = run_history_df.rename(columns={'recon': 'Recon'})
+    run_history_df['Recon'] = run_history_df['Recon'].astype('category')
+
+    return run_history_df.sort_values(['Recon', 'Date'], kind='stable', ignore_index=True)
+
+def compact_run_history():
+    """
+    Merges the files in each recon and month partition into a single file sorted by Date. Partitions
+    that are already a single file are left alone, so this is cheap to run on a schedule. The compacted
+    file lists the files it replaces, so readers never count a run twice while they are being removed.
+    """
+    if not os.path.exists(RUN_HISTORY_FOLDER):
+        return
+
+    for recon_folder in os.listdir(RUN_HISTORY_FOLDER):
+        recon_folder_path = os.path.join(RUN_HISTORY_FOLDER, recon_folder)
+        if not os.path.isdir(recon_folder_path):
+            continue
+
+        for month_folder in os.listdir(recon_folder_path):
+            partition_path = os.path.join(recon_folder_path, month_folder)
+            file_names, replaced_file_names = get_partition_files(partition_path)
+
+            # Remove the files left over from a compaction that stopped part way
+            for file in replaced_file_names:
+                os.remove(os.path.join(partition_path, file))
+
+            if len(file_names) <= 1:
+                continue
+
+            table = pa.concat_tables([pq.read_table(os.path.join(partition_path, file), schema=RUN_HISTORY_SCHEMA) for file in file_names])
+            table = table.sort_by('Date').replace_schema_metadata({REPLACED_FILES_METADATA_KEY: json.dumps(file_names)})
+
+            write_parquet_atomically(table, partition_path, f'compacted-{uuid.uuid4().hex}.parquet')
+            for file in file_names:
+                os.remove(os.path.join(partition_path, file))
+
+def migrate_csv_outputs_to_run_history(outputs_folder: str) -> int:
+    """
+    Appends every run in the CSV outputs folder to the run history, skipping runs that were already
+    migrated. Returns the number of runs that were added.
+    """
+    number_of_runs_migrated = 0
+
+    for recon_name in os.listdir(outputs_folder):
+        recon_folder_path = os.path.join(outputs_folder, recon_name)
+        if not os.path.isdir(recon_folder_path):
+            continue
+
+        existing_run_dates = set(read_run_history(recon_names=[recon_name])['Date'])
+
+        for file in sorted(os.listdir(recon_folder_path)):
+            if not file.endswith('.csv'):
+                continue
+
+            recon_summary_df = pd.read_csv(os.path.join(recon_folder_path, file))
+            if len(recon_summary_df) == 0 or pd.to_datetime(recon_summary_df['Date']).iloc[0] in existing_run_dates:
+                continue
+
+            append_run_summary(recon_name, recon_summary_df)
+            number_of_runs_migrated += 1
+
+    return number_of_runs_migrated
@@ -0,0 +1,274 @@
+"""
+Per stage timing and memory metrics for recon runs.
+
+A run starts a RunMetrics and wraps each of its stages in run_metrics.stage(...). Stages that run inside
+another stage, like the custom importers and the check formulas that run inside analysis.run(), record
+themselves with measure_stage, and their time is subtracted from the self time of the stage around them.
+Once the run is saved, its metrics are appended to the metrics log with the run id.
+
+Set RECON_METRICS_ENABLED=0 to turn collection off. Stages then do no work beyond a function call.
+"""
+import contextlib
+import functools
+import os
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+RUN_METRICS_ENABLED = os.environ.get('RECON_METRICS_ENABLED', '1').lower() not in ('0', 'false', 'no')
+
+# Path to the metrics log, which has one row per stage of every run
+RUN_METRICS_FILE_PATH = 'outputs/run_metrics.csv'
+RUN_METRICS_COLUMNS = [
+    'run_id', 'recon_name', 'flow', 'stage', 'detail', 'rows',
+    'seconds', 'self_seconds', 'peak_rss_mb', 'rss_change_mb', 'recorded_at'
+]
+
+# How often memory is sampled while a stage runs, to find the stage's peak. Stages that are shorter
+# than this are only sampled when they start and finish
+RSS_SAMPLE_INTERVAL_SECONDS = 0.05
+
+# The stage that is currently running in this thread, so nested stages know where to record themselves
+CURRENT_RUN_METRICS: ContextVar[Optional['RunMetrics']] = ContextVar('current_run_metrics', default=None)
+
+
+def get_rss_mb() -> Optional[float]:
+    if psutil is None:
+        return None
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+class PeakRssSampler:
+    """
+    Samples the memory of the process on a background thread while any stage is being measured, and
+    keeps the peak seen during each open stage. Memory is process wide, so a stage's peak includes
+    whatever else the process is doing at the same time, like another session's run.
+    """
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self.lock = threading.Lock()
+        self.peaks: Dict[int, float] = {}
+        self.next_token = 0
+        self.has_open_stages = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self) -> Optional[int]:
+        # Starts tracking the peak of a stage, and returns the token to stop it with
+        rss = get_rss_mb()
+        if rss is None:
+            return None
+
+        with self.lock:
+            token = self.next_token
+            self.next_token += 1
+            self.peaks[token] = rss
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.sample, name='peak-rss-sampler', daemon=True)
+                self.thread.start()
+            self.has_open_stages.set()
+        return token
+
+    def stop(self, token: Optional[int]) -> Optional[float]:
+        # Returns the peak memory of the stage in MB
+        if token is None:
+            return None
+
+        rss = get_rss_mb()
+        with self.lock:
+            peak = max(self.peaks.pop(token), rss)
+            if len(self.peaks) == 0:
+                self.has_open_stages.clear()
+        return peak
+
+    def sample(self):
+        while True:
+            self.has_open_stages.wait()
+            rss = get_rss_mb()
+            with self.lock:
+                for token, peak in self.peaks.items():
+                    self.peaks[token] = max(peak, rss)
+            time.sleep(self.interval_seconds)
+
+
+PEAK_RSS_SAMPLER = PeakRssSampler(RSS_SAMPLE_INTERVAL_SECONDS)
+
+
+class RunMetrics:
+    """
+    Collects the wall time, rows, and memory of each stage of a single run.
+    """
+
+    def __init__(self, recon_name: str, flow: str, enabled: bool=RUN_METRICS_ENABLED):
+        self.recon_name = recon_name
+        self.flow = flow
+        self.enabled = enabled
+
+        self.records: List[dict] = []
+        self.open_records: List[dict] = []
+
+    @contextlib.contextmanager
+    def stage(self, stage: str, detail: str=''):
+        """
+        Measures the stage run inside the with block. Set 'rows' on the yielded record to record
+        how many rows the stage handled.
+        """
+        if not self.enabled:
+            yield {}
+            return
+
+        record = {'stage': stage, 'detail': detail, 'rows': None, 'nested_seconds': 0.0}
+        self.open_records.append(record)
+        token = CURRENT_RUN_METRICS.set(self)
+        rss_before = get_rss_mb()
+        peak_rss_token = PEAK_RSS_SAMPLER.start()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            seconds = time.perf_counter() - start
+            CURRENT_RUN_METRICS.reset(token)
+            self.open_records.pop()
+            if len(self.open_records) > 0:
+                self.open_records[-1]['nested_seconds'] += seconds
+
+            rss_after = get_rss_mb()
+            record.update({
+                'seconds': seconds,
+                'self_seconds': seconds - record.pop('nested_seconds'),
+                'peak_rss_mb': PEAK_RSS_SAMPLER.stop(peak_rss_token),
+                'rss_change_mb': rss_after - rss_before if rss_after is not None and rss_before is not None else None,
+                'recorded_at': datetime.now(),
+            })
+            self.records.append(record)
+
+    def add_concurrent_stages(self, stage: str, stage_records: List[dict], wall_seconds: float, peak_rss_mb: Optional[float]=None):
+        """
+        Records stages that ran at the same time in other threads, which can't use stage() since the
+        stages open in this thread are not visible there. Each record has a detail, rows, and seconds.
+        The stage around them only subtracts the wall time they took together, not the sum of their times.
+        The stages share the process, so they share peak_rss_mb, the peak while they ran together.
+        """
+        if not self.enabled:
+            return
+
+        if len(self.open_records) > 0:
+            self.open_records[-1]['nested_seconds'] += wall_seconds
+
+        recorded_at = datetime.now()
+        for stage_record in stage_records:
+            self.records.append({
+                'stage': stage,
+                'detail': stage_record['detail'],
+                'rows': stage_record['rows'],
+                'seconds': stage_record['seconds'],
+                'self_seconds': stage_record['seconds'],
+                'peak_rss_mb': peak_rss_mb,
+                'rss_change_mb': None,
+                'recorded_at': recorded_at,
+            })
+
+    def add_records(self, records: List[dict]):
+        # Adds the stages that another RunMetrics measured, like the analysis run kept in ANALYSIS_RUN_CACHE
+        if self.enabled:
+            self.records.extend(records)
+
+    def save(self, run_id: str):
+        """
+        Appends the stages to the metrics log. Each run is appended with a single write, so runs
+        saved at the same time from different processes don't interleave.
+        """
+        if not self.enabled or len(self.records) == 0:
+            return
+
+        run_metrics_df = pd.DataFrame(self.records)
+        run_metrics_df['run_id'] = run_id
+        run_metrics_df['recon_name'] = self.recon_name
+        run_metrics_df['flow'] = self.flow
+        run_metrics_df = run_metrics_df[RUN_METRICS_COLUMNS]
+
+        os.makedirs(os.path.dirname(RUN_METRICS_FILE_PATH), exist_ok=True)
+        try:
+            with open(RUN_METRICS_FILE_PATH, 'x') as file:
+                file.write(','.join(RUN_METRICS_COLUMNS) + '\n')
+        except FileExistsError:
+            pass
+
+        with open(RUN_METRICS_FILE_PATH, 'a') as file:
+            file.write(run_metrics_df.to_csv(index=False, header=False))
+
+
+def measure_stage(stage: str, detail: str=''):
+    # Measures the stage as part of the run that is currently being measured, if there is one
+    run_metrics = CURRENT_RUN_METRICS.get()
+    if run_metrics is None:
+        return contextlib.nullcontext({})
+    return run_metrics.stage(stage, detail)
+
+def measured_check(check_function: Callable) -> Callable:
+    """
+    Decorator that records each call of a check formula as a 'check' stage of the current run, labeled
+    with the columns it compares. The wrapped function keeps its name and docstring, so Mito still
+    registers it as the same sheet function.
+    """
+    @functools.wraps(check_function)
+    def measured(series_one, series_two, *args, **kwargs):
+        if CURRENT_RUN_METRICS.get() is None:
+            return check_function(series_one, series_two, *args, **kwargs)
+
+        detail = f'{check_function.__name__}({getattr(series_one, "name", "")}, {getattr(series_two, "name", "")})'
+        with measure_stage('check', detail) as record:
+            record['rows'] = len(series_one) if hasattr(series_one, '__len__') else 1
+            return check_function(series_one, series_two, *args, **kwargs)
+
+    return measured
+
+
+def read_run_metrics() -> pd.DataFrame:
+    if not os.path.exists(RUN_METRICS_FILE_PATH):
+        return pd.DataFrame(columns=RUN_METRICS_COLUMNS)
+    return pd.read_csv(RUN_METRICS_FILE_PATH, dtype={'run_id': str, 'recon_name': str, 'detail': str}, keep_default_na=False, na_values=[''])
+
+def get_latest_run_metrics(run_metrics_df: pd.DataFrame) -> pd.DataFrame:
+    # Keeps only the stages of the most recent run of each recon
+    if len(run_metrics_df) == 0:
+        return run_metrics_df
+    latest_run_ids = run_metrics_df.groupby('recon_name')['run_id'].max()
+    return run_metrics_df[run_metrics_df['run_id'] == run_metrics_df['recon_name'].map(latest_run_ids)]
+
+def get_slowest_recons(run_metrics_df: pd.DataFrame, number_of_recons: int=10) -> pd.DataFrame:
+    """
+    Returns the total time, peak memory, and slowest stage of the most recent run of each recon, slowest first.
+    """
+    latest_run_metrics_df = get_latest_run_metrics(run_metrics_df)
+    if len(latest_run_metrics_df) == 0:
+        return pd.DataFrame(columns=['recon_name', 'run_id', 'flow', 'seconds', 'peak_rss_mb', 'slowest_stage'])
+
+    slowest_stages = latest_run_metrics_df.loc[latest_run_metrics_df.groupby('recon_name')['self_seconds'].idxmax()].set_index('recon_name')
+    slowest_recons_df = latest_run_metrics_df.groupby('recon_name').agg(
+        run_id=('run_id', 'first'),
+        flow=('flow', 'first'),
+        seconds=('self_seconds', 'sum'),
+        peak_rss_mb=('peak_rss_mb', 'max'),
+    )
+    slowest_recons_df['slowest_stage'] = slowest_stages['stage'] + slowest_stages['detail'].fillna('').map(lambda detail: f': {detail}' if detail else '')
+
+    return slowest_recons_df.sort_values('seconds', ascending=False).head(number_of_recons).reset_index()
+
+def get_slowest_stages(run_metrics_df: pd.DataFrame, number_of_stages: int=10) -> pd.DataFrame:
+    """
+    Returns the stages of the most recent run of every recon that took the longest, not counting
+    the time of the stages nested inside them.
+    """
+    latest_run_metrics_df = get_latest_run_metrics(run_metrics_df)
+    columns = ['recon_name', 'stage', 'detail', 'rows', 'self_seconds', 'seconds', 'peak_rss_mb', 'rss_change_mb']
+    return latest_run_metrics_df.sort_values('self_seconds', ascending=False)[columns].head(number_of_stages).reset_index(drop=True)
@@ -1,63 +1,127 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
+import numpy as np
 import pandas as pd
 from datetime import datetime
 import os
 from custom_spreadsheet_functions import IMMATERIAL, MATCH
-import plotly.express as px
+from outcomes import FAILING, OUTCOME_CODES, RECON_REPORT_OUTCOMES, decode_outcomes, encode_check_values, get_check_columns, get_outcome_codes
+from run_history import append_run_summary, compact_run_history, read_run_history
+from exception_store import get_exception_record_sets, get_exception_run_ids, read_exception_records_page, remove_exception_records, save_exception_records
+from run_metrics import RunMetrics, get_slowest_recons, get_slowest_stages, measure_stage, read_run_metrics
+from import_loader import ImportSourceError, run_analysis_with_concurrent_imports
+from report_export import CSV, EXPORT_FORMATS, MAX_DOWNLOAD_BYTES, PARQUET, XLSX, export_recon_records, export_saved_run_records, get_export_path, remove_old_exports
+from recon_store import RUN_COUNT_COLUMNS, RUN_STATUS_SAVED, RUN_STATUS_SAVING, add_recon, add_saved_run, delete_runs, get_latest_run, get_latest_runs, get_recon_metadata, get_recon_trends_version, get_registered_file_names, get_registered_recon_names, get_registered_runs, get_runs, get_total_recon_value, mark_run_failed, mark_run_saved, read_recon_trends_rows, register_run, replace_all_recon_trends, replace_recon_trends_day
 import inspect
 
-METADATE_FILE_PATH = 'recon_metadata.csv'
-
 # Path to the "outputs" folder
 OUTPUTS_FOLDER = 'outputs/'
 
-def get_value_count(value_counts: pd.Series, value: str) -> int:
-    if value in value_counts:
-        return value_counts[value]
-    return 0
+# Path to the "recon-scripts" folder, which holds the saved analysis of each recon
+RECON_SCRIPTS_FOLDER = 'recon-scripts'
 
-def get_recon_report(recon_df: pd.DataFrame) -> List[pd.DataFrame]:
+# Outputs are named after the date and time of the run. If another run of the recon was saved in the
+# same second, the run registry adds a -2, -3, ... suffix before the extension
+RUN_FILE_NAME_FORMAT = "%Y-%m-%d-%H-%M-%S.csv"
+
+# A run that is still being saved after this long was interrupted, for example by its process being killed
+STALE_SAVING_RUN_SECONDS = 60 * 60
+
+# The columns of the daily series of each recon's check outcomes, which the trends page reads
+RECON_TRENDS_COLUMNS = ['Recon', 'Day', 'Date', 'Check', 'Outcome', 'Count']
+
+# The totals of the most recent run of each recon, which the dashboard reads from the run registry
+RECON_ROLLUP_COLUMNS = [
+    'recon_name', 
+    'run_date', 
+    'number_of_rules_applied', 
+    'number_of_records_checked', 
+    'number_of_matching_checks', 
+    'number_of_immaterial_checks', 
+    'number_of_failing_checks'
+]
+
+
+class ReconRecords:
     """
-    Given a recon dataframe, returns a list of dataframes with the following structure:
-    1. A summary dataframe that shows the number of records that matched, were immaterial, or failed for each check
-    2. For each (check, outcome) a separate dataframe that only shows records for that (check, outcome)
+    A lazy view of the records in a recon dataframe that had one outcome for one check. Only the
+    row positions are stored, and the records are copied out of the recon dataframe by to_frame.
     """
-    recon_summary_df = pd.DataFrame(columns=['Date', 'Check', 'Outcome', 'Count'])
 
-    # Label the report with the current datetime
-    now = datetime.now()
+    def __init__(self, recon_df: pd.DataFrame, check: str, outcome: str, row_positions: np.ndarray):
+        self.recon_df = recon_df
+        self.check = check
+        self.outcome = outcome
+        self.row_positions = row_positions
 
-    outcome_dfs = [recon_summary_df, recon_df]
+    @property
+    def label(self) -> str:
+        return f'{self.check} - {self.outcome}'
 
-    # For each series in the dataframe, if the column contains the word check, build the summary
-    for column_header in recon_df.columns:
-        if 'check' in column_header.lower():
-            value_counts = recon_df[column_header].value_counts()
+    def __len__(self) -> int:
+        return len(self.row_positions)
 
-            matching_value_counts = get_value_count(value_counts, MATCH)
-            immaterial_value_counts = get_value_count(value_counts, IMMATERIAL)
-            failing_value_counts = value_counts.sum() - matching_value_counts - immaterial_value_counts
+    def to_frame(self, start: int=0, stop: Optional[int]=None) -> pd.DataFrame:
+        """
+        Materializes the records between start and stop, with a Check Outcome column at the front of the dataframe
+        """
+        records_df = self.recon_df.iloc[self.row_positions[start:stop]].copy()
+        records_df.insert(0, 'Check Outcome', self.label)
+        return records_df
 
-            matching_checks_summary = [now, column_header, MATCH, matching_value_counts]
-            immaterial_checks_summary  = [now, column_header, IMMATERIAL, immaterial_value_counts]
-            failing_checks_summary = [now, column_header, 'Failing', failing_value_counts]
 
-            recon_summary_df.loc[len(recon_summary_df)] = matching_checks_summary
-            recon_summary_df.loc[len(recon_summary_df)] = immaterial_checks_summary
-            recon_summary_df.loc[len(recon_summary_df)] = failing_checks_summary
+def get_recon_report_records(recon_df: pd.DataFrame) -> Tuple[pd.DataFrame, List[ReconRecords]]:
+    """
+    Given a recon dataframe, returns a tuple of:
+    1. A summary dataframe that shows the number of records that matched, were immaterial, or failed for each check
+    2. For each (check, outcome), a lazy ReconRecords view of the records with that (check, outcome)
 
-            matching_checks_df = recon_df[recon_df[column_header] == MATCH]
-            immaterial_checks_df = recon_df[recon_df[column_header] == IMMATERIAL]
-            failing_checks_df = recon_df[(recon_df[column_header] != MATCH ) & (recon_df[column_header] != IMMATERIAL)]
+    All of the check columns are stacked once and counted with a single groupby, and the records 
+    are kept as row positions so nothing is copied until someone displays or exports them.
+    """
+    # Label the report with the current datetime
+    now = datetime.now()
 
-            # Add an check column to each dataframe at the front of the dataframe
-            matching_checks_df.insert(0, 'Check Outcome', f'{column_header} - {MATCH}')
-            immaterial_checks_df.insert(0, 'Check Outcome', f'{column_header} - {IMMATERIAL}')
-            failing_checks_df.insert(0, 'Check Outcome', f'{column_header} - Failing')
+    check_columns = get_check_columns(recon_df)
+    if len(check_columns) == 0:
+        return pd.DataFrame(columns=['Date', 'Check', 'Outcome', 'Count']), []
 
-            outcome_dfs.extend([matching_checks_df, immaterial_checks_df, failing_checks_df])
+    # Stack the check columns on top of each other, in column order
+    outcome_codes = recon_df.outcomes.codes(check_columns)
+    stacked_df = pd.DataFrame({
+        'Check': pd.Categorical.from_codes(np.repeat(np.arange(len(check_columns)), len(recon_df)), categories=check_columns),
+        'Outcome': pd.Categorical.from_codes(outcome_codes.ravel(order='F'), categories=RECON_REPORT_OUTCOMES),
+    })
+
+    counts = stacked_df.groupby(['Check', 'Outcome'], observed=False).size()
+    recon_summary_df = pd.DataFrame({
+        'Date': now,
+        'Check': counts.index.get_level_values('Check').astype(object),
+        'Outcome': counts.index.get_level_values('Outcome').astype(object),
+        'Count': counts.to_numpy(dtype='int64')
+    })
+
+    recon_records = []
+    for check_index, column_header in enumerate(check_columns):
+        check_outcome_codes = outcome_codes[:, check_index]
+        recon_records.extend([
+            ReconRecords(recon_df, column_header, MATCH, np.flatnonzero(check_outcome_codes == 0)),
+            ReconRecords(recon_df, column_header, IMMATERIAL, np.flatnonzero(check_outcome_codes == 1)),
+            # Missing values are not counted in the summary, but they are not passing either
+            ReconRecords(recon_df, column_header, FAILING, np.flatnonzero((check_outcome_codes != 0) & (check_outcome_codes != 1))),
+        ])
+
+    return recon_summary_df, recon_records
+
+def get_recon_report(recon_df: pd.DataFrame) -> List[pd.DataFrame]:
+    """
+    Given a recon dataframe, returns a list of dataframes with the following structure:
+    1. A summary dataframe that shows the number of records that matched, were immaterial, or failed for each check
+    2. For each (check, outcome) a separate dataframe that only shows records for that (check, outcome)
 
-    return outcome_dfs
+    Use get_recon_report_records instead if the (check, outcome) dataframes are not all displayed.
+    """
+    recon_summary_df, recon_records = get_recon_report_records(recon_df)
+    return [recon_summary_df, recon_df] + [records.to_frame() for records in recon_records]
 
 def get_recon_names() -> List[str]:
     # Get a list of subdirectories in the "outputs" folder
@@ -77,25 +141,284 @@ def get_most_recent_outputs_paths():
 
 def get_most_recent_output_path_by_name(recon_name: str) -> Optional[str]:
     subfolder_path = os.path.join(OUTPUTS_FOLDER, recon_name)
-    csv_files = [file for file in os.listdir(subfolder_path) if file.endswith('.csv')]
+
+    # The run registry knows the latest run, so we don't need to look at the other outputs
+    latest_run = get_latest_run(recon_name)
+    if latest_run is not None and os.path.exists(os.path.join(subfolder_path, latest_run['file_name'])):
+        return os.path.join(subfolder_path, latest_run['file_name'])
+
+    # Register any outputs that the registry doesn't know about, like ones copied in by hand
+    csv_files = register_existing_outputs(recon_name)
     return get_most_recent_csv_file_path(subfolder_path, csv_files)
     
 def get_most_recent_csv_file_path(subfolder_path: str, csv_files: List[str]) -> Optional[str]:
-    if csv_files:
-        # Find the most recent CSV file
-        most_recent_csv = max(csv_files, key=lambda x: os.path.getctime(os.path.join(subfolder_path, x)))            
+    # Find the most recent CSV file from the run date in its name, since file metadata like the 
+    # ctime is expensive to read on network drives and is not preserved when outputs are copied
+    run_dates = {file: get_run_date_from_file_name(file) for file in csv_files}
+    run_dates = {file: run_date for file, run_date in run_dates.items() if run_date is not None}
+
+    if run_dates:
+        # Runs saved in the same second are ordered by their suffix
+        most_recent_csv = max(run_dates, key=lambda file: (run_dates[file], len(file), file))
         most_recent_csv_path = os.path.join(subfolder_path, most_recent_csv)
 
         return most_recent_csv_path
     return None
 
-def save_recon_report(recon_summary_df: pd.DataFrame, recon_name: str):
-    # Save the csv as the current date and time in the outputs/RECON_NAME folder
-    now = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
-    recon_summary_df.to_csv(f'./outputs/{recon_name}/{now}.csv', index=False)
+def get_run_date_from_file_name(file_name: str) -> Optional[datetime]:
+    try:
+        return datetime.strptime(file_name, RUN_FILE_NAME_FORMAT)
+    except ValueError:
+        pass
+
+    # Strip the suffix of a run that was saved in the same second as another run
+    run_id, extension = os.path.splitext(file_name)
+    base_run_id, _, suffix = run_id.rpartition('-')
+    if not suffix.isdigit():
+        return None
+    try:
+        return datetime.strptime(base_run_id + extension, RUN_FILE_NAME_FORMAT)
+    except ValueError:
+        return None
+
+def register_existing_outputs(recon_name: str) -> List[str]:
+    """
+    Registers the outputs of the recon that are not in the run registry yet, and returns the 
+    names of all of the recon's output files.
+    """
+    subfolder_path = os.path.join(OUTPUTS_FOLDER, recon_name)
+    if not os.path.isdir(subfolder_path):
+        return []
+
+    csv_files = [file for file in os.listdir(subfolder_path) if file.endswith('.csv')]
+    registered_file_names = set(get_registered_file_names(recon_name))
+
+    for file in csv_files:
+        run_date = get_run_date_from_file_name(file)
+        if file in registered_file_names or run_date is None:
+            continue
+        recon_summary_df = pd.read_csv(os.path.join(subfolder_path, file))
+        add_saved_run(recon_name, os.path.splitext(file)[0], run_date, file, get_recon_rollup_row(recon_name, recon_summary_df)[2:])
+
+    return csv_files
+
+def save_recon_report(recon_summary_df: pd.DataFrame, recon_name: str, recon_records: Optional[List[ReconRecords]]=None) -> str:
+    """
+    Saves the summary of a run, and the Immaterial and Failing records of each check if recon_records
+    is given. Returns the run id, which is the name of the output file without the extension.
+    """
+    # Register the run first, which reserves a unique run id even if another session saves a run
+    # of this recon in the same second. The run is only visible once it is marked as saved.
+    run_date = datetime.now()
+    run_id = register_run(recon_name, run_date, os.path.splitext(run_date.strftime(RUN_FILE_NAME_FORMAT))[0])
+    file_path = os.path.join(OUTPUTS_FOLDER, recon_name, f'{run_id}.csv')
+
+    try:
+        if recon_records is not None:
+            save_exception_records(recon_name, run_id, recon_records)
+
+        # Save the csv as the run id in the outputs/RECON_NAME folder
+        os.makedirs(os.path.join(OUTPUTS_FOLDER, recon_name), exist_ok=True)
+        write_csv_atomically(recon_summary_df, file_path)
+
+        # Store the totals that the dashboard reads with the run, and make it the latest run
+        mark_run_saved(recon_name, run_id, get_recon_rollup_row(recon_name, recon_summary_df)[2:])
+    except BaseException:
+        # Remove what was written, so the outputs folder never has a run that the registry doesn't show
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        remove_exception_records(recon_name, run_id)
+        mark_run_failed(recon_name, run_id)
+        raise
+
+    # Append the run to the columnar run history
+    append_run_summary(recon_name, recon_summary_df)
+    update_recon_trends(recon_name, recon_summary_df)
+
+    return run_id
+
+def write_csv_atomically(df: pd.DataFrame, path: str):
+    # Write to a temporary file and then swap it in, so readers never see a half written file
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    df.to_csv(temp_path, index=False)
+    os.replace(temp_path, path)
+
+def get_recon_rollup_row(recon_name: str, recon_summary_df: pd.DataFrame) -> list:
+    outcomes = recon_summary_df['Outcome']
+    counts = recon_summary_df['Count']
+    run_date = recon_summary_df['Date'].iloc[0] if len(recon_summary_df) > 0 else datetime.now()
+
+    return [
+        recon_name,
+        run_date,
+        recon_summary_df['Check'].nunique(),
+        counts.sum(),
+        counts[outcomes == MATCH].sum(),
+        counts[outcomes == IMMATERIAL].sum(),
+        counts[(outcomes != MATCH) & (outcomes != IMMATERIAL)].sum()
+    ]
+
+def reconcile_registered_runs(recon_name: str):
+    """
+    Brings the recon's runs in the registry in line with its outputs folder. Saved runs whose output
+    was deleted are removed, and saved runs whose output was replaced get the totals of the new file.
+    Runs that stopped while being saved are marked as saved if their output was written, and as failed
+    otherwise. Outputs that are not registered yet are registered.
+    """
+    subfolder_path = os.path.join(OUTPUTS_FOLDER, recon_name)
+    csv_files = set(file for file in os.listdir(subfolder_path) if file.endswith('.csv')) if os.path.isdir(subfolder_path) else set()
+
+    deleted_run_ids = []
+    now = datetime.now()
+    for run in get_registered_runs(recon_name).to_dict('records'):
+        is_stale = run['status'] == RUN_STATUS_SAVING and (now - datetime.fromisoformat(run['run_date'])).total_seconds() > STALE_SAVING_RUN_SECONDS
+        if run['status'] != RUN_STATUS_SAVED and not is_stale:
+            continue
+
+        if run['file_name'] not in csv_files:
+            if is_stale:
+                mark_run_failed(recon_name, run['run_id'])
+            else:
+                deleted_run_ids.append(run['run_id'])
+            continue
+
+        run_counts = [int(count) for count in get_recon_rollup_row(recon_name, pd.read_csv(os.path.join(subfolder_path, run['file_name'])))[2:]]
+        if is_stale or run_counts != [run[column] for column in RUN_COUNT_COLUMNS]:
+            mark_run_saved(recon_name, run['run_id'], run_counts)
+
+    delete_runs(recon_name, deleted_run_ids)
+    register_existing_outputs(recon_name)
+
+def rebuild_recon_rollup() -> pd.DataFrame:
+    """
+    Reconciles the run registry with the outputs folder, and returns the rollup. Use this to recover if
+    the registry has drifted from the outputs folder, for example after outputs were copied in, deleted,
+    or replaced by hand. It reads every output, so it takes longer the more runs are saved.
+    """
+    recon_names = set(get_registered_recon_names())
+    if os.path.isdir(OUTPUTS_FOLDER):
+        recon_names.update(get_recon_names())
+    for recon_name in sorted(recon_names):
+        reconcile_registered_runs(recon_name)
+    return get_recon_rollup()
+
+def get_recon_rollup() -> pd.DataFrame:
+    # Returns one row of totals per recon, from the latest run of each recon in the run registry
+    latest_runs_df = get_latest_runs()
+    if os.path.isdir(OUTPUTS_FOLDER):
+        # Recons whose outputs were saved before the registry existed have no saved run in it yet, so
+        # register their outputs the first time they are found
+        unregistered_recon_names = set(get_recon_names()) - set(latest_runs_df['recon_name'])
+        registered_outputs = [csv_file for recon_name in sorted(unregistered_recon_names) for csv_file in register_existing_outputs(recon_name)]
+        if len(registered_outputs) > 0:
+            latest_runs_df = get_latest_runs()
+    return latest_runs_df[RECON_ROLLUP_COLUMNS]
+
+def get_recon_trends_rows(recon_name: str, recon_summary_df: pd.DataFrame) -> pd.DataFrame:
+    run_dates = pd.to_datetime(recon_summary_df['Date'])
+    return pd.DataFrame({
+        'Recon': recon_name,
+        'Day': run_dates.dt.normalize(),
+        'Date': run_dates,
+        'Check': recon_summary_df['Check'].astype(str),
+        'Outcome': recon_summary_df['Outcome'].astype(str),
+        'Count': recon_summary_df['Count'].astype('int64'),
+    }, columns=RECON_TRENDS_COLUMNS)
+
+def update_recon_trends(recon_name: str, recon_summary_df: pd.DataFrame):
+    """
+    Replaces the recon's bucket for the day of the run with the outcomes of the given summary, so 
+    each day holds the most recent run of that day. The trends are kept in the recon store, so
+    concurrent saves update them in one transaction each rather than rewriting a shared file.
+    """
+    if len(recon_summary_df) == 0:
+        return
+
+    if not has_recon_trends():
+        # Build the trends from the run history, which already includes this report
+        rebuild_recon_trends()
+        return
+
+    new_rows_df = get_recon_trends_rows(recon_name, recon_summary_df)
+    replace_recon_trends_day(
+        recon_name,
+        new_rows_df['Day'].iloc[0].isoformat(),
+        new_rows_df['Date'].max().isoformat(),
+        list(new_rows_df[['Check', 'Outcome', 'Count']].itertuples(index=False, name=None))
+    )
+
+def has_recon_trends() -> bool:
+    # The trends have been built once they have a version, even if there were no runs to build them from
+    return get_recon_trends_version() > 0
+
+def read_recon_trends() -> pd.DataFrame:
+    recon_trends_rows_df = read_recon_trends_rows()
+    return pd.DataFrame({
+        'Recon': recon_trends_rows_df['recon_name'],
+        'Day': pd.to_datetime(recon_trends_rows_df['day']),
+        'Date': pd.to_datetime(recon_trends_rows_df['run_date']),
+        'Check': recon_trends_rows_df['check_name'],
+        'Outcome': recon_trends_rows_df['outcome'],
+        'Count': recon_trends_rows_df['count'].astype('int64'),
+    }, columns=RECON_TRENDS_COLUMNS)
+
+def rebuild_recon_trends() -> pd.DataFrame:
+    """
+    Rebuilds the daily trends from the run history, keeping the most recent run of each recon on each day.
+    """
+    run_history_df = read_run_history()
+    if len(run_history_df) == 0:
+        replace_all_recon_trends([])
+        return pd.DataFrame(columns=RECON_TRENDS_COLUMNS)
+
+    run_history_df['Day'] = run_history_df['Date'].dt.normalize()
+
+    last_run_dates = run_history_df.groupby(['Recon', 'Day'], observed=True)['Date'].transform('max')
+    run_history_df = run_history_df[run_history_df['Date'] == last_run_dates]
+
+    recon_trends_df = pd.DataFrame({
+        'Recon': run_history_df['Recon'].astype(str),
+        'Day': run_history_df['Day'],
+        'Date': run_history_df['Date'],
+        'Check': run_history_df['Check'].astype(str),
+        'Outcome': run_history_df['Outcome'].astype(str),
+        'Count': run_history_df['Count'].astype('int64'),
+    }, columns=RECON_TRENDS_COLUMNS)
+    replace_all_recon_trends([
+        (recon_name, day.isoformat(), run_date.isoformat(), check_name, outcome, count)
+        for recon_name, day, run_date, check_name, outcome, count in recon_trends_df.itertuples(index=False, name=None)
+    ])
+    return recon_trends_df
+
+def get_recon_trends() -> pd.DataFrame:
+    # Returns the daily series of every recon, building them the first time they are needed
+    if not has_recon_trends():
+        return rebuild_recon_trends()
+    return read_recon_trends()
+
+def get_total_number_of_rules_applied(recon_rollup_df: pd.DataFrame) -> int:
+    return int(recon_rollup_df['number_of_rules_applied'].sum())
+
+def get_total_number_of_records_checked(recon_rollup_df: pd.DataFrame) -> int:
+    return int(recon_rollup_df['number_of_records_checked'].sum())
+
+def get_total_number_of_checks_for_outcome(recon_rollup_df: pd.DataFrame, outcome: str) -> int:
+    if outcome == MATCH:
+        return int(recon_rollup_df['number_of_matching_checks'].sum())
+    if outcome == IMMATERIAL:
+        return int(recon_rollup_df['number_of_immaterial_checks'].sum())
+    return 0
+
+def get_total_number_of_failing_checks(recon_rollup_df: pd.DataFrame) -> int:
+    return int(recon_rollup_df['number_of_failing_checks'].sum())
+
+def get_total_number_of_hours_saved():
+    return get_total_recon_value()
 
 def get_recon_summary_graph(check_summary_df: pd.DataFrame):
     # Visualize the summary report using Plotly code generated by Mito
+    # Imported here so that pages that don't draw the graph don't load plotly
+    import plotly.express as px
     fig = px.bar(check_summary_df, x='Check', y='Count', color='Outcome', barmode='group')
     
     fig.update_layout(
@@ -116,22 +439,8 @@ def get_recon_summary_graph(check_summary_df: pd.DataFrame):
     return fig
             
 def add_recon_to_metadata(recon_name, recon_description, recon_value):
-    # Check if the metadata file, recon_metadata.csv exists
-    if not os.path.exists(METADATE_FILE_PATH):
-
-        df = pd.DataFrame(columns = ['recon_name', 'recon_description', 'recon_value', 'date_created'])
-        df.to_csv(METADATE_FILE_PATH, index=False)
-
-    # Add the new recon to the metadata file
-    df = pd.read_csv(METADATE_FILE_PATH)
-
-    # Make sure the recon was not already logged
-    if recon_name in df['recon_name'].values:
-        return 
-
-    new_row = [recon_name, recon_description, recon_value, datetime.now()]
-    df.loc[len(df)] = new_row
-    df.to_csv(METADATE_FILE_PATH, index=False)
+    # Recons that were already added keep their original metadata
+    add_recon(recon_name, recon_description, recon_value)
 
 def save_recon_analysis(recon_name, analysis):
     path = get_recon_path(recon_name)
@@ -144,4 +453,10 @@ def get_recon_analysis(recon_name):
         return file.read()
 
 def get_recon_path(recon_name):
-    return os.path.join('recon-scripts', recon_name + '.py')
+    return os.path.join(RECON_SCRIPTS_FOLDER, recon_name + '.py')
+
+def get_saved_recon_names() -> List[str]:
+    # Get the names of the recons that have a saved analysis in the "recon-scripts" folder
+    if not os.path.exists(RECON_SCRIPTS_FOLDER):
+        return []
+    return sorted(file[:-len('.py')] for file in os.listdir(RECON_SCRIPTS_FOLDER) if file.endswith('.py'))
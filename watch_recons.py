@@ -0,0 +1,323 @@
+"""
+Reruns saved recons as soon as new versions of their source files land, without anyone opening the app.
+
+The watcher watches the ./data and ./db_data folders, with watchdog (inotify on Linux) if it is
+installed and by polling the folders otherwise. When a file lands it finds the saved analyses in the
+recon-scripts folder that consume it. The saved analyses are read again whenever a recon is saved,
+changed or removed, so the watcher never has to be restarted:
+
+- An import parameter consumes every version of its file, so when `Warehouse REIT v2.csv` lands, the
+  analyses that imported `Warehouse REIT v1.csv` are rerun with `Warehouse REIT v2.csv` bound instead.
+- A parameter consumes the exact file it is bound to, in case it is overwritten in place.
+- A custom importer decorated with snapshot_importer consumes its source_paths.
+
+Writes are debounced, so a file is only picked up once it hasn't changed for a few seconds, and the
+reruns are queued on a bounded pool of workers that each run a recon in its own process, like
+rerun_recons.py. Run it from the root of the repo with:
+    python watch_recons.py --workers 2 --debounce 2
+"""
+import argparse
+import ast
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+from import_loader import get_importer_names
+from rerun_recons import SUCCESS, run_recons
+from utils import get_recon_analysis, get_recon_path, get_saved_recon_names
+
+WATCHED_FOLDERS = ['./data', './db_data']
+
+# A file is picked up once it hasn't been written to for this long
+DEFAULT_DEBOUNCE_SECONDS = 2.0
+
+# How often the folders are scanned when watchdog is not installed
+POLL_INTERVAL_SECONDS = 1.0
+
+# Files that are still being written or are not sources, like Excel lock files
+IGNORED_FILE_PATTERN = re.compile(r'^(\.|~\$)|\.(tmp|part|crdownload)$', re.IGNORECASE)
+
+# The version at the end of a file name, like the v2 in Warehouse REIT v2.csv
+FILE_VERSION_PATTERN = re.compile(r'[\s_-]*v(\d+)$', re.IGNORECASE)
+
+
+def log(message: str):
+    print(f'[{datetime.now():%Y-%m-%d %H:%M:%S}] {message}', flush=True)
+
+def get_source_key(path: str) -> Tuple[str, str]:
+    # Every version of a file has the same key, the name without its version and the extension
+    stem, extension = os.path.splitext(os.path.basename(path))
+    return FILE_VERSION_PATTERN.sub('', stem).strip().lower(), extension.lower()
+
+def get_file_version(path: str) -> int:
+    match = FILE_VERSION_PATTERN.search(os.path.splitext(os.path.basename(path))[0])
+    return int(match.group(1)) if match else 0
+
+def list_watched_files(folders: List[str]) -> Dict[str, Tuple[int, int]]:
+    # Returns the size and modified time of every file in the folders
+    files = {}
+    for folder in folders:
+        for directory, _, file_names in os.walk(folder):
+            for file_name in file_names:
+                if IGNORED_FILE_PATTERN.search(file_name):
+                    continue
+                path = os.path.abspath(os.path.join(directory, file_name))
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files[path] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+class ReconSources:
+    """
+    The sources of one saved analysis: the file bound to each import parameter, and the source
+    files of the custom importers it calls.
+    """
+
+    def __init__(self, recon_name: str, import_params: Dict[str, str], importer_source_paths: List[str]):
+        self.recon_name = recon_name
+        self.import_params = import_params
+        self.importer_source_paths = {os.path.abspath(path) for path in importer_source_paths}
+
+    @classmethod
+    def from_saved_analysis(cls, recon_name: str) -> 'ReconSources':
+        # Read the saved analysis directly, so the watcher doesn't need to load mitosheet
+        analysis = json.loads(get_recon_analysis(recon_name))
+        import_params = {
+            param['name']: param['original_value']
+            for param in analysis['param_metadata']
+            if param['type'] == 'import' and isinstance(param['original_value'], str)
+        }
+
+        import custom_imports
+        importer_source_paths = []
+        for importer_name in get_importer_names(ast.parse(analysis['fully_parameterized_function'])):
+            importer_source_paths.extend(getattr(getattr(custom_imports, importer_name, None), 'source_paths', []))
+
+        return cls(recon_name, import_params, importer_source_paths)
+
+    def bind_latest_versions(self, files: List[str]):
+        # Bind each import parameter to the latest version of its file that is already in the folders
+        for param_name, bound_path in self.import_params.items():
+            versions = [path for path in files if get_source_key(path) == get_source_key(bound_path)]
+            if len(versions) > 0:
+                latest_path = max(versions, key=get_file_version)
+                if not os.path.exists(bound_path) or get_file_version(latest_path) > get_file_version(bound_path):
+                    self.import_params[param_name] = latest_path
+
+    def consume(self, path: str) -> bool:
+        """
+        Binds the file to the parameters that consume it, and returns if the recon needs to be rerun.
+        Older versions of a file than the one that is bound are ignored.
+        """
+        consumed = os.path.abspath(path) in self.importer_source_paths
+        for param_name, bound_path in self.import_params.items():
+            if os.path.abspath(bound_path) == os.path.abspath(path):
+                consumed = True
+            elif get_source_key(bound_path) == get_source_key(path) and get_file_version(path) >= get_file_version(bound_path):
+                self.import_params[param_name] = path
+                consumed = True
+        return consumed
+
+
+def get_saved_analysis_stats() -> Dict[str, Tuple[int, int]]:
+    # The size and modified time of the saved analysis of each recon
+    stats = {}
+    for recon_name in get_saved_recon_names():
+        try:
+            stat = os.stat(get_recon_path(recon_name))
+        except FileNotFoundError:
+            continue
+        stats[recon_name] = (stat.st_size, stat.st_mtime_ns)
+    return stats
+
+def update_recon_sources(recon_sources: Dict[str, ReconSources], analysis_stats: Dict[str, Tuple[int, int]], folders: List[str]) -> Dict[str, Tuple[int, int]]:
+    """
+    Reads the sources of the recons whose saved analysis was added or changed since analysis_stats, and
+    drops the recons that were removed. Returns the stats of the saved analyses that were read.
+    """
+    current_stats = get_saved_analysis_stats()
+    for recon_name in set(recon_sources) - set(current_stats):
+        del recon_sources[recon_name]
+
+    changed_recon_names = [recon_name for recon_name, stat in current_stats.items() if analysis_stats.get(recon_name) != stat]
+    files = list(list_watched_files(folders)) if len(changed_recon_names) > 0 else []
+    for recon_name in changed_recon_names:
+        try:
+            sources = ReconSources.from_saved_analysis(recon_name)
+        except (OSError, ValueError, KeyError) as e:
+            # The analysis may still be being written, so it is read again on the next check
+            log(f'Could not read the saved analysis of {recon_name}: {e}')
+            del current_stats[recon_name]
+            recon_sources.pop(recon_name, None)
+            continue
+        sources.bind_latest_versions(files)
+        recon_sources[recon_name] = sources
+
+    return current_stats
+
+
+class RerunQueue:
+    """
+    Runs queued reruns on a bounded pool of workers. A recon is never run twice at once. If it is
+    queued again while it runs, it is rerun once more when it finishes, with the latest parameters.
+    """
+
+    def __init__(self, max_workers: int, timeout_seconds: float):
+        self.timeout_seconds = timeout_seconds
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.lock = threading.Lock()
+        self.queued: Dict[str, Dict[str, str]] = {}
+        self.running = set()
+
+    def submit(self, recon_name: str, params: Dict[str, str]):
+        with self.lock:
+            already_submitted = recon_name in self.queued or recon_name in self.running
+            self.queued[recon_name] = dict(params)
+            if not already_submitted:
+                self.executor.submit(self.run, recon_name)
+
+    def run(self, recon_name: str):
+        with self.lock:
+            params = self.queued.pop(recon_name)
+            self.running.add(recon_name)
+
+        try:
+            log(f'Rerunning {recon_name}')
+            result = run_recons({recon_name: {'params': params}}, 1, self.timeout_seconds)[0]
+            if result['status'] == SUCCESS:
+                log(f'Reran {recon_name} in {result["seconds"]:.2f} seconds ({result["rows"]:,} rows)')
+            else:
+                log(f'{recon_name} {result["status"].lower()}:\n{result["error"]}')
+        finally:
+            with self.lock:
+                self.running.discard(recon_name)
+                if recon_name in self.queued:
+                    self.executor.submit(self.run, recon_name)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+class ChangedFiles(FileSystemEventHandler):
+    """
+    Collects the files that changed, with when they last changed, from watchdog events or from
+    polling the folders.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.changed_at: Dict[str, float] = {}
+
+    def add(self, path: str):
+        if IGNORED_FILE_PATTERN.search(os.path.basename(path)):
+            return
+        with self.lock:
+            self.changed_at[os.path.abspath(path)] = time.monotonic()
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.add(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.add(event.src_path)
+
+    def on_moved(self, event):
+        # Files that are written to a temporary name and then renamed land with a move
+        if not event.is_directory:
+            self.add(event.dest_path)
+
+    def pop_settled(self, debounce_seconds: float) -> List[str]:
+        # Returns the files that haven't changed for debounce_seconds, which are done being written
+        now = time.monotonic()
+        with self.lock:
+            settled_paths = [path for path, changed_at in self.changed_at.items() if now - changed_at >= debounce_seconds]
+            for path in settled_paths:
+                del self.changed_at[path]
+        return sorted(path for path in settled_paths if os.path.isfile(path))
+
+
+def watch_recons(folders: List[str], max_workers: int, timeout_seconds: float, debounce_seconds: float, poll: bool=False, stop_event: Optional[threading.Event]=None):
+    """
+    Watches the folders and reruns the recons that consume each file that lands, until stop_event is set.
+    """
+    stop_event = stop_event or threading.Event()
+
+    files = list_watched_files(folders)
+    recon_sources: Dict[str, ReconSources] = {}
+    analysis_stats = update_recon_sources(recon_sources, {}, folders)
+
+    changed_files = ChangedFiles()
+    rerun_queue = RerunQueue(max_workers, timeout_seconds)
+
+    observer = None
+    if Observer is not None and not poll:
+        observer = Observer()
+        for folder in folders:
+            if os.path.isdir(folder):
+                observer.schedule(changed_files, folder, recursive=True)
+        observer.start()
+        log(f'Watching {", ".join(folders)} for {len(recon_sources)} recons')
+    else:
+        log(f'Polling {", ".join(folders)} every {POLL_INTERVAL_SECONDS:g} seconds for {len(recon_sources)} recons')
+
+    try:
+        while not stop_event.wait(POLL_INTERVAL_SECONDS if observer is None else min(POLL_INTERVAL_SECONDS, debounce_seconds / 2)):
+            if observer is None:
+                current_files = list_watched_files(folders)
+                for path, file_stat in current_files.items():
+                    if files.get(path) != file_stat:
+                        changed_files.add(path)
+                files = current_files
+
+            settled_paths = changed_files.pop_settled(debounce_seconds)
+            if len(settled_paths) > 0:
+                # Pick up recons that were saved, changed or removed since the last files landed
+                analysis_stats = update_recon_sources(recon_sources, analysis_stats, folders)
+
+            for path in settled_paths:
+                consuming_recons = [sources for sources in recon_sources.values() if sources.consume(path)]
+                if len(consuming_recons) == 0:
+                    continue
+                log(f'{os.path.relpath(path)} landed, queueing {", ".join(sources.recon_name for sources in consuming_recons)}')
+                for sources in consuming_recons:
+                    rerun_queue.submit(sources.recon_name, sources.import_params)
+    finally:
+        if observer is not None:
+            observer.stop()
+            observer.join()
+        rerun_queue.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rerun saved recons when new source files land.')
+    parser.add_argument('--folders', nargs='+', default=WATCHED_FOLDERS, help='Folders to watch.')
+    parser.add_argument('--workers', type=int, default=2, help='How many recons to run at once.')
+    parser.add_argument('--timeout', type=float, default=600, help='Seconds before a rerun is stopped and marked as timed out.')
+    parser.add_argument('--debounce', type=float, default=DEFAULT_DEBOUNCE_SECONDS, help='Seconds a file must be unchanged before it is picked up.')
+    parser.add_argument('--poll', action='store_true', help='Poll the folders even if watchdog is installed.')
+    args = parser.parse_args()
+
+    try:
+        watch_recons(args.folders, max(args.workers, 1), args.timeout, args.debounce, args.poll)
+    except KeyboardInterrupt:
+        log('Stopped watching')
+
+
+if __name__ == '__main__':
+    main()